@@ -0,0 +1,70 @@
+"""Benchmark object construction cost
+
+python benchmarks/bench_construction.py --n 1000
+"""
+import time
+from typing import Annotated, Callable
+
+import typer
+from typer import Option
+
+from llmpipe import LlmChat, PromptModule, Output
+from llmpipe.evaluations.llm_eval import LlmEvaluation
+from llmpipe import registry
+
+
+def lookup(key: str) -> str:
+    """Look up a value
+
+    Parameters
+    ----------
+    key : str
+        The key to look up
+    """
+    return key
+
+
+def describe(key: str) -> str:
+    """Describe a value
+
+    Parameters
+    ----------
+    key : str
+        The key to describe
+    """
+    return key
+
+
+def timeit(fn: Callable, n: int) -> float:
+    """Returns the mean time per call in microseconds"""
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def bench_construction(
+        n: Annotated[int, Option(help="Number of constructions per benchmark")] = 1000,
+        model: Annotated[str, Option(help="A LiteLLM model identifier")] = "claude-3-5-haiku-20241022"
+):
+    """Benchmark construction of chats, prompt modules and llm evaluations."""
+    benchmarks = {
+        "LlmChat": lambda: LlmChat(model=model),
+        "LlmChat (2 tools)": lambda: LlmChat(model=model, tools=[lookup, describe]),
+        "LlmEvaluation": lambda: LlmEvaluation(field="essay", requirement="Has a title"),
+        "PromptModule (2 llm evals)": lambda: PromptModule(model=model, outputs=[Output(
+            "essay", "An essay",
+            evaluations=[{"type": "llm", "value": "Has a title"}, {"type": "max_words", "value": 500}]
+        )]),
+    }
+    print(f"{'benchmark':<30}{'cold (us)':>12}{'warm (us)':>12}")
+    for name, fn in benchmarks.items():
+        registry._model_info.clear()
+        registry._tool_schemas.clear()
+        cold = timeit(fn, 1)
+        warm = timeit(fn, n)
+        print(f"{name:<30}{cold:>12,.1f}{warm:>12,.1f}")
+
+
+if __name__ == "__main__":
+    typer.run(bench_construction)
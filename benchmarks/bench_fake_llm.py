@@ -0,0 +1,53 @@
+"""Benchmark concurrent prompt module runs against the offline fake LLM backend
+
+python benchmarks/bench_fake_llm.py --n 500 --concurrency 64 --latency 0.5 --rate-limit-rate 0.05
+"""
+import asyncio
+import time
+from typing import Annotated
+
+import typer
+from typer import Option
+
+from llmpipe import Input, Output, PromptModule
+from llmpipe.fake_llm import FakeLlm, install_fake_llm, lognormal
+
+
+def bench_fake_llm(
+        n: Annotated[int, Option(help="Number of samples")] = 500,
+        concurrency: Annotated[int, Option(help="Maximum number of concurrent requests")] = 64,
+        latency: Annotated[float, Option(help="Median latency in seconds (log-normal)")] = 0.5,
+        sigma: Annotated[float, Option(help="Log-normal sigma of the latency")] = 0.5,
+        rate_limit_rate: Annotated[float, Option(help="Fraction of calls that fail with a 429")] = 0.,
+        server_error_rate: Annotated[float, Option(help="Fraction of calls that fail with a 500")] = 0.,
+        cache_path: Annotated[str, Option(help="Optional path to an on-disk response cache")] = None,
+        seed: Annotated[int, Option(help="Seed for fault sampling")] = 0
+):
+    """Run a prompt module on `n` samples and report throughput, retries and cache hits."""
+    fake = install_fake_llm(FakeLlm(
+        latency=lognormal(latency, sigma) if latency else 0.,
+        rate_limit_rate=rate_limit_rate,
+        server_error_rate=server_error_rate,
+        retry_after=0.1,
+        seed=seed
+    ))
+    module = PromptModule(
+        task="Answer a question",
+        inputs=[Input("question", "A question")],
+        outputs=[Output("thinking", "Think step by step"), Output("answer", "The answer")],
+        model="fake/model",
+        cache_path=cache_path
+    )
+    start = time.perf_counter()
+    asyncio.run(module.acall(question=[f"Question {i}" for i in range(n)], concurrency=concurrency))
+    elapsed = time.perf_counter() - start
+    print(f"samples: {n:,}, elapsed: {elapsed:,.2f}s, samples/s: {n / elapsed:,.1f}")
+    print(f"calls: {fake.calls:,}, faults: {fake.faults:,}")
+    print(f"Retries: {module.retry_stats.total}")
+    if cache_path:
+        print(f"Response cache: {module.cache_stats.total}")
+    print(f"Tokens used: {module.tokens.total}")
+
+
+if __name__ == "__main__":
+    typer.run(bench_fake_llm)
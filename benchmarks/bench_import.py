@@ -0,0 +1,52 @@
+"""Benchmark `import llmpipe` start-up time with `python -X importtime`
+
+python benchmarks/bench_import.py --budget-ms 300
+"""
+import subprocess
+import sys
+from typing import Annotated, Dict, List
+
+import typer
+from typer import Option
+
+
+#: Dependencies that should only be imported on first use
+HEAVY_MODULES = ["litellm", "datasets", "polars"]
+
+
+def importtime(module: str) -> Dict[str, float]:
+    """Imports a module in a fresh interpreter and returns the cumulative import time (ms) of every module loaded"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative) / 1000
+    return times
+
+
+def bench_import(
+        modules: Annotated[List[str], Option("--module", help="Modules to import")] = ["llmpipe", "llmpipe.llmchat", "llmpipe.prompt_module"],
+        budget_ms: Annotated[float, Option(help="Maximum allowed import time in milliseconds")] = 300.,
+        n: Annotated[int, Option(help="Number of runs per module (the fastest is reported)")] = 5
+):
+    """Report import times and exit with an error when over budget or when heavy dependencies load eagerly."""
+    failed = False
+    print(f"{'module':<30}{'import (ms)':>14}  heavy dependencies loaded")
+    for module in modules:
+        runs = [importtime(module) for _ in range(n)]
+        elapsed = min(run[module] for run in runs)
+        heavy = [x for x in HEAVY_MODULES if x in runs[0]]
+        failed = failed or elapsed > budget_ms or bool(heavy)
+        print(f"{module:<30}{elapsed:>14,.1f}  {', '.join(heavy) or '-'}")
+    if failed:
+        print(f"Import budget of {budget_ms:,.0f}ms exceeded or heavy dependencies imported eagerly")
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    typer.run(bench_import)
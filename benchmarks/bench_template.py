@@ -0,0 +1,53 @@
+"""Benchmark template formatting against the previous replace-per-key implementation
+
+python benchmarks/bench_template.py --n 20
+"""
+import time
+from typing import Annotated, Callable
+
+import typer
+from typer import Option
+
+from llmpipe.template import Template
+
+
+def replace_format(template: str, **kwargs) -> str:
+    """The previous implementation: one full `str.replace` pass over the template per key"""
+    for k, v in kwargs.items():
+        kk = "{{" + k + "}}"
+        if kk in template:
+            template = template.replace(kk, str(v) or "")
+    return template
+
+
+def timeit(fn: Callable, n: int) -> float:
+    """Returns the mean time per call in microseconds"""
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def bench_template(
+        n: Annotated[int, Option(help="Number of formats per benchmark")] = 20,
+        document_kb: Annotated[int, Option(help="Size of the document input in kilobytes")] = 512
+):
+    """Time formatting a prompt template by template size and number of keys."""
+    document = ("lorem ipsum dolor sit amet " * (document_kb * 1024 // 27 + 1))[:document_kb * 1024]
+    print(f"{'template kb':>12}{'keys':>6}{'replace (us)':>14}{'compiled (us)':>15}{'speedup':>9}")
+    for template_kb in (1, 16, 256):
+        for n_keys in (2, 8, 32):
+            keys = [f"input_{i}" for i in range(n_keys)]
+            instructions = "Follow the instructions carefully. " * (template_kb * 1024 // 35 // n_keys + 1)
+            text = "".join(f"{instructions}<{k}>\n{{{{{k}}}}}\n</{k}>\n" for k in keys)
+            # The first input is a large document, the others are short
+            kwargs = {k: document if i == 0 else f"value {i}" for i, k in enumerate(keys)}
+            template = Template(text)
+            assert template.format(**kwargs) == replace_format(text, **kwargs)
+            old = timeit(lambda: replace_format(text, **kwargs), n)
+            new = timeit(lambda: template.format(**kwargs), n)
+            print(f"{len(text) / 1024:>12,.0f}{n_keys:>6}{old:>14,.1f}{new:>15,.1f}{old / new:>8,.1f}x")
+
+
+if __name__ == "__main__":
+    typer.run(bench_template)
@@ -1,8 +1,47 @@
-from .data import read_data, write_data, load_json_files
-from .field import Input, Output, output_factory, JsonlinesOutput, TabularOutput, JsonOutput
-from .llmchat import LlmChat
-from .prompt_module import PromptModule
-from .revisor_module import RevisorModule
-from .evaluations import Evaluation, eval_factory
-from .llmprompt import LlmPrompt
-from .llmprompt_formany import LlmPromptForMany
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .data import read_data, write_data, load_json_files
+    from .field import Input, Output, output_factory, JsonlinesOutput, TabularOutput, JsonOutput
+    from .llmchat import LlmChat
+    from .prompt_module import PromptModule
+    from .revisor_module import RevisorModule
+    from .evaluations import Evaluation, eval_factory
+    from .llmprompt import LlmPrompt
+    from .llmprompt_formany import LlmPromptForMany
+
+
+# Submodules are imported on first attribute access, so `import llmpipe` and `python -m llmpipe.<module>` start fast
+_exports = {
+    "read_data": ".data",
+    "write_data": ".data",
+    "load_json_files": ".data",
+    "Input": ".field",
+    "Output": ".field",
+    "output_factory": ".field",
+    "JsonlinesOutput": ".field",
+    "TabularOutput": ".field",
+    "JsonOutput": ".field",
+    "LlmChat": ".llmchat",
+    "PromptModule": ".prompt_module",
+    "RevisorModule": ".revisor_module",
+    "Evaluation": ".evaluations",
+    "eval_factory": ".evaluations",
+    "LlmPrompt": ".llmprompt",
+    "LlmPromptForMany": ".llmprompt_formany",
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    if name not in _exports:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_exports[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+@dataclass
+class CacheStats:
+    """Counts response cache lookups"""
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def total(self):
+        """Returns formatted string containing cache hit and miss counts"""
+        return f"hits: {self.hits:,.0f}, misses: {self.misses:,.0f}"
+
+
+class ResponseCache:
+    """A content-addressed, on-disk (SQLite) cache of LLM responses
+
+    Entries are keyed by a hash of the full completion request. The least recently used entries are
+    evicted once the cache grows beyond `max_size_bytes`, and entries older than `max_age_seconds`
+    are ignored and eventually deleted. Safe to share across threads and processes.
+
+    ### Usage
+
+    ```
+    cache = ResponseCache("responses.sqlite")
+    key = cache.key({"model": "claude-3-5-haiku-20241022", "messages": [...]})
+    if (response := cache.get(key)) is None:
+        response = ...
+        cache.set(key, response)
+    ```
+
+    Args:
+        path: Path to the SQLite database file
+        max_size_bytes: Maximum total size of the cached responses (default: 1GB)
+        max_age_seconds: Maximum age of a cached response (default: 30 days)
+        evict_every: Run eviction after this many writes (default: 100)
+    """
+    def __init__(
+            self,
+            path: str,
+            max_size_bytes: int = 1024 ** 3,
+            max_age_seconds: float = 30 * 24 * 60 * 60,
+            evict_every: int = 100
+    ):
+        self.path = path
+        self.max_size_bytes = max_size_bytes
+        self.max_age_seconds = max_age_seconds
+        self.evict_every = evict_every
+        self._local = threading.local()
+        self._n_writes = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Returns a connection owned by the current thread and process"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def key(request: Dict) -> str:
+        """Returns a hash of a completion request"""
+        return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Returns a cached response, or None if there is no (fresh) entry for the key"""
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT value FROM responses WHERE key = ? AND created >= ?",
+            (key, now - self.max_age_seconds)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Dict):
+        """Adds a response to the cache"""
+        now = time.time()
+        value = json.dumps(value)
+        self._connection().execute(
+            "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(value), now, now)
+        )
+        self._n_writes += 1
+        if self._n_writes % self.evict_every == 0:
+            self.evict()
+
+    def evict(self):
+        """Deletes expired entries, then the least recently used entries until the size limit is met"""
+        conn = self._connection()
+        conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.max_age_seconds,))
+        total_size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total_size <= self.max_size_bytes:
+            return
+        to_delete = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            if total_size <= self.max_size_bytes:
+                break
+            to_delete.append((key,))
+            total_size -= size
+        conn.executemany("DELETE FROM responses WHERE key = ?", to_delete)
+
+    def clear(self):
+        """Deletes all entries"""
+        self._connection().execute("DELETE FROM responses")
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(path: str, **kwargs) -> ResponseCache:
+    """Returns the process-wide `ResponseCache` for a path, creating it on first use
+
+    Args:
+        path: Path to the SQLite database file
+        kwargs: Keyword arguments passed to `ResponseCache` when it is created
+    """
+    path = os.path.abspath(path)
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = ResponseCache(path, **kwargs)
+        return _caches[path]
@@ -1,11 +1,13 @@
 import glob
 import json
 import gzip
-from typing import List, Dict, Any
+import itertools
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Set
 import os
 
-import polars as pl
-
 
 def read_data(path: str, as_df: bool = False, **kwargs) -> List[Dict]:
     """Reads tab separated (with header, .txt) or json lines (.jsonl) data from disk.
@@ -18,6 +20,8 @@ def read_data(path: str, as_df: bool = False, **kwargs) -> List[Dict]:
     Returns:
         List[Dict]: Data records/samples as a list of dictionaries
     """
+    import polars as pl
+
     if path.endswith(".jsonl"):
         df = pl.read_ndjson(path, infer_schema_length=100000, **kwargs)
     elif path.endswith(".txt"):
@@ -34,6 +38,59 @@ def read_data(path: str, as_df: bool = False, **kwargs) -> List[Dict]:
     return df.to_dicts()
 
 
+def iter_data(path: str, batch_size: int = 1000, **kwargs) -> Iterator[Dict]:
+    """Reads tab separated (with header, .txt), comma separated (.csv) or json lines (.jsonl) data one sample at a time.
+
+    Unlike `read_data`, the file is not loaded into memory: json lines are parsed line by line, and tabular files
+    are read in batches of `batch_size` rows.
+
+    Args:
+        path: Path to the data file
+        batch_size: The number of rows read at once from tabular files
+        kwargs: Arguments based to polars scan csv function
+
+    Yields:
+        Dict: Data records/samples as dictionaries
+    """
+    if path.endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
+
+    if path.endswith(".txt"):
+        separator = "\t"
+    elif path.endswith(".csv"):
+        separator = ","
+    else:
+        raise ValueError("Unsupported file type, try .txt (tab-separated), .csv (comma-separated), or .jsonl (json lines)")
+    if "utf16" in path:
+        # Polars only reads utf8 files lazily
+        yield from read_data(path, **kwargs)
+        return
+
+    import polars as pl
+    if hasattr(pl.LazyFrame, "collect_batches"):
+        batches = pl.scan_csv(path, infer_schema_length=100000, separator=separator, **kwargs).collect_batches(chunk_size=batch_size, lazy=True)
+    else:
+        reader = pl.read_csv_batched(path, infer_schema_length=100000, separator=separator, batch_size=batch_size, **kwargs)
+        batches = itertools.chain.from_iterable(iter(lambda: reader.next_batches(1), None))
+    for df in batches:
+        yield from df.iter_rows(named=True)
+
+
+def sample_data(samples: Iterable[Dict], n: int) -> List[Dict]:
+    """Returns `n` samples drawn uniformly at random from an iterable in one pass, keeping only `n` samples in memory"""
+    reservoir = []
+    for idx, sample in enumerate(samples):
+        if idx < n:
+            reservoir.append(sample)
+        elif (j := random.randrange(idx + 1)) < n:
+            reservoir[j] = sample
+    return reservoir
+
+
 def write_data(samples: List[Dict], path: str):
     """Writes data as tab separated (with header, .txt) or json lines (.jsonl) to disk.
 
@@ -41,6 +98,8 @@ def write_data(samples: List[Dict], path: str):
         samples: Data records/samples as a list of dictionaries
         path: Path to the data file
     """
+    import polars as pl
+
     if path.endswith(".jsonl"):
         pl.from_dicts(samples, infer_schema_length=100000).write_ndjson(path)
     elif path.endswith(".txt"):
@@ -51,6 +110,99 @@ def write_data(samples: List[Dict], path: str):
         raise ValueError("Unsupported file type, try .txt (tab-separated), .csv (comma-separated), or .jsonl (json lines)")
 
 
+class JsonlWriter:
+    """Appends samples to a json lines file as they are produced
+
+    Each sample is written and flushed as one line, so a crash loses at most the sample being written. The file
+    is fsynced at most every `fsync_every` seconds and on close. Safe to share across threads.
+
+    ### Usage
+
+    ```
+    with JsonlWriter("output.jsonl") as writer:
+        for sample in samples:
+            writer.write(sample)
+    ```
+
+    Args:
+        path: Path to the json lines file
+        append: If true, append to an existing file rather than overwriting it
+        fsync_every: The minimum number of seconds between fsyncs (default: 5)
+    """
+    def __init__(self, path: str, append: bool = False, fsync_every: float = 5.):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.n_written = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "a" if append else "w", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._last_fsync = time.monotonic()
+
+    def write(self, sample: Dict):
+        line = json.dumps(sample, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self.n_written += 1
+            if time.monotonic() - self._last_fsync >= self.fsync_every:
+                os.fsync(self._file.fileno())
+                self._last_fsync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def resume_jsonl(path: str, key: str, drop: Callable[[Dict], bool] = None) -> Set:
+    """Prepares a partially written json lines file for appending and returns the keys of the rows it contains
+
+    Lines that cannot be parsed (e.g., a last line cut short by a crash) and rows for which `drop` returns
+    true are removed from the file, so that those rows can be run again.
+
+    Args:
+        path: Path to the json lines file. If it does not exist, no keys are returned.
+        key: The column that identifies a row
+        drop: An optional function that returns true for rows that should be run again
+
+    Returns:
+        Set: The keys of the rows kept in the file
+    """
+    if not os.path.exists(path):
+        return set()
+
+    keys = set()
+    tmp_path = path + ".resume"
+    n_dropped = 0
+    with open(path, "r", encoding="utf-8") as f, open(tmp_path, "w", encoding="utf-8") as out:
+        for line in f:
+            try:
+                sample = json.loads(line)
+            except json.JSONDecodeError:
+                sample = None
+            if not line.endswith("\n") or not isinstance(sample, dict) or key not in sample or (drop and drop(sample)):
+                n_dropped += 1
+                continue
+            keys.add(sample[key])
+            out.write(line)
+
+    # The file is only rewritten when rows are dropped
+    if n_dropped:
+        os.replace(tmp_path, path)
+    else:
+        os.remove(tmp_path)
+    return keys
+
+
 def load_json_files(directory_path: str) -> List[Dict[Any, Any]]:
     """
     Load all JSON/JSONL files (including gzipped variants) from a specified directory.
@@ -1,6 +1,6 @@
 from typing import List, Union
 
-from .core import Evaluation
+from .core import BatchResult, Evaluation, evaluate_batch
 
 
 def eval_factory(
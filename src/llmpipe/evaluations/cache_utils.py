@@ -0,0 +1,34 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Sequence, TypeVar
+
+
+T = TypeVar("T")
+
+
+class IdentityCache:
+    """A cache of values built from sequences (e.g., term lists or documents), keyed by the identity of the sequence
+
+    Holding a reference to each sequence keeps its id from being reused. A sequence that grew or shrank since
+    its value was built is rebuilt.
+    """
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, terms: Sequence, key: Hashable, build: Callable[[], T], size: Callable[[T], int] = len) -> T:
+        """Returns the value cached for a sequence and key, building it if needed"""
+        item_key = (id(terms), key)
+        with self._lock:
+            cached = self._items.get(item_key)
+            if cached is not None and cached[0] is terms and size(cached[1]) == len(terms):
+                self._items.move_to_end(item_key)
+                return cached[1]
+        value = build()
+        with self._lock:
+            self._items[item_key] = (terms, value)
+            self._items.move_to_end(item_key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return value
@@ -2,6 +2,7 @@ from dataclasses import dataclass
 from typing import List, Union
 
 from ..evaluations.core import Evaluation, EvalResult
+from ..evaluations.term_matcher import get_matcher
 
 
 @dataclass
@@ -16,6 +17,14 @@ class ContainsAll(Evaluation):
         if not self.requirement:
             self.requirement = f"Must contain the following terms: " + ", ".join([str(x) for x in self.required_terms])
 
+    def _batch_mask(self, values: List[str], /, **columns: List) -> List[bool]:
+        import polars as pl
+        text = pl.Series(values).str.to_lowercase()
+        passed = pl.Series([True] * len(values))
+        for required in self.required_terms:
+            passed &= text.str.contains(str(required).lower(), literal=True)
+        return passed.to_list()
+
     def __call__(self, **inputs) -> EvalResult:
         """Check if field contains all required values.
 
@@ -25,12 +34,9 @@ class ContainsAll(Evaluation):
         Returns:
             EvalResult with pass/fail and explanation
         """
-        field_value = str(inputs.get(self.field, "")).lower()
-        missing = []
-
-        for required in self.required_terms:
-            if str(required).lower() not in field_value:
-                missing.append(required)
+        field_value = str(inputs.get(self.field, ""))
+        found = set(get_matcher(self.required_terms).matches(field_value))
+        missing = [required for idx, required in enumerate(self.required_terms) if idx not in found]
 
         passed = len(missing) == 0
         
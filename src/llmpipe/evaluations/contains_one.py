@@ -2,6 +2,7 @@ from dataclasses import dataclass
 from typing import List
 
 from ..evaluations.core import Evaluation, EvalResult
+from ..evaluations.term_matcher import get_matcher
 
 
 @dataclass
@@ -16,6 +17,10 @@ class ContainsOne(Evaluation):
         if not self.requirement:
             self.requirement = f"Must contain at least one of: " + ", ".join([str(x) for x in self.required_terms])
 
+    def _batch_mask(self, values: List[str], /, **columns: List) -> List[bool]:
+        import polars as pl
+        return pl.Series(values).str.to_lowercase().str.contains_any([str(x).lower() for x in self.required_terms]).to_list()
+
     def __call__(self, **inputs) -> EvalResult:
         """Check if field contains at least one of the required values.
 
@@ -25,11 +30,8 @@ class ContainsOne(Evaluation):
         Returns:
             EvalResult with pass/fail and explanation
         """
-        field_value = str(inputs.get(self.field, "")).lower()
-        
-        for required in self.required_terms:
-            if str(required).lower() in field_value:
-                return EvalResult(field=self.field, requirement=self.requirement, evaluation_result="PASS")
+        if get_matcher(self.required_terms).search(str(inputs.get(self.field, ""))):
+            return EvalResult(field=self.field, requirement=self.requirement, evaluation_result="PASS")
 
         reason = f"Field '{self.field}' does not contain any of the required values: {self.required_terms}"
         return EvalResult(field=self.field, requirement=self.requirement, evaluation_result="FAIL", reason=reason)
@@ -1,4 +1,5 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Dict, List
 
 
 @dataclass
@@ -10,6 +11,26 @@ class EvalResult:
     reason: str = ""  #: An optional reason for the evaluation
 
 
+@dataclass
+class BatchResult:
+    """The results of an evaluation over a column of values"""
+    field: str  #: The field that the evaluation applies to
+    requirement: str  #: A brief description of the requirement
+    passed: List[bool] = field(default_factory=lambda: [])  #: True for each value that passes
+    reasons: Dict[int, str] = field(default_factory=lambda: {})  #: The reason for each failed value, keyed by index
+
+    @property
+    def failed(self) -> List[int]:
+        """The indices of the failed values"""
+        return [idx for idx, passed in enumerate(self.passed) if not passed]
+
+    def result(self, idx: int) -> EvalResult:
+        """Returns the result of one value"""
+        if self.passed[idx]:
+            return EvalResult(field=self.field, requirement=self.requirement, evaluation_result="PASS")
+        return EvalResult(field=self.field, requirement=self.requirement, evaluation_result="FAIL", reason=self.reasons.get(idx, ""))
+
+
 @dataclass
 class Evaluation:
     """A single field evaluation"""
@@ -20,3 +41,96 @@ class Evaluation:
 
     def __call__(self, **inputs) -> EvalResult:
         raise NotImplementedError
+
+    async def acall(self, **inputs) -> EvalResult:
+        """Async version of `__call__`"""
+        return self(**inputs)
+
+    def evaluate(self, **inputs) -> List[EvalResult]:
+        """Returns the result of each requirement checked by the evaluation, in order
+
+        Evaluations check one requirement, except for fused evaluations (see `FusedLlmEvaluation`), which
+        check several requirements at once.
+        """
+        return [self(**inputs)]
+
+    async def aevaluate(self, **inputs) -> List[EvalResult]:
+        """Async version of `evaluate`"""
+        return [await self.acall(**inputs)]
+
+    def _batch_mask(self, values: List[str], /, **columns: List) -> List[bool]:
+        """Returns the pass/fail mask of a column of strings, or None if the evaluation is not vectorized"""
+        return None
+
+    def batch(self, values: List, /, **columns: List) -> BatchResult:
+        """Evaluates a column of values at once
+
+        Vectorized evaluations score string columns with polars expressions, and only call the evaluation
+        per value to get the reasons for failed values. Other evaluations are called once per value.
+
+        Args:
+            values: The values of `field`
+            **columns: Other columns the evaluation reads, e.g., `blocked_terms_field`, as lists of the same length
+
+        Returns:
+            BatchResult: A pass/fail mask, and the reasons for failed values
+        """
+        def row(idx):
+            return {k: v[idx] for k, v in columns.items()} | {self.field: values[idx]}
+
+        mask = None
+        if values and all(isinstance(x, str) for x in values):
+            try:
+                mask = self._batch_mask(values, **columns)
+            except ImportError:
+                # polars is not installed
+                mask = None
+        if mask is None:
+            results = [self(**row(idx)) for idx in range(len(values))]
+            return BatchResult(
+                field=self.field,
+                requirement=self.requirement,
+                passed=[x.evaluation_result == "PASS" for x in results],
+                reasons={idx: x.reason for idx, x in enumerate(results) if x.evaluation_result != "PASS"}
+            )
+        batch_result = BatchResult(field=self.field, requirement=self.requirement, passed=[bool(x) for x in mask])
+        batch_result.reasons = {idx: self(**row(idx)).reason for idx in batch_result.failed}
+        return batch_result
+
+
+def evaluate_batch(evaluations: List[Evaluation], values: List, break_after_first_fail: bool = False, /, **columns: List) -> List[List[EvalResult]]:
+    """Runs evaluations over a column of values, returning the failed results of each value
+
+    Deterministic evaluations run first, in batch, then llm evaluations run once per value. With
+    `break_after_first_fail`, each value stops at its first failed evaluation, so llm evaluations only run
+    for values that pass every deterministic evaluation.
+
+    Args:
+        evaluations: The evaluations of a field
+        values: The values of the field
+        break_after_first_fail: If true, return at most one failed result per value
+        **columns: Other columns the evaluations read, as lists of the same length as `values`
+
+    Returns:
+        List[List[EvalResult]]: The failed results of each value, in evaluation order
+    """
+    failures = [[] for _ in values]
+    deterministic_evaluations = [x for x in evaluations if x.type != "llm"]
+    llm_evaluations = [x for x in evaluations if x.type == "llm"]
+    for evaluation in deterministic_evaluations:
+        idxs = [idx for idx in range(len(values)) if not (break_after_first_fail and failures[idx])]
+        if not idxs:
+            break
+        batch_result = evaluation.batch([values[idx] for idx in idxs], **{k: [v[idx] for idx in idxs] for k, v in columns.items()})
+        for i in batch_result.failed:
+            failures[idxs[i]].append(batch_result.result(i))
+    for idx, value in enumerate(values):
+        for evaluation in llm_evaluations:
+            if break_after_first_fail and failures[idx]:
+                break
+            for eval_result in evaluation.evaluate(**({k: v[idx] for k, v in columns.items()} | {evaluation.field: value})):
+                if eval_result.evaluation_result != "PASS":
+                    failures[idx].append(eval_result)
+                    if break_after_first_fail:
+                        break
+    return failures
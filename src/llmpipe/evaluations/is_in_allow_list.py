@@ -1,14 +1,22 @@
+import os
 from dataclasses import dataclass
 from typing import Dict, List
 
 from llmpipe.evaluations.core import Evaluation, EvalResult
+from llmpipe.evaluations.term_set import HashIndex, get_index, get_term_set
 
 
 @dataclass
 class IsInAllowList(Evaluation):
-    """Ensure that a field contains only allowed terms"""
+    """Ensure that a field contains only allowed terms
+
+    Allowed terms are compared case-insensitively through a set built once per list. Large lists can be
+    given as a file (`allowed_terms_path`), which is indexed on first use and memory-mapped (see
+    `llmpipe.evaluations.term_set.get_index`), so worker processes do not parse it.
+    """
     allowed_terms: List[str] = None
-    allowed_terms_field: str = None 
+    allowed_terms_field: str = None
+    allowed_terms_path: str = None  #: Optional path to a text file with one allowed term per line, or a parquet file with the allowed terms in its first column
     requirement: str = None
     type: str = "deterministic"
 
@@ -17,17 +25,37 @@ class IsInAllowList(Evaluation):
             self.requirement = f"Must be one of the following: {', '.join(self.allowed_terms)}"
         elif not self.requirement and not self.allowed_terms and self.allowed_terms_field:
             self.requirement = "Must be one of the following: {{" + self.allowed_terms_field + "}}"
+        elif not self.requirement and self.allowed_terms_path:
+            self.requirement = f"Must be one of the allowed values listed in {os.path.basename(self.allowed_terms_path)}"
+
+    def _index(self) -> HashIndex:
+        """Returns the index of `allowed_terms_path`, or None. It stats the file, so it is fetched once per call or batch."""
+        return get_index(self.allowed_terms_path, "lower") if self.allowed_terms_path is not None else None
+
+    def _is_allowed(self, text: str, allowed_terms: List[str] = None, index: HashIndex = None) -> bool:
+        text = text.lower()
+        return (
+            text in get_term_set(self.allowed_terms or [], "lower") or
+            (index is not None and text in index) or
+            text in get_term_set(allowed_terms or [], "lower")
+        )
+
+    def _batch_mask(self, values: List[str], /, **columns: List) -> List[bool]:
+        if self.allowed_terms_field is not None and self.allowed_terms_field in columns:
+            return None
+        if self.allowed_terms_path is not None:
+            index = self._index()
+            return [self._is_allowed(x, index=index) for x in values]
+        import polars as pl
+        allowed_terms = pl.Series(list(get_term_set(self.allowed_terms or [], "lower")), dtype=pl.String)
+        return pl.Series(values).str.to_lowercase().is_in(allowed_terms).to_list()
 
     def __call__(self, **inputs) -> EvalResult:
-        text = inputs[self.field].lower()
-        allowed_terms = self.allowed_terms.copy() if self.allowed_terms else []
+        allowed_terms = None
         if self.allowed_terms_field is not None and self.allowed_terms_field in inputs:
-            allowed_terms += inputs[self.allowed_terms_field] or []
-        
-        # Convert allowed terms to lowercase for case-insensitive comparison
-        allowed_terms = [term.lower() for term in allowed_terms]
-        
-        if text not in allowed_terms:
+            allowed_terms = inputs[self.allowed_terms_field]
+
+        if not self._is_allowed(inputs[self.field], allowed_terms, self._index()):
             return EvalResult(
                 field=self.field,
                 requirement=self.requirement,
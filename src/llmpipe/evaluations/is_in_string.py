@@ -2,6 +2,11 @@ from dataclasses import dataclass
 from typing import Dict
 
 from llmpipe.evaluations.core import Evaluation, EvalResult
+from llmpipe.evaluations.string_index import get_string_index
+
+
+#: Target strings of at least this many characters are searched with a cached index (see `StringIndex`)
+INDEX_MIN_CHARS = 4096
 
 
 @dataclass
@@ -20,7 +25,13 @@ class IsInString(Evaluation):
     in_string2 = IsInString(field="word", target_string_field="text")
     print(in_string2(word="dog", text="The dog barks"))  # PASS
     print(in_string2(word="cat", text="The dog barks"))  # FAIL
+
+    # Offset of the (stripped) field value in the target string
+    print(in_string2.find(word="dog", text="The dog barks"))  # 4
     ```
+
+    Long target strings are indexed once per string object, so checking many values against the same
+    document, e.g., every generated item across revision rounds, does not scan the document each time.
     """
     target_string: str = None
     target_string_field: str = None
@@ -34,17 +45,20 @@ class IsInString(Evaluation):
             elif not self.target_string and self.target_string_field:
                 self.requirement = "Must be contained in: {{" + self.target_string_field + "}}"
 
-    def __call__(self, **inputs) -> EvalResult:
-        text = inputs[self.field].lower().strip()
+    def find(self, **inputs) -> int:
+        """Returns the offset of the first case-insensitive occurrence of the stripped field value in the target string, or -1"""
+        text = inputs[self.field].strip()
         target = self.target_string or ""
-        
+
         if self.target_string_field is not None and self.target_string_field in inputs:
             target = inputs[self.target_string_field] or ""
-            
-        # Convert target to lowercase for case-insensitive comparison
-        target = target.lower()
-        
-        if text not in target:
+
+        if len(target) < INDEX_MIN_CHARS:
+            return target.lower().find(text.lower())
+        return get_string_index(target).find(text)
+
+    def __call__(self, **inputs) -> EvalResult:
+        if self.find(**inputs) == -1:
             return EvalResult(
                 field=self.field,
                 requirement=self.requirement,
@@ -1,9 +1,10 @@
 from dataclasses import dataclass, field
-from typing import List
+from typing import Dict, List
 
 from llmpipe.field import Input, Output
 from llmpipe.prompt_module import PromptModule
 from llmpipe.evaluations.core import Evaluation, EvalResult
+from llmpipe.evaluations.cache_utils import IdentityCache
 
 
 @dataclass
@@ -45,14 +46,167 @@ class LlmEvaluation(Evaluation):
                 if self.use_cot else
                 [evaluation_result, reason]
             ),
+            label="LlmEvaluation",
             **kwargs
         )
 
     def __call__(self, **sample):
-        result = self.generator(**{k: v for k, v in sample.items() if k != "requirement"}, requirement=self.requirement)
+        # The generator is forked so that evaluations of different samples can run on separate threads
+        result = self.generator.fork()(**{k: v for k, v in sample.items() if k != "requirement"}, requirement=self.requirement)
         return EvalResult(
             field=self.field,
             requirement=self.requirement,
             evaluation_result=result["evaluation_result"],
             reason=result["reason"]
         )
+
+    async def acall(self, **sample):
+        result = await self.generator.aforward_one(**{k: v for k, v in sample.items() if k != "requirement"}, requirement=self.requirement)
+        return EvalResult(
+            field=self.field,
+            requirement=self.requirement,
+            evaluation_result=result["evaluation_result"],
+            reason=result["reason"]
+        )
+
+
+@dataclass
+class FusedLlmEvaluation(Evaluation):
+    """Several LLM-as-a-judge evaluations of one field, checked in a single judge call
+
+    The judge is given the numbered requirements and returns a PASS/FAIL result and a reason for each, which
+    are mapped back to one `EvalResult` per evaluation. A requirement whose result cannot be parsed is checked
+    by its own evaluation instead.
+
+    ### Usage
+
+    ```
+    fused = FusedLlmEvaluation(field="answer", evaluations=[
+        LlmEvaluation(field="answer", requirement="Is polite"),
+        LlmEvaluation(field="answer", requirement="Answers the question"),
+    ])
+    print(fused.evaluate(question="Why?", answer="Because."))  # One result per requirement
+    ```
+    """
+    requirement: str = None
+    type: str = "llm"
+    evaluations: List[LlmEvaluation] = field(default_factory=lambda: [])  #: The evaluations to fuse, all of `field`
+
+    @property
+    def tokens(self):
+        return self.generator.tokens
+
+    def __post_init__(self, **kwargs):
+        if not self.requirement:
+            self.requirement = "; ".join(x.requirement for x in self.evaluations)
+
+        inputs = {}
+        for evaluation in self.evaluations:
+            for x in evaluation.inputs:
+                inputs.setdefault(x.name, x)
+        field_description = next((x.field_description for x in self.evaluations if x.field_description), "")
+        judge_inputs = (
+            list(inputs.values()) +
+            [Input(self.field, field_description)] +
+            [Input("requirements", f"Numbered requirements for `{self.field}`")]
+        )
+
+        outputs = []
+        if any(x.use_cot for x in self.evaluations):
+            outputs.append(Output("thinking", "Begin by thinking step by step"))
+        for idx in range(1, len(self.evaluations) + 1):
+            outputs.append(Output(
+                name=f"evaluation_result_{idx}",
+                description=f"PASS if `{self.field}` meets requirement {idx} in `requirements`, FAIL otherwise",
+                inputs=judge_inputs,
+                evaluations=[{"type": "is_in", "value": ["PASS", "FAIL"]}]
+            ))
+            outputs.append(Output(
+                f"reason_{idx}",
+                f"A reason for the evaluation result of requirement {idx}. Leave blank when the evaluation passes."
+            ))
+
+        self.generator = PromptModule(
+            task="Determine if an input meets each of several requirements.",
+            inputs=judge_inputs,
+            outputs=outputs,
+            label="FusedLlmEvaluation",
+            **kwargs
+        )
+
+    @property
+    def _requirements(self) -> str:
+        return "\n".join(f"{idx}. {x.requirement}" for idx, x in enumerate(self.evaluations, 1))
+
+    def _results(self, result: Dict) -> List[EvalResult]:
+        """Maps a judge response to one result per evaluation, with None for results that could not be parsed"""
+        results = []
+        for idx, evaluation in enumerate(self.evaluations, 1):
+            evaluation_result = (result.get(f"evaluation_result_{idx}") or "").strip().upper()
+            if evaluation_result not in ("PASS", "FAIL"):
+                results.append(None)
+                continue
+            results.append(EvalResult(
+                field=self.field,
+                requirement=evaluation.requirement,
+                evaluation_result=evaluation_result,
+                reason=result.get(f"reason_{idx}") or ""
+            ))
+        return results
+
+    def _fallback(self, evaluation: LlmEvaluation) -> LlmEvaluation:
+        """Returns an evaluation with its judge configured like the fused judge"""
+        for name in ("model", "verbose", "cache", "tokens", "metrics"):
+            setattr(evaluation.generator, name, getattr(self.generator, name))
+        return evaluation
+
+    def evaluate(self, **sample) -> List[EvalResult]:
+        # The generator is forked so that evaluations of different samples can run on separate threads
+        result = self.generator.fork()(**{k: v for k, v in sample.items() if k != "requirements"}, requirements=self._requirements)
+        return [
+            x if x is not None else self._fallback(evaluation)(**sample)
+            for x, evaluation in zip(self._results(result), self.evaluations)
+        ]
+
+    async def aevaluate(self, **sample) -> List[EvalResult]:
+        result = await self.generator.aforward_one(**{k: v for k, v in sample.items() if k != "requirements"}, requirements=self._requirements)
+        return [
+            x if x is not None else await self._fallback(evaluation).acall(**sample)
+            for x, evaluation in zip(self._results(result), self.evaluations)
+        ]
+
+    def __call__(self, **sample) -> EvalResult:
+        """Returns the first failed result, or a passing result if every requirement is met"""
+        results = self.evaluate(**sample)
+        return next(
+            (x for x in results if x.evaluation_result != "PASS"),
+            EvalResult(field=self.field, requirement=self.requirement, evaluation_result="PASS")
+        )
+
+    async def acall(self, **sample) -> EvalResult:
+        results = await self.aevaluate(**sample)
+        return next(
+            (x for x in results if x.evaluation_result != "PASS"),
+            EvalResult(field=self.field, requirement=self.requirement, evaluation_result="PASS")
+        )
+
+
+_fused = IdentityCache()
+
+
+def fuse_llm_evaluations(evaluations: List[Evaluation]) -> List[Evaluation]:
+    """Returns a field's evaluations with its llm evaluations replaced by one `FusedLlmEvaluation`, placed last
+
+    Fields with fewer than two llm evaluations are returned unchanged. Fused evaluations are cached by the
+    identity of the list of evaluations, e.g., `Output.evaluations`, so the judge prompt is built once.
+    """
+    llm_evaluations = [x for x in evaluations if isinstance(x, LlmEvaluation)]
+    if len(llm_evaluations) < 2:
+        return list(evaluations)
+    fused = _fused.get(
+        evaluations,
+        None,
+        lambda: (len(evaluations), FusedLlmEvaluation(field=llm_evaluations[0].field, evaluations=llm_evaluations)),
+        lambda x: x[0]
+    )[1]
+    return [x for x in evaluations if not isinstance(x, LlmEvaluation)] + [fused]
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import List
 
 from llmpipe.evaluations.core import Evaluation, EvalResult
 
@@ -14,6 +15,10 @@ class MaxCharacters(Evaluation):
         if not self.requirement:
             self.requirement = f"Has at most {self.max_chars} characters"
 
+    def _batch_mask(self, values: List[str], /, **columns: List) -> List[bool]:
+        import polars as pl
+        return (pl.Series(values).str.len_chars() <= self.max_chars).to_list()
+
     def __call__(self, **inputs):
         input = inputs[self.field]
         this_len = len(input)
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import List
 
 from llmpipe.evaluations.core import Evaluation, EvalResult
 
@@ -14,6 +15,10 @@ class MaxWords(Evaluation):
         if not self.requirement:
             self.requirement = f"Has at most {self.max_words} words"
 
+    def _batch_mask(self, values: List[str], /, **columns: List) -> List[bool]:
+        import polars as pl
+        return (pl.Series(values).str.count_matches(r"\S+") <= self.max_words).to_list()
+
     def __call__(self, **inputs):
         input = inputs[self.field]
         word_count = len(input.split())
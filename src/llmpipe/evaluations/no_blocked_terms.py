@@ -2,11 +2,16 @@ from dataclasses import dataclass
 from typing import Dict, List
 
 from llmpipe.evaluations.core import Evaluation, EvalResult
+from llmpipe.evaluations.term_matcher import get_matcher
 
 
 @dataclass
 class NoBlockedTerms(Evaluation):
-    """Ensure that a field contains no blocked terms"""
+    """Ensure that a field contains no blocked terms
+
+    Terms are matched as whole words or phrases, ignoring case. Term lists are compiled into a matcher that
+    scans the text once, however many terms there are.
+    """
     blocked_terms: List[str] = None
     blocked_terms_field: str = None
     requirement: str = None
@@ -18,18 +23,23 @@ class NoBlockedTerms(Evaluation):
         elif not self.requirement and not self.blocked_terms and self.blocked_terms_field:
             self.requirement = "Does not contain any of the following: {{" + self.blocked_terms_field + "}}"
 
+    def _batch_mask(self, values: List[str], /, **columns: List) -> List[bool]:
+        if self.blocked_terms_field is not None and self.blocked_terms_field in columns:
+            return None
+        # The compiled matcher is run over the column, rather than a regex, so that word boundaries and
+        # lowercasing are exactly those of the scalar evaluation
+        matcher = get_matcher(self.blocked_terms or [], whole_words=True)
+        return [not matcher.search(x) for x in values]
+
     def __call__(self, **inputs) -> EvalResult:
         text = inputs[self.field]
-        words = text.lower().split()
         matches = []
-        blocked_terms = self.blocked_terms.copy() if self.blocked_terms else []
+        term_lists = [self.blocked_terms or []]
         if self.blocked_terms_field is not None and self.blocked_terms_field in inputs:
-            blocked_terms += inputs[self.blocked_terms_field] or []
-        for term in blocked_terms:
-            if len(term.split()) == 1 and term.lower() in words:
-                matches.append(term)
-            elif len(term.split()) > 1 and term.lower() in text:
-                matches.append(term)
+            term_lists.append(inputs[self.blocked_terms_field] or [])
+        for terms in term_lists:
+            if terms:
+                matches += [terms[idx] for idx in get_matcher(terms, whole_words=True).matches(text)]
         if matches:
             return EvalResult(
                 field=self.field,
@@ -1,5 +1,6 @@
 import re
 from dataclasses import dataclass
+from typing import List
 
 from llmpipe.evaluations.core import Evaluation, EvalResult
 
@@ -24,6 +25,10 @@ class NoLongWords(Evaluation):
         if not self.requirement:
             self.requirement = f"Contains no words with more than {self.max_chars} characters"
 
+    def _batch_mask(self, values: List[str], /, **columns: List) -> List[bool]:
+        import polars as pl
+        return (~pl.Series(values).str.contains(rf"\S{{{self.max_chars + 1},}}")).to_list()
+
     def __call__(self, **inputs) -> EvalResult:
         text = inputs[self.field]
         too_long_words = []
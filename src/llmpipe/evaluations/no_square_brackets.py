@@ -1,5 +1,6 @@
 import re
 from dataclasses import dataclass
+from typing import List
 
 from llmpipe.evaluations.core import Evaluation, EvalResult
 
@@ -10,6 +11,10 @@ class NoSquareBrackets(Evaluation):
     requirement: str = "Does not contain square bracket [placeholders]"
     type: str = "deterministic"
 
+    def _batch_mask(self, values: List[str], /, **columns: List) -> List[bool]:
+        import polars as pl
+        return (~pl.Series(values).str.contains(r'\[.*?\]')).to_list()
+
     def __call__(self, **inputs):
         input = inputs[self.field]
         brackets_pattern = r'\[.*?\]'
@@ -1,7 +1,9 @@
+import os
 from dataclasses import dataclass
 from typing import Dict, List
 
 from llmpipe.evaluations.core import Evaluation, EvalResult
+from llmpipe.evaluations.term_set import HashIndex, get_index, get_term_set
 
 
 @dataclass
@@ -18,10 +20,17 @@ class NotInBlockedList(Evaluation):
     blocked_list2 = NotInBlockedList(field="color", blocked_list_field="bad_colors")
     print(blocked_list2(color="black", bad_colors=["green"]))
     print(blocked_list2(color="green", bad_colors=["green"]))
+
+    blocked_list3 = NotInBlockedList(field="color", blocked_list_path="bad_colors.txt")
+    print(blocked_list3(color="green"))
     ```
+
+    Values are compared case-insensitively, ignoring surrounding whitespace, through a set built once per list.
+    A blocked list file is indexed on first use and memory-mapped (see `llmpipe.evaluations.term_set.get_index`).
     """
     blocked_list: List[str] = None
     blocked_list_field: str = None
+    blocked_list_path: str = None  #: Optional path to a text file with one blocked value per line, or a parquet file with the blocked values in its first column
     requirement: str = None
     type: str = "deterministic"
 
@@ -30,17 +39,38 @@ class NotInBlockedList(Evaluation):
             self.requirement = f"Is not identical to any of the following blocked values: {', '.join(self.blocked_list)}"
         elif not self.requirement and not self.blocked_list and self.blocked_list_field:
             self.requirement = "Is not identical to any of the following blocked values: {{" + self.blocked_list_field + "}}"
+        elif not self.requirement and self.blocked_list_path:
+            self.requirement = f"Is not identical to any of the blocked values listed in {os.path.basename(self.blocked_list_path)}"
+
+    def _index(self) -> HashIndex:
+        """Returns the index of `blocked_list_path`, or None. It stats the file, so it is fetched once per call or batch."""
+        return get_index(self.blocked_list_path, "lower_strip") if self.blocked_list_path is not None else None
+
+    def _is_blocked(self, text: str, blocked_list: List[str] = None, index: HashIndex = None) -> bool:
+        text = text.lower().strip()
+        return (
+            text in get_term_set(self.blocked_list or [], "lower_strip") or
+            (index is not None and text in index) or
+            text in get_term_set(blocked_list or [], "lower_strip")
+        )
+
+    def _batch_mask(self, values: List[str], /, **columns: List) -> List[bool]:
+        if self.blocked_list_field is not None and self.blocked_list_field in columns:
+            return None
+        if self.blocked_list_path is not None:
+            index = self._index()
+            return [not self._is_blocked(x, index=index) for x in values]
+        import polars as pl
+        blocked_list = pl.Series(list(get_term_set(self.blocked_list or [], "lower_strip")), dtype=pl.String)
+        return (~pl.Series(values).str.to_lowercase().str.strip_chars().is_in(blocked_list)).to_list()
 
     def __call__(self, **inputs) -> EvalResult:
-        slash_pattern = r'\b\w+/\w+\b'
         text = inputs[self.field].lower().strip()
-        blocked_list = self.blocked_list.copy() if self.blocked_list else []
+        blocked_list = None
         if self.blocked_list_field is not None and self.blocked_list_field in inputs:
-            blocked_list += inputs[self.blocked_list_field]
-
-        blocked_list = [x.lower().strip() for x in blocked_list]
+            blocked_list = inputs[self.blocked_list_field]
 
-        if text in blocked_list:
+        if self._is_blocked(text, blocked_list, self._index()):
             return EvalResult(
                 field=self.field,
                 requirement=self.requirement,
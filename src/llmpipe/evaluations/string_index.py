@@ -0,0 +1,102 @@
+from typing import Iterable, List, Tuple
+
+from llmpipe.evaluations.cache_utils import IdentityCache
+
+
+class StringIndex:
+    """An index of a document for finding many candidate strings in it without scanning the whole document each time
+
+    The document's substrings of `gram` characters that start at every `step`-th position are indexed. Any
+    occurrence of a candidate of at least `gram + step - 1` characters covers one of them, so the candidate's
+    occurrences are found with `step` lookups and a comparison at each position where its grams occur. The cost
+    depends on the length of the candidate rather than the document. Shorter candidates fall back to a scan.
+
+    ### Usage
+
+    ```
+    index = StringIndex(document)
+    offsets = index.find_all("A line of the document")
+    ```
+
+    Args:
+        text: The document
+        ignore_case: If true, candidates are matched case-insensitively
+        gram: The length of indexed substrings
+        step: The distance between indexed substrings. Larger steps make the index smaller but lookups slower.
+    """
+    def __init__(self, text: str, ignore_case: bool = True, gram: int = 8, step: int = 4):
+        self.text = text
+        self.ignore_case = ignore_case
+        self.gram = gram
+        self.step = step
+        self._text = text.lower() if ignore_case else text
+        # Lowercasing lengthens a few characters, so offsets in the lowercased text are mapped back to `text`
+        self._offsets = None
+        if len(self._text) != len(text):
+            self._offsets = [idx for idx, ch in enumerate(text) for _ in ch.lower()] + [len(text)]
+        self._grams = {}
+        for pos in range(0, len(self._text) - gram + 1, step):
+            self._grams.setdefault(self._text[pos:pos + gram], []).append(pos)
+
+    def find_all(self, candidate: str) -> List[int]:
+        """Returns the offsets in `text` of every occurrence of a candidate, including overlapping occurrences"""
+        needle = candidate.lower() if self.ignore_case else candidate
+        if not needle:
+            return [0]
+        if len(needle) < self.gram + self.step - 1:
+            starts = []
+            start = self._text.find(needle)
+            while start != -1:
+                starts.append(start)
+                start = self._text.find(needle, start + 1)
+        else:
+            starts = set()
+            for j in range(self.step):
+                for pos in self._grams.get(needle[j:j + self.gram], ()):
+                    if pos >= j and self._text.startswith(needle, pos - j):
+                        starts.add(pos - j)
+            starts = sorted(starts)
+        return starts if self._offsets is None else [self._offsets[x] for x in starts]
+
+    def find(self, candidate: str) -> int:
+        """Returns the offset in `text` of the first occurrence of a candidate, or -1 if it is not found"""
+        starts = self.find_all(candidate)
+        return starts[0] if starts else -1
+
+    def __contains__(self, candidate: str) -> bool:
+        return self.find(candidate) != -1
+
+
+_indexes = IdentityCache(maxsize=16)
+
+
+def get_string_index(text: str, ignore_case: bool = True) -> StringIndex:
+    """Returns an index of a document, cached by the identity of the document string
+
+    Checking many candidates against the same document object, e.g., every generated item of a row across
+    revision rounds, builds its index once.
+    """
+    return _indexes.get(text, ignore_case, lambda: StringIndex(text, ignore_case), lambda index: len(index.text))
+
+
+def apply_edits(text: str, edits: Iterable[Tuple[int, int, str]]) -> str:
+    """Replaces spans of a text in one pass
+
+    Args:
+        text: The text to edit
+        edits: The start and end offsets of each span, and its replacement. An edit that overlaps an earlier
+            edit (by start offset) is skipped.
+
+    Returns:
+        str: The edited text
+    """
+    parts = []
+    pos = 0
+    for start, end, replacement in sorted(edits, key=lambda x: (x[0], x[1])):
+        if start < pos:
+            continue
+        parts.append(text[pos:start])
+        parts.append(replacement)
+        pos = end
+    parts.append(text[pos:])
+    return "".join(parts)
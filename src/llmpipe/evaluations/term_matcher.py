@@ -0,0 +1,125 @@
+import functools
+from collections import deque
+from typing import Iterator, List, Sequence, Tuple
+
+from llmpipe.evaluations.cache_utils import IdentityCache
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class TermMatcher:
+    """Finds occurrences of many terms in a text in one pass over the text (Aho-Corasick)
+
+    Terms are compiled once into an automaton, so the cost of a search grows with the length of the text and
+    the number of matches rather than the number of terms. Matching is case-insensitive (both the terms and
+    the text are lowercased).
+
+    ### Usage
+
+    ```
+    matcher = TermMatcher(["bad", "very bad"], whole_words=True)
+    print(matcher.matches("This is Very bad, not badly"))  # [0, 1]
+    ```
+
+    Args:
+        terms: The terms to find
+        whole_words: If true, a match must not be preceded or followed by a letter, digit or underscore, and
+            surrounding whitespace is stripped from the terms. Empty terms never match. Otherwise, terms match
+            anywhere, and empty terms match every text.
+    """
+    def __init__(self, terms: Sequence[str], whole_words: bool = False):
+        self.terms = list(terms)
+        self.whole_words = whole_words
+        # The trie's transitions, failure links and outputs (term index and length) of each node
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        self._always = []
+        for idx, term in enumerate(self.terms):
+            key = term.lower().strip() if whole_words else term.lower()
+            if not key:
+                if not whole_words:
+                    self._always.append(idx)
+                continue
+            node = 0
+            for ch in key:
+                child = self._goto[node].get(ch)
+                if child is None:
+                    child = self._goto[node][ch] = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = child
+            self._out[node].append((idx, len(key)))
+
+        # Failure links point to the node of the longest proper suffix that is also in the trie
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """Yields the start and end offsets and term index of each match, including overlapping matches, in order of end offset
+
+        Offsets are positions in the lowercased text, which only differ from positions in `text` for the
+        few characters whose lowercase form is longer.
+        """
+        text = text.lower()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for end, ch in enumerate(text, 1):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for idx, length in out[node]:
+                start = end - length
+                if self.whole_words and (
+                        (start > 0 and _is_word_char(text[start - 1])) or
+                        (end < len(text) and _is_word_char(text[end]))
+                ):
+                    continue
+                yield start, end, idx
+
+    def matches(self, text: str) -> List[int]:
+        """Returns the indices of the terms found in the text, in term order"""
+        found = set(self._always)
+        found.update(idx for _, _, idx in self.finditer(text))
+        return sorted(found)
+
+    def search(self, text: str) -> bool:
+        """Returns true if any term is found in the text, stopping at the first match"""
+        return bool(self._always) or next(self.finditer(text), None) is not None
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(terms: Tuple[str, ...], whole_words: bool) -> TermMatcher:
+    return TermMatcher(terms, whole_words)
+
+
+_matchers = IdentityCache()
+
+
+def get_matcher(terms: Sequence, whole_words: bool = False) -> TermMatcher:
+    """Returns a compiled matcher for a list of terms, converting non-string terms with `str`
+
+    Matchers are cached by the identity of the list, so evaluating many rows that share a term list (e.g., a
+    per-row `*_field` column built once) compiles it once, and then by the contents of the list. A list whose
+    terms are replaced in place after its first use keeps its original matcher, so pass a new list instead.
+    """
+    if not terms:
+        # Empty lists are often built per call, e.g., `terms or []`, so they are not cached by identity
+        return _compile((), whole_words)
+    return _matchers.get(
+        terms,
+        whole_words,
+        lambda: _compile(tuple(str(x) for x in terms), whole_words),
+        lambda matcher: len(matcher.terms)
+    )
@@ -0,0 +1,156 @@
+import functools
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, Sequence, Tuple
+
+from llmpipe.evaluations.cache_utils import IdentityCache
+
+
+#: Environment variable holding the directory of hash indexes built from term files (default: a temporary directory)
+INDEX_DIR_ENV = "LLMPIPE_INDEX_DIR"
+
+#: Term normalizations, by name. Index files are built for one normalization.
+NORMALIZERS: Dict[str, Callable[[str], str]] = {
+    "lower": lambda x: x.lower(),
+    "lower_strip": lambda x: x.lower().strip(),
+}
+
+_HEADER = struct.Struct("<8sQQ")
+_MAGIC = b"LPHSET1\0"
+_SLOT = struct.Struct("<Q")
+
+
+def term_hash(term: str) -> int:
+    """Returns a non-zero 64-bit hash of a term, stable across processes"""
+    return int.from_bytes(hashlib.blake2b(term.encode(), digest_size=8).digest(), "little") or 1
+
+
+class HashIndex:
+    """A read-only set of terms, stored as an open-addressing hash table of 64-bit term hashes in a file
+
+    The file is memory-mapped rather than read, so opening an index is immediate, and processes that open
+    the same index share its pages. Lookups hash the term and probe the table, so they take constant time
+    however many terms there are. Only hashes are stored, so a term that is not in the set is reported as
+    present with a probability of about (number of terms) / 2^64.
+
+    ### Usage
+
+    ```
+    HashIndex.build(["apple", "banana"], "fruits.idx")
+    print("apple" in HashIndex("fruits.idx"))
+    ```
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._capacity, self._count = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not a hash index")
+        self._mask = self._capacity - 1
+
+    @classmethod
+    def build(cls, terms: Iterable[str], path: str) -> "HashIndex":
+        """Writes an index of terms to `path`, replacing the file atomically, and returns it opened"""
+        hashes = {term_hash(term) for term in terms}
+        capacity = 8
+        while capacity < 2 * len(hashes):
+            capacity *= 2
+        mask = capacity - 1
+        table = array("Q", bytes(8 * capacity))
+        for h in hashes:
+            idx = h & mask
+            while table[idx]:
+                idx = (idx + 1) & mask
+            table[idx] = h
+        if sys.byteorder == "big":
+            table.byteswap()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".index-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, capacity, len(hashes)))
+                f.write(table.tobytes())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return cls(path)
+
+    def __contains__(self, term: str) -> bool:
+        h = term_hash(term)
+        idx = h & self._mask
+        while True:
+            slot = _SLOT.unpack_from(self._mm, _HEADER.size + 8 * idx)[0]
+            if slot == h:
+                return True
+            if not slot:
+                return False
+            idx = (idx + 1) & self._mask
+
+    def __len__(self) -> int:
+        return self._count
+
+
+def read_terms(path: str) -> Iterator[str]:
+    """Reads terms from a parquet file (the first column) or a text file (one term per line, skipping blank lines)"""
+    if path.endswith(".parquet"):
+        import polars as pl
+        for term in pl.read_parquet(path).to_series(0):
+            if term is not None:
+                yield str(term)
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if line:
+                yield line
+
+
+@functools.lru_cache(maxsize=None)
+def _open_index(path: str, mtime_ns: int, size: int, normalize: str) -> HashIndex:
+    directory = os.environ.get(INDEX_DIR_ENV) or os.path.join(tempfile.gettempdir(), "llmpipe-index")
+    key = hashlib.sha256(f"{path}\0{mtime_ns}\0{size}\0{normalize}".encode()).hexdigest()[:32]
+    index_path = os.path.join(directory, f"{key}.idx")
+    if os.path.exists(index_path):
+        return HashIndex(index_path)
+    return HashIndex.build((NORMALIZERS[normalize](term) for term in read_terms(path)), index_path)
+
+
+def get_index(path: str, normalize: str = "lower") -> HashIndex:
+    """Returns the hash index of the normalized terms of a file, building it on first use
+
+    Indexes are saved in `$LLMPIPE_INDEX_DIR` (default: a temporary directory) and keyed by the file's path,
+    modification time and size, so each version of a file is indexed once, by whichever process needs it
+    first, and other processes map the same index.
+
+    Args:
+        path: Path to a parquet file or a text file with one term per line
+        normalize: The name of the normalization applied to the terms (see `NORMALIZERS`)
+    """
+    stat = os.stat(path)
+    return _open_index(os.path.abspath(path), stat.st_mtime_ns, stat.st_size, normalize)
+
+
+@functools.lru_cache(maxsize=256)
+def _term_set(terms: Tuple[str, ...], normalize: str) -> FrozenSet[str]:
+    return frozenset(NORMALIZERS[normalize](term) for term in terms)
+
+
+_term_sets = IdentityCache()
+
+
+def get_term_set(terms: Sequence[str], normalize: str = "lower") -> FrozenSet[str]:
+    """Returns the set of normalized terms of a list, cached by the identity and then the contents of the list"""
+    if not terms:
+        # Empty lists are often built per call, e.g., `terms or []`, so they are not cached by identity
+        return frozenset()
+    # Values hold the length of the list they were built from, since duplicate terms make the set smaller
+    return _term_sets.get(terms, normalize, lambda: (len(terms), _term_set(tuple(terms), normalize)), lambda x: x[0])[1]
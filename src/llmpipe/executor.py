@@ -0,0 +1,298 @@
+import asyncio
+import collections
+import itertools
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, Iterator, List, Union
+
+from llmpipe.metrics import RunMetrics
+
+logger = logging.getLogger(__name__)
+
+ERROR_KEY = "error"  #: The column that holds the error message of samples that raised an exception
+
+
+def samples_from_columns(inputs: Dict[str, List]) -> List[Dict]:
+    """Returns the samples of a columnar dataset"""
+    return [dict(zip(inputs.keys(), values)) for values in zip(*inputs.values())]
+
+
+def columns_from_samples(samples: List[Dict]) -> Dict[str, List]:
+    """Returns a columnar dataset with the union of the samples' keys, filling missing values with None"""
+    keys = {k: None for sample in samples for k in sample}
+    return {k: [sample.get(k) for sample in samples] for k in keys}
+
+
+def _failed(sample: Dict, error: Exception) -> Dict:
+    logger.exception(f"Sample failed: {error}")
+    return sample | {ERROR_KEY: f"{type(error).__name__}: {error}"}
+
+
+@dataclass
+class DedupStats:
+    """Counts samples and the unique samples among them that were run"""
+    samples: int = 0
+    unique: int = 0
+
+    @property
+    def ratio(self) -> float:
+        """The number of samples per unique sample"""
+        return self.samples / self.unique if self.unique else 1.
+
+    @property
+    def total(self):
+        """Returns formatted string containing sample counts and the dedup ratio"""
+        return f"samples: {self.samples:,.0f}, unique: {self.unique:,.0f}, ratio: {self.ratio:,.2f}"
+
+
+def dedup_calls(
+        fn: Callable[..., Dict],
+        key: Callable[[Dict], Hashable],
+        stats: DedupStats = None,
+        max_finished: int = None
+) -> Callable[..., Dict]:
+    """Returns a version of `fn` that runs once per key
+
+    A sample whose key matches a finished or running call gets that call's outputs (or exception) instead
+    of calling `fn` again. Safe to call from several threads at once.
+
+    Args:
+        fn: A function called with a sample as keyword arguments, returning a dictionary of outputs
+        key: A function that returns the key of a sample, e.g., a hash of the columns that `fn` uses
+        stats: Optional sample counts to update
+        max_finished: The maximum number of finished calls whose outputs are kept, least recently used first
+            out. Running calls are always kept. By default, the outputs of every unique sample are kept, so
+            memory grows with the number of unique samples.
+    """
+    futures = {}
+    finished = collections.OrderedDict()
+    lock = threading.Lock()
+
+    def call(**sample):
+        k = key(sample)
+        with lock:
+            future = futures.get(k)
+            first = future is None
+            if first:
+                future = futures[k] = Future()
+            elif k in finished:
+                finished.move_to_end(k)
+            if stats is not None:
+                stats.samples += 1
+                stats.unique += first
+        if first:
+            try:
+                future.set_result(fn(**sample))
+            except Exception as e:
+                future.set_exception(e)
+            with lock:
+                _finish(futures, finished, k, max_finished)
+        return future.result()
+
+    return call
+
+
+def _finish(calls: Dict, finished: collections.OrderedDict, k: Hashable, max_finished: Union[int, None]):
+    """Marks a call as finished, forgetting the least recently used finished calls beyond `max_finished`"""
+    if max_finished is None:
+        return
+    finished[k] = None
+    while len(finished) > max_finished:
+        calls.pop(finished.popitem(last=False)[0], None)
+
+
+def adedup_calls(
+        fn: Callable[..., Awaitable[Dict]],
+        key: Callable[[Dict], Hashable],
+        stats: DedupStats = None,
+        max_finished: int = None
+) -> Callable[..., Awaitable[Dict]]:
+    """Async version of `dedup_calls`"""
+    tasks = {}
+    finished = collections.OrderedDict()
+
+    async def call(**sample):
+        k = key(sample)
+        task = tasks.get(k)
+        if stats is not None:
+            stats.samples += 1
+            stats.unique += task is None
+        if task is None:
+            task = tasks[k] = asyncio.ensure_future(fn(**sample))
+            task.add_done_callback(lambda _: _finish(tasks, finished, k, max_finished))
+        elif k in finished:
+            finished.move_to_end(k)
+        # Cancelling one of the samples sharing a call does not cancel the call
+        return await asyncio.shield(task)
+
+    return call
+
+
+def pack_samples(samples: Iterable[Dict], size: Callable[[Dict], int], budget: int, max_items: int = None) -> Iterator[List[Dict]]:
+    """Groups consecutive samples into packs with a total size of at most `budget`
+
+    A sample larger than `budget` is packed on its own.
+
+    Args:
+        samples: An iterable of samples
+        size: A function that returns the size of a sample, e.g., an estimate of its number of tokens
+        budget: The maximum total size of a pack
+        max_items: An optional maximum number of samples in a pack
+
+    Yields:
+        List[Dict]: Packs of samples, in input order
+    """
+    pack = []
+    total = 0
+    for sample in samples:
+        n = size(sample)
+        if pack and (total + n > budget or (max_items and len(pack) >= max_items)):
+            yield pack
+            pack = []
+            total = 0
+        pack.append(sample)
+        total += n
+    if pack:
+        yield pack
+
+
+def map_samples(
+        fn: Callable[..., Dict],
+        inputs: Dict[str, List],
+        concurrency: int = 1,
+        on_result: Callable[[Dict], None] = None,
+        metrics: RunMetrics = None
+) -> Dict[str, List]:
+    """Applies a function to each sample of a columnar dataset on up to `concurrency` threads
+
+    Requests to LLM providers are network-bound, so threads give the same throughput as processes without
+    forking or pickling the module, and concurrency can be set in the hundreds. `fn` must be safe to call
+    from several threads at once when `concurrency > 1`.
+
+    An exception raised for a sample does not stop the run. The sample's error message is returned in the
+    `error` column, which is only present when at least one sample failed.
+
+    Args:
+        fn: A function called with the sample as keyword arguments, returning a dictionary of outputs
+        inputs: A columnar dataset, as a dictionary of equal length lists
+        concurrency: The maximum number of samples processed at once
+        on_result: An optional function called with each result as soon as it completes, e.g., to save it.
+            Called from the worker threads, in completion order.
+        metrics: Optional run metrics to record each sample to
+
+    Returns:
+        Dict[str, List]: The inputs with the outputs added, in input order
+    """
+    def run(sample):
+        if metrics is not None:
+            metrics.sample_started()
+        try:
+            result = sample | fn(**sample)
+            errors = 0
+        except Exception as e:
+            result = _failed(sample, e)
+            errors = 1
+        if metrics is not None:
+            metrics.sample_finished(errors=errors)
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    samples = samples_from_columns(inputs)
+    if concurrency <= 1 or len(samples) <= 1:
+        return columns_from_samples([run(sample) for sample in samples])
+    executor = ThreadPoolExecutor(max_workers=min(concurrency, len(samples)))
+    try:
+        return columns_from_samples(list(executor.map(run, samples)))
+    finally:
+        # On an interrupt, samples that have not started are cancelled rather than waited for
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def imap_samples(
+        fn: Callable[..., Dict],
+        samples: Iterable[Dict],
+        concurrency: int = 1,
+        ordered: bool = False,
+        metrics: RunMetrics = None
+) -> Iterator[Dict]:
+    """Applies a function to each sample of an iterable on up to `concurrency` threads, yielding results
+
+    Samples are read from `samples` only as threads become free, so memory is bounded by the number of samples
+    in flight rather than the size of the dataset. Errors are captured as in `map_samples`.
+
+    Args:
+        fn: A function called with the sample as keyword arguments, returning a dictionary of outputs
+        samples: An iterable of samples, e.g., a generator reading a file
+        concurrency: The maximum number of samples processed at once
+        ordered: If true, yield results in input order. Otherwise, results are yielded as they complete, so a
+            slow sample does not hold up the others.
+        metrics: Optional run metrics to record each sample to
+
+    Yields:
+        Dict: The samples with the outputs added
+    """
+    def run(sample):
+        if metrics is not None:
+            metrics.sample_started()
+        try:
+            result = sample | fn(**sample)
+            errors = 0
+        except Exception as e:
+            result = _failed(sample, e)
+            errors = 1
+        if metrics is not None:
+            metrics.sample_finished(errors=errors)
+        return result
+
+    samples = iter(samples)
+    if concurrency <= 1:
+        yield from map(run, samples)
+        return
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        pending = collections.deque(executor.submit(run, sample) for sample in itertools.islice(samples, concurrency))
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                done, not_done = wait(pending, return_when=FIRST_COMPLETED)
+                pending = collections.deque(x for x in pending if x in not_done)
+            for future in done:
+                yield future.result()
+                for sample in itertools.islice(samples, 1):
+                    pending.append(executor.submit(run, sample))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def amap_samples(
+        fn: Callable[..., Awaitable[Dict]],
+        inputs: Dict[str, List],
+        concurrency: int = 64,
+        on_result: Callable[[Dict], None] = None,
+        metrics: RunMetrics = None
+) -> Dict[str, List]:
+    """Async version of `map_samples`, applying an async function with at most `concurrency` samples in flight"""
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def run(sample):
+        async with semaphore:
+            if metrics is not None:
+                metrics.sample_started()
+            try:
+                result = sample | await fn(**sample)
+                errors = 0
+            except Exception as e:
+                result = _failed(sample, e)
+                errors = 1
+            if metrics is not None:
+                metrics.sample_finished(errors=errors)
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    return columns_from_samples(await asyncio.gather(*[run(sample) for sample in samples_from_columns(inputs)]))
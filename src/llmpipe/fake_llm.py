@@ -0,0 +1,267 @@
+"""An offline, litellm-compatible fake LLM backend for tests and benchmarks
+
+```
+from llmpipe.fake_llm import FakeLlm, install_fake_llm, lognormal
+
+install_fake_llm(FakeLlm(latency=lognormal(median=0.8, sigma=0.5), rate_limit_rate=0.05))
+module = PromptModule(model="fake/model", ...)
+```
+"""
+import asyncio
+import itertools
+import math
+import random
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterator, AsyncIterator, List, Union
+
+import litellm
+from litellm import CustomLLM, ModelResponse, Usage
+
+from llmpipe.registry import register_model_info
+
+
+#: The litellm provider name. Fake models are identified as "fake/<name>".
+PROVIDER = "fake"
+
+#: Default values for output tags, e.g., so that llm judges pass
+DEFAULT_VALUES = {"evaluation_result": "PASS"}
+
+
+def lognormal(median: float, sigma: float = 0.5) -> Callable[[], float]:
+    """Returns a sampler of log-normally distributed latencies (in seconds) with the given median"""
+    return lambda: random.lognormvariate(math.log(median), sigma)
+
+
+def uniform(low: float, high: float) -> Callable[[], float]:
+    """Returns a sampler of uniformly distributed latencies (in seconds)"""
+    return lambda: random.uniform(low, high)
+
+
+def _text(content: Union[str, List[Dict], None]) -> str:
+    """Returns the text of a message content, which may be a list of content blocks"""
+    if isinstance(content, list):
+        return "".join(block.get("text", "") for block in content)
+    return content or ""
+
+
+def output_tags(prompt: str) -> List[str]:
+    """Returns the output XML tags requested by a prompt module prompt, in order
+
+    Tags are read from the outputs section ("... within XML tags:") up to the "## Inputs" section.
+    """
+    start = prompt.find("within XML tags")
+    if start < 0:
+        return []
+    end = prompt.find("## Inputs", start)
+    section = prompt[start:end if end >= 0 else len(prompt)]
+    return list(dict.fromkeys(re.findall(r"<([A-Za-z_][\w\-.]*)>", section)))
+
+
+def template_responder(values: Dict[str, str] = None) -> Callable[[List[Dict]], str]:
+    """Returns a responder that fills every output tag requested by the last user message
+
+    Args:
+        values: Values for specific tags. Numbered tags, e.g., `reason_2`, default to the value of their
+            unnumbered tag. Other tags are filled with a placeholder.
+    """
+    values = DEFAULT_VALUES | (values or {})
+
+    def respond(messages: List[Dict]) -> str:
+        prompt = next((_text(x["content"]) for x in reversed(messages) if x["role"] == "user"), "")
+        tags = output_tags(prompt)
+        if not tags:
+            return "OK"
+        outputs = "\n".join(
+            f"<{tag}>\n{values.get(tag, values.get(tag.rstrip('0123456789').rstrip('_'), f'Fake {tag}'))}\n</{tag}>"
+            for tag in tags
+        )
+        # Packed prompts ask for the outputs of each item within an item block
+        items = re.findall(r'<item id="(\d+)">', prompt[prompt.rfind("## Inputs"):])
+        if items:
+            return "\n".join(f'<item id="{idx}">\n{outputs}\n</item>' for idx in items)
+        return outputs
+
+    return respond
+
+
+class FakeLlm(CustomLLM):
+    """A litellm custom provider that returns scripted or template-driven responses without network calls
+
+    Responses are taken from `responses` in order (cycling) when provided, otherwise from `responder`,
+    which by default fills every output tag requested by a `PromptModule` prompt. Usage is estimated as
+    one token per four characters.
+
+    Args:
+        responses: Scripted responses, returned in order and repeated when exhausted
+        responder: A function mapping the messages to a response (default: `template_responder()`)
+        latency: Seconds (or a function sampling seconds) before the first token (default: 0)
+        chunk_size: Characters per streaming chunk (default: 16)
+        chunk_delay: Seconds between streaming chunks. Non-streaming calls wait for all chunks. (default: 0)
+        rate_limit_rate: Fraction of calls that fail with a 429 rate limit error (default: 0)
+        server_error_rate: Fraction of calls that fail with a 500 server error (default: 0)
+        timeout_rate: Fraction of calls that time out (default: 0)
+        retry_after: Retry-After header value in seconds for rate limit errors (default: None)
+        seed: Seed for latency and fault sampling (default: None)
+    """
+    def __init__(
+            self,
+            responses: List[str] = None,
+            responder: Callable[[List[Dict]], str] = None,
+            latency: Union[float, Callable[[], float]] = 0.,
+            chunk_size: int = 16,
+            chunk_delay: float = 0.,
+            rate_limit_rate: float = 0.,
+            server_error_rate: float = 0.,
+            timeout_rate: float = 0.,
+            retry_after: float = None,
+            seed: int = None
+    ):
+        super().__init__()
+        self.responses = itertools.cycle(responses) if responses else None
+        self.responder = responder or template_responder()
+        self.latency = latency
+        self.chunk_size = max(chunk_size, 1)
+        self.chunk_delay = chunk_delay
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self.timeout_rate = timeout_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.faults = 0
+        self.chunks = 0  #: The number of streaming chunks sent, including chunks of cancelled streams
+        self._lock = threading.Lock()
+
+    def _respond(self, model: str, messages: List[Dict], optional_params: Dict = None) -> str:
+        """Counts the call, raises an injected fault or returns the response text"""
+        with self._lock:
+            self.calls += 1
+            draw = self.random.random()
+            response = next(self.responses) if self.responses else None
+        for rate, error in (
+                (self.rate_limit_rate, self._rate_limit_error),
+                (self.server_error_rate, self._server_error),
+                (self.timeout_rate, self._timeout_error)
+        ):
+            if draw < rate:
+                with self._lock:
+                    self.faults += 1
+                raise error(model)
+            draw -= rate
+        if response is None:
+            response = self.responder(messages)
+        # With an assistant prefill, the response continues the prefill
+        if messages and messages[-1]["role"] == "assistant":
+            prefill = _text(messages[-1]["content"])
+            if response.startswith(prefill):
+                response = response[len(prefill):]
+        # Generation ends before the first stop sequence, which is not returned
+        stop = (optional_params or {}).get("stop") or []
+        for sequence in [stop] if isinstance(stop, str) else stop:
+            if sequence in response:
+                response = response[:response.index(sequence)]
+        return response
+
+    def _rate_limit_error(self, model: str) -> Exception:
+        error = litellm.RateLimitError("Fake rate limit", llm_provider=PROVIDER, model=model)
+        if self.retry_after is not None:
+            error.litellm_response_headers = {"retry-after": str(self.retry_after)}
+        return error
+
+    @staticmethod
+    def _server_error(model: str) -> Exception:
+        return litellm.InternalServerError("Fake server error", llm_provider=PROVIDER, model=model)
+
+    @staticmethod
+    def _timeout_error(model: str) -> Exception:
+        return litellm.Timeout("Fake timeout", model=model, llm_provider=PROVIDER)
+
+    def _latency(self) -> float:
+        return self.latency() if callable(self.latency) else self.latency
+
+    def _chunks(self, text: str) -> List[str]:
+        return [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)] or [""]
+
+    @staticmethod
+    def _usage(messages: List[Dict], text: str) -> Dict:
+        prompt_tokens = math.ceil(sum(len(_text(x.get("content"))) for x in messages) / 4)
+        completion_tokens = math.ceil(len(text) / 4)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+
+    def _model_response(self, model_response: ModelResponse, model: str, messages: List[Dict], text: str) -> ModelResponse:
+        """Fills the response object provided by litellm"""
+        model_response.model = model
+        model_response.choices[0].message.content = text
+        model_response.choices[0].finish_reason = "stop"
+        model_response.usage = Usage(**self._usage(messages, text))
+        return model_response
+
+    def _stream_chunks(self, messages: List[Dict], text: str) -> Iterator[Dict]:
+        chunks = self._chunks(text)
+        for i, chunk in enumerate(chunks):
+            finished = i == len(chunks) - 1
+            yield {
+                "text": chunk,
+                "tool_use": None,
+                "is_finished": finished,
+                "finish_reason": "stop" if finished else "",
+                "usage": self._usage(messages, text) if finished else None,
+                "index": 0
+            }
+
+    def completion(self, model: str, messages: list, api_base: str, custom_prompt_dict: dict, model_response: ModelResponse, *args, **kwargs) -> ModelResponse:
+        text = self._respond(model, messages, kwargs.get("optional_params"))
+        time.sleep(self._latency() + self.chunk_delay * (len(self._chunks(text)) - 1))
+        return self._model_response(model_response, model, messages, text)
+
+    async def acompletion(self, model: str, messages: list, api_base: str, custom_prompt_dict: dict, model_response: ModelResponse, *args, **kwargs) -> ModelResponse:
+        text = self._respond(model, messages, kwargs.get("optional_params"))
+        await asyncio.sleep(self._latency() + self.chunk_delay * (len(self._chunks(text)) - 1))
+        return self._model_response(model_response, model, messages, text)
+
+    def streaming(self, model: str, messages: list, *args, **kwargs) -> Iterator[Dict]:
+        text = self._respond(model, messages, kwargs.get("optional_params"))
+        time.sleep(self._latency())
+        for i, chunk in enumerate(self._stream_chunks(messages, text)):
+            if i:
+                time.sleep(self.chunk_delay)
+            with self._lock:
+                self.chunks += 1
+            yield chunk
+
+    async def astreaming(self, model: str, messages: list, *args, **kwargs) -> AsyncIterator[Dict]:
+        text = self._respond(model, messages, kwargs.get("optional_params"))
+        await asyncio.sleep(self._latency())
+        for i, chunk in enumerate(self._stream_chunks(messages, text)):
+            if i:
+                await asyncio.sleep(self.chunk_delay)
+            with self._lock:
+                self.chunks += 1
+            yield chunk
+
+
+def install_fake_llm(fake: FakeLlm = None, models: List[str] = ("fake/model",), **model_info) -> FakeLlm:
+    """Registers a fake LLM as the litellm "fake" provider
+
+    Args:
+        fake: The fake LLM (default: `FakeLlm()`)
+        models: Model identifiers to register model info for, e.g., "fake/model"
+        **model_info: Model info for the models, e.g., `supports_assistant_prefill=True`. Fake models support stop sequences.
+
+    Returns:
+        FakeLlm: The installed fake LLM
+    """
+    fake = fake or FakeLlm()
+    litellm.custom_provider_map = [
+        x for x in litellm.custom_provider_map if x["provider"] != PROVIDER
+    ] + [{"provider": PROVIDER, "custom_handler": fake}]
+    litellm.utils.custom_llm_setup()
+    for model in models:
+        register_model_info(model, **({"supported_openai_params": ["stop", "stream", "max_tokens", "temperature", "top_p"]} | model_info))
+    return fake
@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field, asdict
-from typing import List, Union, Dict
+from typing import List, Tuple, Union, Dict
 from io import StringIO
 
 from llmpipe.evaluations import eval_factory, Evaluation
@@ -84,6 +84,15 @@ class Output(Input):
         return x
 
 
+def fields_key(fields: List[Input]) -> Tuple:
+    """Returns a key that changes when fields are added, removed or replaced, or their names, descriptions
+    or evaluations change. Used to tell when a prompt built from the fields needs to be rebuilt."""
+    return tuple(
+        (id(x), x.name, x.description, tuple(id(e) for e in getattr(x, "evaluations", None) or []))
+        for x in fields
+    )
+
+
 @dataclass
 class JsonOutput(Output):
     def process(self, x):
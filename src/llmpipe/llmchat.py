@@ -1,16 +1,65 @@
+import asyncio
+import contextlib
+import copy
+import inspect
 import json
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Dict, List, Callable, Union, Generator, Annotated
+from typing import Dict, List, Tuple, Callable, Union, Generator, AsyncGenerator, Annotated, TYPE_CHECKING
 import yaml
 import typer
 
-from litellm import completion, ModelResponse, get_model_info, stream_chunk_builder
-from litellm.utils import function_to_dict
+from llmpipe.cache import CacheStats, get_cache
+from llmpipe.metrics import RunMetrics
+from llmpipe.registry import get_model_info, get_tool_schema
+from llmpipe.rate_limit import RateLimiter, get_rate_limiter, set_rate_limit
+from llmpipe.retry import RetryPolicy, RetryStats, call_with_retries, acall_with_retries, get_circuit_breaker
+from llmpipe.usage import UsageRecord, get_ledger
 
 
 logger = logging.getLogger(__name__)
 
+if TYPE_CHECKING:
+    from litellm import ModelResponse
+
+
+# litellm takes seconds to import, so it is imported on the first request rather than with llmpipe
+def completion(*args, **kwargs) -> "ModelResponse":
+    """Calls `litellm.completion`"""
+    import litellm
+    return litellm.completion(*args, **kwargs)
+
+
+async def acompletion(*args, **kwargs) -> "ModelResponse":
+    """Calls `litellm.acompletion`"""
+    import litellm
+    return await litellm.acompletion(*args, **kwargs)
+
+
+def stream_chunk_builder(*args, **kwargs) -> "ModelResponse":
+    """Calls `litellm.stream_chunk_builder`"""
+    import litellm
+    return litellm.stream_chunk_builder(*args, **kwargs)
+
+
+def token_counter(*args, **kwargs) -> int:
+    """Calls `litellm.token_counter`"""
+    import litellm
+    return litellm.token_counter(*args, **kwargs)
+
+
+def completion_cost(*args, **kwargs) -> float:
+    """Lazy wrapper around `litellm.completion_cost`"""
+    import litellm
+    return litellm.completion_cost(*args, **kwargs)
+
+
+# Token and cache counters are shared by forked modules running in different threads
+_tokens_lock = threading.Lock()
+
 
 @dataclass
 class Tokens:
@@ -19,30 +68,53 @@ class Tokens:
     last_output_tokens: int = 0
     input_tokens: int = 0
     output_tokens: int = 0
+    last_cached_input_tokens: int = 0  #: Input tokens read from the provider's prompt cache (included in input tokens)
+    cached_input_tokens: int = 0
 
     def __add__(self, other):
         return Tokens(
             input_tokens=self.input_tokens + other.input_tokens,
             output_tokens=self.output_tokens + other.output_tokens,
+            cached_input_tokens=self.cached_input_tokens + other.cached_input_tokens,
             last_input_tokens=self.last_input_tokens,
-            last_output_tokens=self.last_output_tokens
+            last_output_tokens=self.last_output_tokens,
+            last_cached_input_tokens=self.last_cached_input_tokens
         )
 
-    def add(self, input_tokens, output_tokens):
-        self.last_input_tokens = input_tokens
-        self.input_tokens += input_tokens
-        self.last_output_tokens = output_tokens
-        self.output_tokens += output_tokens
+    def add(self, input_tokens, output_tokens, cached_input_tokens=0):
+        with _tokens_lock:
+            self.last_input_tokens = input_tokens
+            self.input_tokens += input_tokens
+            self.last_output_tokens = output_tokens
+            self.output_tokens += output_tokens
+            self.last_cached_input_tokens = cached_input_tokens
+            self.cached_input_tokens += cached_input_tokens
 
     @property
     def last(self):
         """Returns formatted string containing last message token counts"""
-        return f"in: {self.last_input_tokens:,.0f}, out: {self.last_output_tokens:,.0f}"
+        cached = f", cached: {self.last_cached_input_tokens:,.0f}" if self.last_cached_input_tokens else ""
+        return f"in: {self.last_input_tokens:,.0f}, out: {self.last_output_tokens:,.0f}{cached}"
 
     @property
     def total(self):
         """Returns formatted string containing total token counts"""
-        return f"in: {self.input_tokens:,.0f}, out: {self.output_tokens:,.0f}"
+        cached = f", cached: {self.cached_input_tokens:,.0f}" if self.cached_input_tokens else ""
+        return f"in: {self.input_tokens:,.0f}, out: {self.output_tokens:,.0f}{cached}"
+
+
+def cached_input_tokens(usage) -> int:
+    """Returns the number of input tokens read from the provider's prompt cache"""
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or getattr(usage, "cache_read_input_tokens", None)
+    return cached if isinstance(cached, int) else 0
+
+
+def reasoning_tokens(usage) -> int:
+    """Returns the number of output tokens used for reasoning"""
+    details = getattr(usage, "completion_tokens_details", None)
+    reasoning = getattr(details, "reasoning_tokens", None)
+    return reasoning if isinstance(reasoning, int) else 0
 
 
 @dataclass
@@ -66,26 +138,33 @@ class LlmChat:
     temperature: float = 0.0  #: The sampling temperature to use for generation (default: 0.)
     tools: List[Callable] = None  #: An optional list of tools as python functions (default: None)
     max_tool_calls: int = 6  #: The maximum number of sequential tool calls (default: 6)
+    tool_workers: int = 8  #: The maximum number of tool calls from one turn to run concurrently (default: 8)
     stream: bool = False  #: If true, use streaming API mode
+    cache_path: str = None  #: Path to an on-disk response cache. Responses are not cached when not provided (default: None)
+    cache_sampled: bool = True  #: If false, bypass the response cache when temperature > 0 (default: True)
+    rpm: int = None  #: Requests per minute limit for `model`, shared by all modules and processes (default: None)
+    tpm: int = None  #: Tokens per minute limit for `model`, shared by all modules and processes (default: None)
+    max_retries: int = 5  #: The maximum number of retries for transient errors such as rate limits and timeouts (default: 5)
+    label: str = None  #: A label for the usage ledger (default: the class name)
 
     def __post_init__(self):
-        assert not self.tools or not self.stream  # Disable tool calling in streaming mode
         self.history = []
         self.clear_history()
         self.tokens = Tokens()
+        self.cache = get_cache(self.cache_path) if self.cache_path else None
+        self.cache_stats = CacheStats()
+        self.retry_policy = RetryPolicy(max_retries=self.max_retries)
+        self.retry_stats = RetryStats()
+        self.metrics = RunMetrics()
         self.tool_schemas = []
         model_info = get_model_info(model=self.model)
         self.supports_assistant_prefill = model_info["supports_assistant_prefill"]
         self.supports_function_calling = model_info["supports_function_calling"]
+        self.supports_prompt_caching = model_info.get("supports_prompt_caching") or False
+        self.supports_stop = "stop" in (model_info.get("supported_openai_params") or [])
         assert not self.tools or self.supports_function_calling
         if self.tools:
-            self.tool_schemas = [
-                {
-                    "type": "function",
-                    "function": function_to_dict(function)
-                }
-                for function in self.tools
-            ]
+            self.tool_schemas = [get_tool_schema(function) for function in self.tools]
             self.tools_map = {
                 schema["function"]["name"]: function
                 for schema, function in zip(self.tool_schemas, self.tools)
@@ -98,7 +177,12 @@ class LlmChat:
             "max_tokens": self.max_tokens,
             "top_p": self.top_p,
             "top_k": self.top_k,
-            "temperature": self.temperature
+            "temperature": self.temperature,
+            "cache_path": self.cache_path,
+            "cache_sampled": self.cache_sampled,
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "max_retries": self.max_retries
         }
 
     def clear_history(self):
@@ -107,46 +191,303 @@ class LlmChat:
         if self.system_prompt:
             self.history.append({"role": "system", "content": self.system_prompt})
 
-    def get_tool_responses(self, tool_calls):
+    def _call_tool(self, name: str, arguments: str):
+        """Calls a tool with json-encoded arguments, in a new event loop if the tool is an async function"""
+        function_to_call = self.tools_map[name]
+        function_args = json.loads(arguments or "{}")
+        if inspect.iscoroutinefunction(function_to_call):
+            return asyncio.run(function_to_call(**function_args))
+        return function_to_call(**function_args)
+
+    async def _acall_tool(self, name: str, arguments: str):
+        """Async version of `_call_tool`. Synchronous tools run in a worker thread."""
+        function_to_call = self.tools_map[name]
+        function_args = json.loads(arguments or "{}")
+        if inspect.iscoroutinefunction(function_to_call):
+            return await function_to_call(**function_args)
+        return await asyncio.to_thread(function_to_call, **function_args)
+
+    def _run_tool(self, tool_call):
+        return self._call_tool(tool_call.function.name, tool_call.function.arguments)
+
+    async def _arun_tool(self, tool_call):
+        return await self._acall_tool(tool_call.function.name, tool_call.function.arguments)
+
+    def _add_tool_responses(self, tool_calls, function_responses) -> str:
+        """Adds tool responses to the history, in tool call order, and returns them formatted as text"""
         response_text = ""
-        for tool_call in tool_calls:
+        for tool_call, function_response in zip(tool_calls, function_responses):
             response_text += "\n\n#### Tool call:\n\n" + json.dumps(dict(tool_call.function), indent=2)
-            function_name = tool_call.function.name
-            function_to_call = self.tools_map[function_name]
-            function_args = json.loads(tool_call.function.arguments)
-            function_response = function_to_call(**function_args)
             response_text += "\n\n#### Tool response:\n\n" + str(function_response or "")
             self.history.append({
                 "tool_call_id": tool_call.id,
                 "role": "tool",
-                "name": function_name,
+                "name": tool_call.function.name,
                 "content": function_response,
             })
         return response_text + "\n\n"
 
-    def _call(self, prompt: str = "", prefill: str = "", tool_call_depth: int = 0) -> ModelResponse:
+    def get_tool_responses(self, tool_calls):
+        """Runs the tool calls from one turn, concurrently on up to `tool_workers` threads"""
+        if len(tool_calls) > 1 and self.tool_workers > 1:
+            with ThreadPoolExecutor(max_workers=min(self.tool_workers, len(tool_calls))) as executor:
+                function_responses = list(executor.map(self._run_tool, tool_calls))
+        else:
+            function_responses = [self._run_tool(tool_call) for tool_call in tool_calls]
+        return self._add_tool_responses(tool_calls, function_responses)
+
+    async def aget_tool_responses(self, tool_calls):
+        """Async version of `get_tool_responses`"""
+        semaphore = asyncio.Semaphore(max(self.tool_workers, 1))
+
+        async def run(tool_call):
+            async with semaphore:
+                return await self._arun_tool(tool_call)
+
+        function_responses = await asyncio.gather(*[run(tool_call) for tool_call in tool_calls])
+        return self._add_tool_responses(tool_calls, function_responses)
+
+    def fork(self) -> "LlmChat":
+        """Returns a shallow copy with its own chat history
+
+        The copy shares configuration and the `tokens` counter with the original, so concurrent
+        calls on separate forks are accounted for in one place.
+        """
+        chat = copy.copy(self)
+        chat.clear_history()
+        return chat
+
+    def _messages(self, prompt: Union[str, List[Dict]] = "", prefill: str = "") -> List[Dict]:
+        """Adds the prompt (a string or a list of content blocks) to the history and returns the messages to send"""
         assert not prefill or self.supports_assistant_prefill
         if prompt:
             self.history.append({"role": "user", "content": prompt})
-        messages = (
+        return (
             self.history
             if not prefill else
             self.history + [{"role": "assistant", "content": prefill}]
         )
+
+    def _completion_args(self, messages: List[Dict], **kwargs) -> Dict:
+        """Returns keyword arguments for a litellm completion request"""
         completion_args = {"tools": self.tool_schemas} if self.tool_schemas else {}
-        response = completion(
+        return dict(
             model=self.model,
             messages=messages,
             top_p=self.top_p,
             # top_k=self.top_k,
             temperature=self.temperature,
             max_tokens=self.max_tokens,
-            **completion_args
+            **completion_args,
+            **kwargs
+        )
+
+    def _cache_key(self, completion_args: Dict) -> Union[str, None]:
+        """Returns the response cache key for a request, or None if the request should not be cached"""
+        if self.cache is None or (self.temperature > 0 and not self.cache_sampled):
+            return None
+        return self.cache.key(completion_args)
+
+    def _cache_get(self, key: Union[str, None]) -> Union["ModelResponse", None]:
+        """Returns a cached response, updating the hit and miss counts"""
+        if key is None:
+            return None
+        cached = self.cache.get(key)
+        with _tokens_lock:
+            if cached is None:
+                self.cache_stats.misses += 1
+            else:
+                self.cache_stats.hits += 1
+        if cached is None:
+            return None
+        from litellm import ModelResponse
+        return ModelResponse(**cached)
+
+    def _cache_set(self, key: Union[str, None], response: "ModelResponse"):
+        if key is not None:
+            self.cache.set(key, response.model_dump(mode="json", warnings=False))
+
+    def _rate_limiter(self) -> Union[RateLimiter, None]:
+        """Returns the rate limiter for `model`, if one is configured"""
+        if self.rpm or self.tpm:
+            return set_rate_limit(self.model, rpm=self.rpm, tpm=self.tpm)
+        return get_rate_limiter(self.model)
+
+    def _estimate_tokens(self, completion_args: Dict) -> int:
+        """Estimates the number of input tokens for a request"""
+        try:
+            return token_counter(model=self.model, messages=completion_args["messages"])
+        except Exception:
+            return sum(len(str(x.get("content") or "")) for x in completion_args["messages"]) // 4
+
+    def _throttle(self, completion_args: Dict) -> int:
+        """Blocks until the rate limiter admits a request. Returns the number of tokens debited."""
+        limiter = self._rate_limiter()
+        if limiter is None:
+            return 0
+        tokens = self._estimate_tokens(completion_args) if limiter.tpm else 0
+        limiter.acquire(tokens)
+        return tokens
+
+    async def _athrottle(self, completion_args: Dict) -> int:
+        """Async version of `_throttle`"""
+        limiter = self._rate_limiter()
+        if limiter is None:
+            return 0
+        tokens = self._estimate_tokens(completion_args) if limiter.tpm else 0
+        await limiter.aacquire(tokens)
+        return tokens
+
+    def _settle(self, debited_tokens: int, response: "ModelResponse"):
+        """Debits the rate limiter for actual token usage in excess of the estimate"""
+        limiter = self._rate_limiter()
+        if limiter is not None and limiter.tpm:
+            limiter.adjust(response.usage.prompt_tokens + response.usage.completion_tokens - debited_tokens)
+
+    async def _asettle(self, debited_tokens: int, response: "ModelResponse"):
+        """Async version of `_settle`"""
+        limiter = self._rate_limiter()
+        if limiter is not None and limiter.tpm:
+            await limiter.aadjust(response.usage.prompt_tokens + response.usage.completion_tokens - debited_tokens)
+
+    def _add_retry_stats(self, stats: RetryStats, failed: bool):
+        """Adds the retry counts of one request to the module's counts and metrics"""
+        self.retry_stats.add(stats)
+        if stats.retries:
+            self.metrics.record_retries(stats.retries)
+        if failed:
+            self.metrics.record_call_error()
+
+    def _send(self, **completion_args) -> Tuple["ModelResponse", int, float]:
+        """Sends a completion request, retrying transient errors
+
+        Every attempt, including retries, waits for the rate limiter. Returns the response, and the number of
+        tokens debited for and the start time (`time.perf_counter`) of the attempt that succeeded, so that
+        latency excludes backoff and rate limiter waits. A streaming request stays in flight in the metrics
+        until the caller calls `metrics.request_finished`.
+        """
+        stats = RetryStats()
+        failed = True
+        debited_tokens = 0
+        started = None
+
+        def send():
+            nonlocal debited_tokens, started
+            debited_tokens = self._throttle(completion_args)
+            started = time.perf_counter()
+            self.metrics.request_started()
+            try:
+                response = completion(**completion_args)
+            except BaseException:
+                self.metrics.request_finished()
+                raise
+            if not completion_args.get("stream"):
+                self.metrics.request_finished()
+            return response
+
+        try:
+            response = call_with_retries(send, self.retry_policy, get_circuit_breaker(self.model), stats)
+            failed = False
+            return response, debited_tokens, started
+        finally:
+            self._add_retry_stats(stats, failed)
+
+    async def _asend(self, **completion_args) -> Tuple["ModelResponse", int, float]:
+        """Async version of `_send`"""
+        stats = RetryStats()
+        failed = True
+        debited_tokens = 0
+        started = None
+
+        async def send():
+            nonlocal debited_tokens, started
+            debited_tokens = await self._athrottle(completion_args)
+            started = time.perf_counter()
+            self.metrics.request_started()
+            try:
+                response = await acompletion(**completion_args)
+            except BaseException:
+                self.metrics.request_finished()
+                raise
+            if not completion_args.get("stream"):
+                self.metrics.request_finished()
+            return response
+
+        try:
+            response = await acall_with_retries(send, self.retry_policy, get_circuit_breaker(self.model), stats)
+            failed = False
+            return response, debited_tokens, started
+        finally:
+            self._add_retry_stats(stats, failed)
+
+    def _completion(self, **completion_args) -> "ModelResponse":
+        """Sends a (non-streaming) completion request, returning a cached response when available"""
+        key = self._cache_key(completion_args)
+        response = self._cache_get(key)
+        if response is None:
+            response, debited_tokens, start = self._send(**completion_args)
+            self._record_usage(response, latency=time.perf_counter() - start)
+            self._settle(debited_tokens, response)
+            self._cache_set(key, response)
+        else:
+            self._record_usage(response, cache_hit=True)
+        return response
+
+    async def _acompletion(self, **completion_args) -> "ModelResponse":
+        """Async version of `_completion`"""
+        key = self._cache_key(completion_args)
+        response = self._cache_get(key)
+        if response is None:
+            response, debited_tokens, start = await self._asend(**completion_args)
+            self._record_usage(response, latency=time.perf_counter() - start)
+            await self._asettle(debited_tokens, response)
+            self._cache_set(key, response)
+        else:
+            self._record_usage(response, cache_hit=True)
+        return response
+
+    def _record_usage(self, response: "ModelResponse", latency: float = 0., cache_hit: bool = False):
+        """Records the usage of a call to the process-wide usage ledger and the module's metrics"""
+        self.metrics.record_call(latency, response.usage.prompt_tokens, response.usage.completion_tokens, cache_hit)
+        cost = 0.
+        if not cache_hit:
+            try:
+                cost = completion_cost(completion_response=response, model=self.model)
+            except Exception:
+                # Models unknown to litellm have no pricing
+                pass
+        get_ledger().record(UsageRecord(
+            module=self.label or type(self).__name__,
+            model=self.model,
+            input_tokens=response.usage.prompt_tokens,
+            output_tokens=response.usage.completion_tokens,
+            cached_input_tokens=cached_input_tokens(response.usage),
+            reasoning_tokens=reasoning_tokens(response.usage),
+            latency=latency,
+            cost=cost or 0.,
+            cache_hit=cache_hit
+        ))
+
+    def _add_usage(self, response: "ModelResponse"):
+        """Adds the token usage of a response to the token counts"""
+        self.tokens.add(
+            response.usage.prompt_tokens,
+            response.usage.completion_tokens,
+            cached_input_tokens(response.usage)
         )
+
+    def _process_response(self, response: "ModelResponse", prefill: str = "") -> str:
+        """Adds a (non-streaming) response to the history and token counts and returns the response text"""
         response_text = prefill + (response.choices[0].message.content or "")
         response.choices[0].message.content = response_text
         self.history.append(response.choices[0].message.model_dump())
-        self.tokens.add(response.usage.prompt_tokens, response.usage.completion_tokens)
+        self._add_usage(response)
+        return response_text
+
+    def _call(self, prompt: str = "", prefill: str = "", tool_call_depth: int = 0) -> str:
+        messages = self._messages(prompt, prefill)
+        response = self._completion(**self._completion_args(messages))
+        response_text = self._process_response(response, prefill)
 
         tool_calls = response.choices[0].message.tool_calls
         if tool_calls:
@@ -156,48 +497,199 @@ class LlmChat:
 
         return response_text
 
-    def _call_stream(self, prompt: str = "", prefill: str = "", tool_call_depth: int = 0) -> ModelResponse:
-        assert not prefill or self.supports_assistant_prefill
-        if prompt:
-            self.history.append({"role": "user", "content": prompt})
-        messages = (
-            self.history
-            if not prefill else
-            self.history + [{"role": "assistant", "content": prefill}]
-        )
-        completion_args = {"tools": self.tool_schemas} if self.tool_schemas else {}
+    @staticmethod
+    def _add_tool_call_deltas(tool_call_deltas: Dict, chunk) -> List[Dict]:
+        """Accumulates the tool call deltas from a streaming chunk
+
+        Returns:
+            The accumulated tool calls (with keys id, name and arguments) whose arguments are complete with this chunk
+        """
+        completed = []
+        for delta in chunk.choices[0].delta.tool_calls or []:
+            tool_call = tool_call_deltas.setdefault(delta.index, {"id": None, "name": "", "arguments": "", "started": False})
+            tool_call["id"] = delta.id or tool_call["id"]
+            if delta.function:
+                tool_call["name"] = delta.function.name or tool_call["name"]
+                tool_call["arguments"] += delta.function.arguments or ""
+            if not tool_call["started"] and tool_call["id"] and tool_call["name"]:
+                try:
+                    # Arguments are a json object, so they are complete once they parse
+                    json.loads(tool_call["arguments"])
+                except json.JSONDecodeError:
+                    continue
+                tool_call["started"] = True
+                completed.append(tool_call)
+        return completed
+
+    @staticmethod
+    def _close_stream(stream):
+        """Closes a streaming response that was not consumed to the end, so the provider stops generating"""
+        for obj in (stream, getattr(stream, "completion_stream", None)):
+            close = getattr(obj, "close", None)
+            if callable(close):
+                with contextlib.suppress(Exception):
+                    close()
+
+    @staticmethod
+    async def _aclose_stream(stream):
+        """Async version of `_close_stream`"""
+        for obj in (stream, getattr(stream, "completion_stream", None)):
+            close = getattr(obj, "aclose", None) or getattr(obj, "close", None)
+            if callable(close):
+                with contextlib.suppress(Exception):
+                    result = close()
+                    if inspect.isawaitable(result):
+                        await result
+
+    def _stream_args(self, messages: List[Dict], stop: List[str] = None) -> Dict:
+        """Returns completion arguments for a streaming request, with stop sequences if the model supports them"""
+        return self._completion_args(messages, **({"stop": stop} if stop and self.supports_stop else {}))
+
+    def _call_stream(
+            self,
+            prompt: str = "",
+            prefill: str = "",
+            tool_call_depth: int = 0,
+            stop: List[str] = None,
+            stop_when: Callable[[], bool] = None
+    ) -> Generator:
+        """Streams a response
+
+        Args:
+            prompt: The prompt
+            prefill: An optional assistant prefill
+            tool_call_depth: The number of sequential tool calls so far
+            stop: Optional stop sequences, sent if the model supports them
+            stop_when: An optional function checked after each chunk is consumed. When it returns true,
+                the stream is cancelled and tool calls are not run.
+        """
+        messages = self._messages(prompt, prefill)
+        completion_args = self._stream_args(messages, stop)
+        key = self._cache_key(completion_args)
+        response = self._cache_get(key)
 
-        response = completion(
-            model=self.model,
-            messages=messages,
-            top_p=self.top_p,
-            # top_k=self.top_k,
-            temperature=self.temperature,
-            max_tokens=self.max_tokens,
-            stream=True,
-            stream_options={"include_usage": True},
-            **completion_args
-        )
+        yield prefill
+        stopped = False
+        with ThreadPoolExecutor(max_workers=max(self.tool_workers, 1)) if self.tools else contextlib.nullcontext() as executor:
+            # Tool calls are started as soon as their arguments are complete, keyed by tool call id
+            tool_futures = {}
+            if response is not None:
+                self._record_usage(response, cache_hit=True)
+                yield response.choices[0].message.content or ""
+            else:
+                chunks = []
+                tool_call_deltas = {}
+                stream, debited_tokens, start = self._send(**completion_args, stream=True, stream_options={"include_usage": True})
+                try:
+                    for chunk in stream:
+                        chunks.append(chunk)
+                        if not chunk.choices:
+                            continue
+                        chunk_text = chunk.choices[0].delta.content
+                        if chunk_text:
+                            yield chunk_text
+                            if stop_when is not None and stop_when():
+                                stopped = True
+                                self._close_stream(stream)
+                                break
+                        for tool_call in self._add_tool_call_deltas(tool_call_deltas, chunk) if self.tools else []:
+                            tool_futures[tool_call["id"]] = executor.submit(self._call_tool, tool_call["name"], tool_call["arguments"])
+                finally:
+                    self.metrics.request_finished()
+
+                response = stream_chunk_builder(chunks, messages=messages)
+                self._record_usage(response, latency=time.perf_counter() - start)
+                self._settle(debited_tokens, response)
+                # A response cut short by `stop_when` would be served truncated to calls that read it all
+                if not stopped:
+                    self._cache_set(key, response)
+            self.history.append(response.choices[0].message.model_dump())
+            self._add_usage(response)
+
+            tool_calls = None if stopped else response.choices[0].message.tool_calls
+            if tool_calls:
+                for tool_call in tool_calls:
+                    if tool_call.id not in tool_futures:
+                        tool_futures[tool_call.id] = executor.submit(self._run_tool, tool_call)
+                yield self._add_tool_responses(tool_calls, [tool_futures[x.id].result() for x in tool_calls])
+
+        if tool_calls and tool_call_depth < self.max_tool_calls:
+            yield from self._call_stream(tool_call_depth=tool_call_depth + 1, stop=stop, stop_when=stop_when)
+
+    async def _acall(self, prompt: str = "", prefill: str = "", tool_call_depth: int = 0) -> str:
+        messages = self._messages(prompt, prefill)
+        response = await self._acompletion(**self._completion_args(messages))
+        response_text = self._process_response(response, prefill)
+
+        tool_calls = response.choices[0].message.tool_calls
+        if tool_calls:
+            response_text += await self.aget_tool_responses(tool_calls)
+            if tool_call_depth < self.max_tool_calls:
+                response_text += await self._acall(tool_call_depth=tool_call_depth + 1)
+
+        return response_text
+
+    async def _acall_stream(
+            self,
+            prompt: str = "",
+            prefill: str = "",
+            tool_call_depth: int = 0,
+            stop: List[str] = None,
+            stop_when: Callable[[], bool] = None
+    ) -> AsyncGenerator:
+        """Async version of `_call_stream`"""
+        messages = self._messages(prompt, prefill)
+        completion_args = self._stream_args(messages, stop)
+        key = self._cache_key(completion_args)
+        response = self._cache_get(key)
 
         yield prefill
-        chunks = []
-        for chunk in response:
-            chunks.append(chunk)
-            chunk_text = chunk.choices[0].delta.content
-            if chunk_text:
-                yield chunk_text
-
-        response = stream_chunk_builder(chunks, messages=messages)
+        stopped = False
+        # Tool calls are started as soon as their arguments are complete, keyed by tool call id
+        tool_tasks = {}
+        if response is not None:
+            self._record_usage(response, cache_hit=True)
+            yield response.choices[0].message.content or ""
+        else:
+            chunks = []
+            tool_call_deltas = {}
+            stream, debited_tokens, start = await self._asend(**completion_args, stream=True, stream_options={"include_usage": True})
+            try:
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    if not chunk.choices:
+                        continue
+                    chunk_text = chunk.choices[0].delta.content
+                    if chunk_text:
+                        yield chunk_text
+                        if stop_when is not None and stop_when():
+                            stopped = True
+                            await self._aclose_stream(stream)
+                            break
+                    for tool_call in self._add_tool_call_deltas(tool_call_deltas, chunk) if self.tools else []:
+                        tool_tasks[tool_call["id"]] = asyncio.create_task(self._acall_tool(tool_call["name"], tool_call["arguments"]))
+            finally:
+                self.metrics.request_finished()
+
+            response = stream_chunk_builder(chunks, messages=messages)
+            self._record_usage(response, latency=time.perf_counter() - start)
+            await self._asettle(debited_tokens, response)
+            # A response cut short by `stop_when` would be served truncated to calls that read it all
+            if not stopped:
+                self._cache_set(key, response)
         self.history.append(response.choices[0].message.model_dump())
-        self.tokens.add(response.usage.prompt_tokens, response.usage.completion_tokens)
+        self._add_usage(response)
 
-        # tool_calls = response.choices[0].message.tool_calls
-        # if tool_calls:
-        #     response_text += self.get_tool_responses(tool_calls)
-        #     yield response_text
-        #     if tool_call_depth < self.max_tool_calls:
-        #         for chunk in self._call_stream(tool_call_depth=tool_call_depth + 1):
-        #             yield response_text + chunk
+        tool_calls = None if stopped else response.choices[0].message.tool_calls
+        if tool_calls:
+            for tool_call in tool_calls:
+                if tool_call.id not in tool_tasks:
+                    tool_tasks[tool_call.id] = asyncio.create_task(self._arun_tool(tool_call))
+            function_responses = await asyncio.gather(*[tool_tasks[x.id] for x in tool_calls])
+            yield self._add_tool_responses(tool_calls, function_responses)
+            if tool_call_depth < self.max_tool_calls:
+                async for chunk in self._acall_stream(tool_call_depth=tool_call_depth + 1, stop=stop, stop_when=stop_when):
+                    yield chunk
 
     def __call__(self, prompt: str = "", prefill: str = "") -> Union[str, Generator]:
         if not self.stream:
@@ -208,6 +700,16 @@ class LlmChat:
         else:
             return self._call_stream(prompt=prompt, prefill=prefill)
 
+    async def acall(self, prompt: str = "", prefill: str = "") -> Union[str, AsyncGenerator]:
+        """Async version of `__call__`. In streaming mode, returns an async generator."""
+        if not self.stream:
+            response = await self._acall(prompt=prompt, prefill=prefill)
+            logger.info(f"LlmChat response: {response}")
+            logger.info(f"Token counts - Last: {self.tokens.last}, Total: {self.tokens.total}")
+            return response
+        else:
+            return self._acall_stream(prompt=prompt, prefill=prefill)
+
 
 def run_chat_prompt(
     prompt_path: Annotated[str, typer.Argument(help="Path to a text file containing the prompt")],
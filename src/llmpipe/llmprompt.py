@@ -3,7 +3,8 @@ import logging
 from dataclasses import dataclass, field, asdict
 from typing import List, Dict
 
-from llmpipe.field import Input, Output
+from llmpipe.evaluations.llm_eval import fuse_llm_evaluations
+from llmpipe.field import Input, Output, fields_key
 from llmpipe.llmchat import LlmChat
 from llmpipe.template import Template
 from llmpipe.xml_utils import parse_text_for_one_tag
@@ -19,6 +20,7 @@ class LlmPrompt(LlmChat):
     - Constructions a prompt template using the input and output fields.
     - Any Evaluations associated with the outputs will be executed. Non-passing evaluations will be returned.
     - Non-llm evals will be run first.
+    - With `fuse_llm_evaluations`, the llm evals of a field are checked in a single judge call.
     """
     inputs: List[Input] = field(default_factory=lambda: [])  #: Prompt inputs. If not provided, will be inherited from `outputs`.
     outputs: List[Output] = field(default_factory=lambda: [])  #: Prompt outputs
@@ -28,10 +30,12 @@ class LlmPrompt(LlmChat):
     details: str = ""  #: Task details that come after the input output definition sections
     footer: str = None  #: An optional prompt footer (text for the very end of the prompt)
     include_evals_in_prompt: bool = True  #: Whether to include evaluation requirements in the prompt
+    fuse_llm_evaluations: bool = True  #: If true, check all llm evaluations of a field in a single judge call
     verbose: bool = False  #: If true, print additional LLM output to stdout
 
     def __post_init__(self):
         super().__post_init__()
+        self._prompt = None
 
         self.outputs = [
             Output(**x) if isinstance(x, dict) else x
@@ -65,7 +69,16 @@ class LlmPrompt(LlmChat):
 
     @property
     def prompt(self) -> str:
-        """Returns a prompt for generating the output"""
+        """Returns a prompt for generating the output
+
+        The prompt is rebuilt only when the fields or text it is built from change.
+        """
+        key = (self.inputs_header, self.outputs_header, self.task, self.details, self.footer, self.include_evals_in_prompt, fields_key(self.inputs), fields_key(self.outputs))
+        if self._prompt is None or self._prompt[0] != key:
+            self._prompt = (key, self._build_prompt())
+        return self._prompt[1]
+
+    def _build_prompt(self) -> str:
         prompt = ["# Task Description"]
 
         if self.inputs:
@@ -103,20 +116,16 @@ class LlmPrompt(LlmChat):
     def __call__(self, **inputs) -> Dict:
         self.clear_history()
 
-        try:
-            if self.verbose:
-                response_text = ""
-                for chunk in self._call_stream(prompt=Template(self.prompt).format(**inputs)):
-                    print(chunk, flush=True, end="")
-                    response_text += chunk
-                print()
-            else:
-                response_text = self._call(prompt=Template(self.prompt).format(**inputs))
-            logger.info(f"LlmPrompt response: {response_text}")
-            logger.info(f"Token counts - Last: {self.tokens.last}, Total: {self.tokens.total}")
-        except Exception as e:
-            print(e)
+        if self.verbose:
             response_text = ""
+            for chunk in self._call_stream(prompt=Template(self.prompt).format(**inputs)):
+                print(chunk, flush=True, end="")
+                response_text += chunk
+            print()
+        else:
+            response_text = self._call(prompt=Template(self.prompt).format(**inputs))
+        logger.info(f"LlmPrompt response: {response_text}")
+        logger.info(f"Token counts - Last: {self.tokens.last}, Total: {self.tokens.total}")
 
         outputs = {}
         for field in self.outputs:
@@ -133,26 +142,32 @@ class LlmPrompt(LlmChat):
         outputs = {}
 
         for field in self.outputs:
+            evaluations = field.evaluations or []
+            if self.fuse_llm_evaluations:
+                evaluations = fuse_llm_evaluations(evaluations)
             # Initialize separate deterministic and llm-based evaluations
             deterministic_evaluations = []
             llm_evaluations = []
-            for evaluation in field.evaluations or []:
+            for evaluation in evaluations:
                 if evaluation.type == "llm":
                     evaluation.generator.model = self.model
                     evaluation.generator.verbose = self.verbose
+                    evaluation.generator.cache = self.cache
+                    # Judge usage is counted in this module's token counts
+                    evaluation.generator.tokens = self.tokens
                     llm_evaluations.append(evaluation)
                 else:
                     deterministic_evaluations.append(evaluation)
 
             evaluation_results = []
             for evaluation in deterministic_evaluations + llm_evaluations:
-                eval_result = evaluation(**(inputs | outputs))
-                if evaluation.type == "llm":
-                    self.tokens += evaluation.tokens
-                if eval_result.evaluation_result != "PASS":
-                    evaluation_results.append(asdict(eval_result))
-                    if break_after_first_fail:
-                        break
+                for eval_result in evaluation.evaluate(**(inputs | outputs)):
+                    if eval_result.evaluation_result != "PASS":
+                        evaluation_results.append(asdict(eval_result))
+                        if break_after_first_fail:
+                            break
+                if evaluation_results and break_after_first_fail:
+                    break
 
             outputs[f"{field.name}_eval"] = evaluation_results
         return outputs
@@ -182,12 +197,13 @@ class LlmPrompt(LlmChat):
                     inputs=self.inputs + [field, evaluation_result],
                     outputs=[chain_of_thought, field],
                     verbose=self.verbose,
+                    label="revisor",
                     **self.model_args
                 )
+                revisor.tokens = self.tokens
                 eval_results_str = json.dumps(eval_result[0], indent=2)
                 logger.info(f"Revision {revision_idx + 1}: `{field.name}`")
                 revised = revisor(**inputs, evaluation_result=eval_results_str)
-                self.tokens += revisor.tokens
                 if revised[field.name].strip():
                     inputs[field.name] = revised[field.name].strip()
 
@@ -3,7 +3,9 @@ import logging
 from dataclasses import dataclass, field, asdict
 from typing import List, Dict
 
-from llmpipe.field import Input, Output
+from llmpipe.evaluations.core import Evaluation, evaluate_batch
+from llmpipe.evaluations.llm_eval import fuse_llm_evaluations
+from llmpipe.field import Input, Output, fields_key
 from llmpipe.llmchat import LlmChat
 from llmpipe.template import Template
 from llmpipe.xml_utils import parse_text_for_tag
@@ -24,11 +26,13 @@ class LlmPromptForMany(LlmChat):
     details: str = ""  #: Task details that come after the input output definition sections
     footer: str = None  #: An optional prompt footer (text for the very end of the prompt)
     include_evals_in_prompt: bool = True  #: Whether to include evaluation requirements in the prompt
+    fuse_llm_evaluations: bool = True  #: If true, check all llm evaluations of a field in a single judge call
     verbose: bool = False  #: If true, print additional LLM output to stdout
 
 
     def __post_init__(self):
         super().__post_init__()
+        self._prompt = None
 
         self.outputs = [
             Output(**x) if isinstance(x, dict) else x
@@ -62,7 +66,16 @@ class LlmPromptForMany(LlmChat):
 
     @property
     def prompt(self) -> str:
-        """Returns a prompt for generating the output"""
+        """Returns a prompt for generating the output
+
+        The prompt is rebuilt only when the fields or text it is built from change.
+        """
+        key = (self.inputs_header, self.outputs_header, self.task, self.details, self.footer, self.include_evals_in_prompt, fields_key(self.inputs), fields_key(self.outputs))
+        if self._prompt is None or self._prompt[0] != key:
+            self._prompt = (key, self._build_prompt())
+        return self._prompt[1]
+
+    def _build_prompt(self) -> str:
         prompt = ["# Task Description"]
 
         if self.inputs:
@@ -100,20 +113,16 @@ class LlmPromptForMany(LlmChat):
     def __call__(self, **inputs) -> List[Dict]:
         self.clear_history()
 
-        try:
-            if self.verbose:
-                response_text = ""
-                for chunk in self._call_stream(prompt=Template(self.prompt).format(**inputs)):
-                    print(chunk, flush=True, end="")
-                    response_text += chunk
-                print()
-            else:
-                response_text = self._call(prompt=Template(self.prompt).format(**inputs))
-            logger.info(f"LlmPrompt response: {response_text}")
-            logger.info(f"Token counts - Last: {self.tokens.last}, Total: {self.tokens.total}")
-        except Exception as e:
-            print(e)
+        if self.verbose:
             response_text = ""
+            for chunk in self._call_stream(prompt=Template(self.prompt).format(**inputs)):
+                print(chunk, flush=True, end="")
+                response_text += chunk
+            print()
+        else:
+            response_text = self._call(prompt=Template(self.prompt).format(**inputs))
+        logger.info(f"LlmPrompt response: {response_text}")
+        logger.info(f"Token counts - Last: {self.tokens.last}, Total: {self.tokens.total}")
 
         outputs = {}
         for field in self.outputs:
@@ -126,22 +135,23 @@ class LlmPromptForMany(LlmChat):
         return outputs
 
     def evaluate(self, break_after_first_fail: bool = False, **inputs) -> List[Dict]:
+        """Run evaluations on each generated output. Deterministic evaluations score all outputs of a field at once."""
         input_keys = [x.name for x in self.inputs]
         orig_inputs = {k: v for k, v in inputs.items() if k in input_keys}
         outputs = {}
         for field in self.outputs:
-            inps = [orig_inputs | {field.name: x} for x in inputs[field.name]]
-            outputs[f"{field.name}_eval"] = [
-                self._evaluate(
-                    **x,
-                    field=field,
-                    break_after_first_fail=break_after_first_fail,
-                )
-                for x in inps
-            ]
+            values = inputs[field.name]
+            failures = evaluate_batch(
+                self._evaluations(field),
+                values,
+                break_after_first_fail,
+                **{k: [v] * len(values) for k, v in orig_inputs.items()}
+            )
+            outputs[f"{field.name}_eval"] = [[asdict(x) for x in failed] for failed in failures]
         return outputs
 
     def discard(self, **inputs: List[Dict]) -> List[Dict]:
+        """Returns the generated outputs that pass every evaluation. Judges only run on outputs that pass the deterministic evaluations."""
         outputs = {}
         eval_results = self.evaluate(**inputs, break_after_first_fail=True)
         for field in self.outputs:
@@ -161,28 +171,40 @@ class LlmPromptForMany(LlmChat):
             outputs[field.name] = [self._revise(**x, field=field) for x in inps]
         return outputs
 
-    def _evaluate(self, field: Output, break_after_first_fail: bool = False, **inputs) -> List[Dict]:
-        """Run evaluations"""
+    def _evaluations(self, field: Output) -> List[Evaluation]:
+        """Returns a field's evaluations, deterministic evaluations first, with judges configured like this module
+
+        With `fuse_llm_evaluations`, a field's llm evaluations are replaced by a single `FusedLlmEvaluation`.
+        """
+        evaluations = field.evaluations or []
+        if self.fuse_llm_evaluations:
+            evaluations = fuse_llm_evaluations(evaluations)
         # Initialize separate deterministic and llm-based evaluations
         deterministic_evaluations = []
         llm_evaluations = []
-        for evaluation in field.evaluations or []:
+        for evaluation in evaluations:
             if evaluation.type == "llm":
                 evaluation.generator.model = self.model
                 evaluation.generator.verbose = self.verbose
+                evaluation.generator.cache = self.cache
+                # Judge usage is counted in this module's token counts
+                evaluation.generator.tokens = self.tokens
                 llm_evaluations.append(evaluation)
             else:
                 deterministic_evaluations.append(evaluation)
+        return deterministic_evaluations + llm_evaluations
 
+    def _evaluate(self, field: Output, break_after_first_fail: bool = False, **inputs) -> List[Dict]:
+        """Run evaluations"""
         evaluation_results = []
-        for evaluation in deterministic_evaluations + llm_evaluations:
-            eval_result = evaluation(**inputs)
-            if evaluation.type == "llm":
-                self.tokens += evaluation.tokens
-            if eval_result.evaluation_result != "PASS":
-                evaluation_results.append(asdict(eval_result))
-                if break_after_first_fail:
-                    break
+        for evaluation in self._evaluations(field):
+            for eval_result in evaluation.evaluate(**inputs):
+                if eval_result.evaluation_result != "PASS":
+                    evaluation_results.append(asdict(eval_result))
+                    if break_after_first_fail:
+                        break
+            if evaluation_results and break_after_first_fail:
+                break
 
         return evaluation_results
 
@@ -206,11 +228,12 @@ class LlmPromptForMany(LlmChat):
                 inputs=field.inputs + [field, evaluation_result],
                 outputs=[chain_of_thought, field],
                 verbose=self.verbose,
+                label="revisor",
                 **self.model_args
             )
+            revisor.tokens = self.tokens
             eval_results_str = json.dumps(eval_results[0], indent=2)
             revised = revisor(**inputs, evaluation_result=eval_results_str)
-            self.tokens += revisor.tokens
             if revised[field.name].strip():
                 inputs[field.name] = revised[field.name].strip()
 
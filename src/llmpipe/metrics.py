@@ -0,0 +1,264 @@
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Dict, List
+
+
+@dataclass
+class MetricsSnapshot:
+    """Metrics of a run at a point in time"""
+    elapsed: float = 0.  #: Seconds since the first sample or call of the run
+    samples: int = 0  #: Samples finished, including failed samples
+    errors: int = 0  #: Samples that failed
+    in_flight: int = 0  #: Samples started but not finished
+    requests_in_flight: int = 0  #: LLM requests sent to the provider and not finished
+    samples_per_second: float = 0.
+    calls: int = 0  #: LLM calls, including response cache hits
+    cache_hits: int = 0
+    call_errors: int = 0  #: LLM calls that failed after retries
+    retries: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    tokens_per_second: float = 0.  #: Input and output tokens per second
+    latency_p50: float = 0.  #: Median latency in seconds of recent calls sent to the provider, excluding retries and backoff
+    latency_p95: float = 0.
+    latency_p99: float = 0.
+    revised_samples: int = 0  #: Samples that went through the revision loop
+    revisions: int = 0  #: Revision iterations, summed over samples
+    max_revisions: int = 0  #: The most revision iterations of one sample
+
+    @property
+    def mean_revisions(self) -> float:
+        """The mean number of revision iterations per revised sample"""
+        return self.revisions / self.revised_samples if self.revised_samples else 0.
+
+    @property
+    def total(self):
+        """Returns formatted string containing throughput, latency and error counts"""
+        text = (
+            f"samples: {self.samples:,.0f} ({self.samples_per_second:,.2f}/s), in flight: {self.in_flight:,.0f}, "
+            f"requests in flight: {self.requests_in_flight:,.0f}, "
+            f"errors: {self.errors:,.0f}, calls: {self.calls:,.0f}, call errors: {self.call_errors:,.0f}, "
+            f"retries: {self.retries:,.0f}, tokens/s: {self.tokens_per_second:,.1f}, "
+            f"latency p50/p95/p99: {self.latency_p50:,.2f}/{self.latency_p95:,.2f}/{self.latency_p99:,.2f}s"
+        )
+        if self.revised_samples:
+            text += f", revisions per sample: {self.mean_revisions:,.2f} (max {self.max_revisions:,.0f})"
+        return text
+
+    def to_dict(self) -> Dict:
+        """Returns the metrics as a dictionary, including derived metrics"""
+        return asdict(self) | {"mean_revisions": self.mean_revisions}
+
+    def to_prometheus(self, prefix: str = "llmpipe") -> str:
+        """Returns the metrics in the Prometheus text exposition format"""
+        lines = []
+
+        def metric(name, kind, help, value, samples=None):
+            lines.append(f"# HELP {prefix}_{name} {help}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, x in samples or [("", value)]:
+                lines.append(f"{prefix}_{name}{labels} {x:g}")
+
+        metric("elapsed_seconds", "gauge", "Seconds since the run started", self.elapsed)
+        metric("samples_total", "counter", "Samples finished, including failed samples", self.samples)
+        metric("sample_errors_total", "counter", "Samples that failed", self.errors)
+        metric("samples_in_flight", "gauge", "Samples started but not finished", self.in_flight)
+        metric("requests_in_flight", "gauge", "LLM requests sent to the provider and not finished", self.requests_in_flight)
+        metric("samples_per_second", "gauge", "Samples finished per second", self.samples_per_second)
+        metric("calls_total", "counter", "LLM calls, including response cache hits", self.calls)
+        metric("cache_hits_total", "counter", "LLM calls answered from the response cache", self.cache_hits)
+        metric("call_errors_total", "counter", "LLM calls that failed after retries", self.call_errors)
+        metric("retries_total", "counter", "Retried LLM requests", self.retries)
+        metric("tokens_total", "counter", "Tokens used", None, [
+            ('{type="input"}', self.input_tokens),
+            ('{type="output"}', self.output_tokens)
+        ])
+        metric("tokens_per_second", "gauge", "Input and output tokens per second", self.tokens_per_second)
+        metric("call_latency_seconds", "summary", "Latency of recent LLM calls", None, [
+            ('{quantile="0.5"}', self.latency_p50),
+            ('{quantile="0.95"}', self.latency_p95),
+            ('{quantile="0.99"}', self.latency_p99)
+        ])
+        metric("revised_samples_total", "counter", "Samples that went through the revision loop", self.revised_samples)
+        metric("revisions_total", "counter", "Revision iterations, summed over samples", self.revisions)
+        metric("max_revisions", "gauge", "The most revision iterations of one sample", self.max_revisions)
+        return "\n".join(lines) + "\n"
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """Returns the nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.
+    return values[max(math.ceil(q * len(values)) - 1, 0)]
+
+
+class RunMetrics:
+    """Live throughput, latency and error metrics of a run. Safe to update from several threads at once.
+
+    Every `LlmChat` records its calls to its `metrics`, which is shared with forks, and the dataset mode
+    executors record each sample. Rates are computed from the first sample or call, and latency percentiles
+    over the most recent `window` calls.
+
+    ### Usage
+
+    ```
+    module = PromptModule(...)
+    results = module(concurrency=16, **inputs)
+    print(module.metrics.snapshot().total)
+    ```
+    """
+    def __init__(self, window: int = 10000):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._snapshot = MetricsSnapshot()
+        self._start = None
+
+    def _started(self):
+        if self._start is None:
+            self._start = time.perf_counter()
+
+    def sample_started(self, n: int = 1):
+        """Records samples that started"""
+        with self._lock:
+            self._started()
+            self._snapshot.in_flight += n
+
+    def sample_finished(self, n: int = 1, errors: int = 0):
+        """Records samples that finished, `errors` of which failed"""
+        with self._lock:
+            self._snapshot.in_flight -= n
+            self._snapshot.samples += n
+            self._snapshot.errors += errors
+
+    def request_started(self):
+        """Records an LLM request (one attempt of a call) sent to the provider"""
+        with self._lock:
+            self._started()
+            self._snapshot.requests_in_flight += 1
+
+    def request_finished(self):
+        """Records an LLM request that finished, successfully or not"""
+        with self._lock:
+            self._snapshot.requests_in_flight -= 1
+
+    def record_call(self, latency: float, input_tokens: int = 0, output_tokens: int = 0, cache_hit: bool = False):
+        """Records an LLM call"""
+        with self._lock:
+            self._started()
+            self._snapshot.calls += 1
+            self._snapshot.cache_hits += int(cache_hit)
+            self._snapshot.input_tokens += input_tokens
+            self._snapshot.output_tokens += output_tokens
+            if not cache_hit:
+                self._latencies.append(latency)
+
+    def record_call_error(self):
+        """Records an LLM call that failed after retries"""
+        with self._lock:
+            self._snapshot.call_errors += 1
+
+    def record_retries(self, n: int):
+        """Records retried requests"""
+        with self._lock:
+            self._snapshot.retries += n
+
+    def record_revisions(self, n: int):
+        """Records the number of revision iterations of a sample"""
+        with self._lock:
+            self._snapshot.revised_samples += 1
+            self._snapshot.revisions += n
+            self._snapshot.max_revisions = max(self._snapshot.max_revisions, n)
+
+    def snapshot(self) -> MetricsSnapshot:
+        """Returns the current metrics"""
+        with self._lock:
+            snapshot = MetricsSnapshot(**asdict(self._snapshot))
+            latencies = sorted(self._latencies)
+            start = self._start
+        snapshot.elapsed = time.perf_counter() - start if start is not None else 0.
+        if snapshot.elapsed > 0:
+            snapshot.samples_per_second = snapshot.samples / snapshot.elapsed
+            snapshot.tokens_per_second = (snapshot.input_tokens + snapshot.output_tokens) / snapshot.elapsed
+        snapshot.latency_p50 = _percentile(latencies, 0.5)
+        snapshot.latency_p95 = _percentile(latencies, 0.95)
+        snapshot.latency_p99 = _percentile(latencies, 0.99)
+        return snapshot
+
+    def reset(self):
+        """Clears the metrics, e.g., before starting another run with the same module"""
+        with self._lock:
+            self._latencies.clear()
+            self._snapshot = MetricsSnapshot()
+            self._start = None
+
+
+class MetricsExporter:
+    """Periodically writes a snapshot of run metrics to a file, e.g., to watch and alert on long batch jobs
+
+    Files ending in `.prom` are written in the Prometheus text exposition format (for the node exporter's
+    textfile collector), and other files as json. Each file is replaced atomically, so readers never see a
+    partial write. A final snapshot is written when the exporter stops.
+
+    ### Usage
+
+    ```
+    with MetricsExporter(module.metrics, "/var/lib/node_exporter/llmpipe.prom", interval=15):
+        module(concurrency=16, **inputs)
+    ```
+    """
+    def __init__(self, metrics: RunMetrics, path: str, interval: float = 15.):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def write(self):
+        """Writes a snapshot of the metrics to the file"""
+        snapshot = self.metrics.snapshot()
+        if self.path.endswith(".prom"):
+            text = snapshot.to_prometheus()
+        else:
+            text = json.dumps(snapshot.to_dict(), indent=2)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(text)
+            # Temporary files are only readable by their owner, and collectors often run as another user
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.write()
+
+    def start(self) -> "MetricsExporter":
+        """Starts writing the metrics every `interval` seconds on a background thread"""
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the background thread and writes a final snapshot"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.write()
+
+    def __enter__(self) -> "MetricsExporter":
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -1,12 +1,17 @@
 """python -m llmpipe.modules.address_comments --help"""
+import logging
 import yaml
 import re
-from typing import List, Annotated
+from typing import List, Tuple, Annotated
 
 from typer import Option, Argument
 import typer
 
 from llmpipe import LlmPromptForMany
+from llmpipe.evaluations.string_index import apply_edits, get_string_index
+
+
+logger = logging.getLogger(__name__)
 
 
   # - name: thinking
@@ -49,6 +54,59 @@ footer: Generate one or more pairs of <search> and <replace> blocks, and a singl
 """
 
 
+def _find_occurrences(text: str, search: str) -> List[int]:
+    """Returns the offsets of the non-overlapping occurrences of `search`, from the left as `str.replace` finds them"""
+    # The index built by `is_in_string_field` ignores case, so occurrences are checked for an exact match
+    offsets, end = [], 0
+    for offset in get_string_index(text).find_all(search):
+        if offset >= end and text.startswith(search, offset):
+            offsets.append(offset)
+            end = offset + len(search)
+    return offsets
+
+
+def _matches_near_edits(text: str, edits: List[Tuple[int, int, str]], search: str) -> bool:
+    """Returns true if `search` occurs in the edited text at a position that touches one of the edits"""
+    clusters = []
+    for start, end, replace in sorted(edits):
+        # Edits closer than the search length could be spanned by a single occurrence
+        if clusters and start - clusters[-1][1] < len(search):
+            clusters[-1][1] = max(clusters[-1][1], end)
+            clusters[-1][2].append((start, end, replace))
+        else:
+            clusters.append([start, end, [(start, end, replace)]])
+    for start, end, cluster in clusters:
+        edited = apply_edits(text[start:end], [(a - start, b - start, r) for a, b, r in cluster])
+        window = text[max(0, start - len(search) + 1):start] + edited + text[end:end + len(search) - 1]
+        if search in window:
+            return True
+    return False
+
+
+def apply_search_replace(text: str, searches: List[str], replaces: List[str]) -> str:
+    """Replaces every occurrence of each search block, as if the pairs were applied one after another
+
+    Occurrences are found in the index that `is_in_string_field` evaluations built for `text` and the edits are
+    applied in one pass. Pairs that interact, e.g., a move (a deleted span that overlaps the anchor of an
+    insertion) or a search that only matches after an earlier replacement, are applied one after another.
+    """
+    pairs = [(search, replace) for search, replace in zip(searches, replaces) if search]
+    edits = []
+    for search, replace in pairs:
+        if _matches_near_edits(text, edits, search):
+            break
+        edits.extend((offset, offset + len(search), replace) for offset in _find_occurrences(text, search))
+    else:
+        edits.sort()
+        if all(a[1] <= b[0] for a, b in zip(edits, edits[1:])):
+            return apply_edits(text, edits)
+
+    logger.info("Search blocks overlap or depend on earlier replacements, applying them one after another")
+    for search, replace in pairs:
+        text = text.replace(search, replace)
+    return text
+
+
 def address_comments(
     file: Annotated[str, Argument(help="The file to revise")],
     file_out: Annotated[str, Option(help="Output path. Will overwrite if not provided.")] = None,
@@ -75,8 +133,7 @@ def address_comments(
         response = reviser(document=text)
         response = response | reviser.revise(document=text, **response)
 
-        for search, replace in zip(response["search"], response["replace"]):
-            text = text.replace(search, replace) if search else text
+        text = apply_search_replace(text, response["search"], response["replace"])
 
         pattern = f'<comment>\\s*{response["resolved"][0]}\\s*</comment>\\n*'
         text = re.sub(pattern, '', text, flags=re.DOTALL)
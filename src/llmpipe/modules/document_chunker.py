@@ -31,6 +31,7 @@ def _split_document_into_sections(document: str, breaks: list[str]) -> list[str]
     lines = document.splitlines()
 
     # Find indices where each break occurs
+    breaks = set(breaks)
     break_indices = []
     for i, line in enumerate(lines):
         if line in breaks:
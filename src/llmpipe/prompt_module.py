@@ -1,23 +1,47 @@
+import asyncio
+import hashlib
 import json
 import logging
+import os
+import re
+import shutil
+import tempfile
 import yaml
 from dataclasses import dataclass, field, asdict
-from typing import Annotated, List, Dict
+from typing import Annotated, Callable, Iterable, Iterator, List, Dict, Union
 
 import typer
-import polars as pl
-from datasets import Dataset
 from typer import Option, Argument
 
-from llmpipe.data import read_data, write_data
-from llmpipe.field import Input, Output, output_factory
+from llmpipe.data import JsonlWriter, iter_data, resume_jsonl, sample_data, write_data
+from llmpipe.executor import (
+    ERROR_KEY, DedupStats, adedup_calls, amap_samples, columns_from_samples, dedup_calls, imap_samples, map_samples,
+    pack_samples, samples_from_columns
+)
+from llmpipe.field import Input, Output, output_factory, fields_key
 from llmpipe.llmchat import LlmChat
+from llmpipe.metrics import MetricsExporter
+from llmpipe.usage import set_ledger
 from llmpipe.template import Template
-from llmpipe.xml_utils import parse_text_for_one_tag
+from llmpipe.xml_utils import StreamingTagParser, parse_text_for_one_tag, parse_text_for_tag
 
 
 logger = logging.getLogger(__name__)
 
+#: Instructions for packed requests, which come before the inputs section
+PACKED_INSTRUCTIONS = """## Items
+
+The inputs below are {n} separate items, each within an `<item id="...">` block. Complete the task for each item independently. For each item, generate the outputs within an `<item id="...">` block with the same id:
+
+<item id="0">
+{outputs}
+</item>
+<item id="1">
+...
+</item>"""
+
+_ITEM_PATTERN = re.compile(r'<item id="(\d+)">(.*?)</item>', re.DOTALL)
+
 
 @dataclass
 class PromptModule(LlmChat):
@@ -30,9 +54,19 @@ class PromptModule(LlmChat):
     task: str = ""  #: The task description at the top of the prompt
     details: str = ""  #: Task details that come after the input output definition sections
     verbose: bool = False  #: If true, print additional LLM output to stdout
+    prompt_caching: bool = False  #: If true, mark the instructions before the inputs for provider prompt caching
+    early_stop: bool = False  #: If true, stream the response and stop generating once every output tag is closed
+    on_output: Callable[[str, str], None] = None  #: Optional callback called with each output's name and text as soon as its closing tag is streamed
+    dedup: bool = None  #: If true, samples with identical inputs are run once in dataset mode (default: when temperature is 0)
+    dedup_window: int = 1024  #: The number of finished samples `imap` keeps outputs of for deduplication, so memory stays bounded
+    pack_tokens: int = None  #: If set, dataset mode packs consecutive samples with up to this many (estimated) input tokens into one request
+    max_pack_size: int = 32  #: The maximum number of samples in a packed request
 
     def __post_init__(self):
         super().__post_init__()
+        self.dedup_stats = DedupStats()
+        self._prompt = None
+        self._compiled = None
         # Initialize output classes when dictionary is provided
         self.outputs = [
             output_factory(**x) if isinstance(x, dict) else x
@@ -53,7 +87,16 @@ class PromptModule(LlmChat):
 
     @property
     def prompt(self) -> str:
-        """Returns a prompt for generating the output"""
+        """Returns a prompt for generating the output
+
+        The prompt is rebuilt only when the fields or text it is built from change.
+        """
+        key = (self.inputs_header, self.outputs_header, self.task, self.details, fields_key(self.inputs), fields_key(self.outputs))
+        if self._prompt is None or self._prompt[0] != key:
+            self._prompt = (key, self._build_prompt())
+        return self._prompt[1]
+
+    def _build_prompt(self) -> str:
         prompt = ["## Task Description"]
 
         if self.task:
@@ -79,27 +122,41 @@ class PromptModule(LlmChat):
 
         return "\n\n".join(prompt)
 
-    def verify_outputs(self, outputs):
-        assert set([x.name for x in self.outputs]) <= set(outputs.keys())
-
-    def forward_one(self, **inputs) -> Dict:
-        self.clear_history()
+    def render(self, **inputs) -> Union[str, List[Dict]]:
+        """Returns the prompt for a sample
+
+        With `prompt_caching`, returns text content blocks split at the inputs section, with the first
+        (static) block marked for provider prompt caching.
+        """
+        templates = self._templates()
+        if len(templates) == 1:
+            return templates[0].format(**inputs)
+        return [
+            {"type": "text", "text": templates[0].format(**inputs), "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": templates[1].format(**inputs)}
+        ]
 
-        try:
-            if self.verbose:
-                response_text = ""
-                for chunk in self._call_stream(prompt=Template(self.prompt).format(**inputs)):
-                    print(chunk, flush=True, end="")
-                    response_text += chunk
-                print()
+    def _templates(self) -> List[Template]:
+        """Returns the compiled prompt template, split at the inputs section with `prompt_caching`
+
+        The templates are kept until the prompt changes, so they are compiled once rather than per sample.
+        """
+        prompt = self.prompt
+        split = bool(self.prompt_caching and self.supports_prompt_caching and self.inputs)
+        if self._compiled is None or self._compiled[0] != (prompt, split):
+            if split:
+                idx = prompt.rindex("## Inputs")
+                templates = [Template(prompt[:idx]), Template(prompt[idx:])]
             else:
-                response_text = self._call(prompt=Template(self.prompt).format(**inputs))
-            logger.info(f"PromptModule response: {response_text}")
-            logger.info(f"Token counts - Last: {self.tokens.last}, Total: {self.tokens.total}")
-        except Exception as e:
-            print(e)
-            response_text = ""
+                templates = [Template(prompt)]
+            self._compiled = ((prompt, split), templates)
+        return self._compiled[1]
+
+    def verify_outputs(self, outputs):
+        assert set([x.name for x in self.outputs]) <= set(outputs.keys())
 
+    def _parse_response(self, response_text: str) -> Dict:
+        """Extracts and processes the outputs from a response"""
         outputs = {}
         for field in self.outputs:
             try:
@@ -116,31 +173,277 @@ class PromptModule(LlmChat):
             print(f"Tokens used: {self.tokens.total}")
         return outputs
 
-    def __call__(self, num_proc: int = 1, **inputs) -> Dict:
+    def _stream_kwargs(self, parser: StreamingTagParser) -> Dict:
+        """Returns stop sequences and an early stop condition for streaming a response"""
+        if not self.early_stop or not self.outputs:
+            return {}
+        return {"stop": [self.outputs[-1].xml_close], "stop_when": lambda: parser.done}
+
+    def _stop_suffix(self, response_text: str) -> str:
+        """Returns the closing tag of the last output when generation ended on it as a stop sequence (which is not returned)"""
+        if not self.early_stop or not self.outputs:
+            return ""
+        last = self.outputs[-1]
+        idx = response_text.rfind(last.xml)
+        return last.xml_close if idx >= 0 and last.xml_close not in response_text[idx:] else ""
+
+    def forward_one(self, **inputs) -> Dict:
+        """Runs the prompt on one sample
+
+        An LLM call that still fails after retries raises, so that dataset runs record the sample's error
+        (see `ERROR_KEY`) rather than empty outputs.
+        """
+        self.clear_history()
+
+        if self.verbose or self.early_stop or self.on_output:
+            parser = StreamingTagParser([x.name for x in self.outputs], callback=self.on_output)
+            for chunk in self._call_stream(prompt=self.render(**inputs), **self._stream_kwargs(parser)):
+                if self.verbose:
+                    print(chunk, flush=True, end="")
+                parser.feed(chunk)
+            if self.verbose:
+                print()
+            parser.feed(self._stop_suffix(parser.text))
+            response_text = parser.text
+        else:
+            response_text = self._call(prompt=self.render(**inputs))
+        logger.info(f"PromptModule response: {response_text}")
+        logger.info(f"Token counts - Last: {self.tokens.last}, Total: {self.tokens.total}")
+
+        return self._parse_response(response_text)
+
+    async def aforward_one(self, **inputs) -> Dict:
+        """Async version of `forward_one`
+
+        Each call runs on a fork of the module with its own chat history, so many calls can be
+        in flight on the same module at once.
+        """
+        chat = self.fork()
+
+        if self.verbose or self.early_stop or self.on_output:
+            parser = StreamingTagParser([x.name for x in self.outputs], callback=self.on_output)
+            async for chunk in chat._acall_stream(prompt=self.render(**inputs), **self._stream_kwargs(parser)):
+                if self.verbose:
+                    print(chunk, flush=True, end="")
+                parser.feed(chunk)
+            if self.verbose:
+                print()
+            parser.feed(self._stop_suffix(parser.text))
+            response_text = parser.text
+        else:
+            response_text = await chat._acall(prompt=self.render(**inputs))
+        logger.info(f"PromptModule response: {response_text}")
+        logger.info(f"Token counts - Last: {self.tokens.last}, Total: {self.tokens.total}")
+
+        return self._parse_response(response_text)
+
+    def _sample_tokens(self, sample: Dict) -> int:
+        """Estimates the number of tokens of a sample's inputs"""
+        return sum(len(str(sample.get(x.name, ""))) for x in self.inputs) // 4 + 1
+
+    def render_packed(self, samples: List[Dict]) -> Union[str, List[Dict]]:
+        """Returns a prompt for several samples, each within an indexed `<item id="...">` block
+
+        The outputs of each sample are requested within an item block with the same id. With `prompt_caching`,
+        the instructions before the items are marked for provider prompt caching.
+        """
+        prompt = self.prompt
+        idx = prompt.rindex("## Inputs") if self.inputs else len(prompt)
+        outputs = "\n".join(f"{x.xml}...{x.xml_close}" for x in self.outputs)
+        instructions = prompt[:idx] + PACKED_INSTRUCTIONS.format(n=len(samples), outputs=outputs) + "\n\n"
+        item_template = Template("\n\n".join(x.input_template for x in self.inputs))
+        items = "## Inputs\n\n" + "\n".join(
+            f'<item id="{i}">\n{item_template.format(**sample)}\n</item>'
+            for i, sample in enumerate(samples)
+        )
+        if not (self.prompt_caching and self.supports_prompt_caching):
+            return instructions + items
+        return [
+            {"type": "text", "text": instructions, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": items}
+        ]
+
+    def _parse_packed(self, response_text: str, n: int) -> Dict[int, Dict]:
+        """Extracts and processes the outputs of each item of a packed response
+
+        Returns:
+            The outputs by item id, for items with every output tag present
+        """
+        outputs = {}
+        for match in _ITEM_PATTERN.finditer(response_text):
+            idx, block = int(match.group(1)), match.group(2)
+            if idx < n and all(parse_text_for_tag(block, x.name) for x in self.outputs):
+                outputs[idx] = self._parse_response(block)
+        return outputs
+
+    def forward_packed(self, samples: List[Dict]) -> List[Dict]:
+        """Runs the prompt on several samples in one request, returning the outputs of each sample
+
+        Samples whose outputs are missing from the response, e.g., when it was cut off by `max_tokens`, are
+        run again one at a time.
+        """
+        if len(samples) == 1:
+            return [self.forward_one(**samples[0])]
+        self.clear_history()
+
+        response_text = self._call(prompt=self.render_packed(samples))
+        logger.info(f"PromptModule packed response: {response_text}")
+        logger.info(f"Token counts - Last: {self.tokens.last}, Total: {self.tokens.total}")
+
+        outputs = self._parse_packed(response_text, len(samples))
+        if len(outputs) < len(samples):
+            logger.info(f"Running {len(samples) - len(outputs)} of {len(samples)} packed samples again")
+        return [outputs[i] if i in outputs else self.forward_one(**sample) for i, sample in enumerate(samples)]
+
+    async def aforward_packed(self, samples: List[Dict]) -> List[Dict]:
+        """Async version of `forward_packed`"""
+        if len(samples) == 1:
+            return [await self.aforward_one(**samples[0])]
+        chat = self.fork()
+
+        response_text = await chat._acall(prompt=self.render_packed(samples))
+        logger.info(f"PromptModule packed response: {response_text}")
+        logger.info(f"Token counts - Last: {self.tokens.last}, Total: {self.tokens.total}")
+
+        outputs = self._parse_packed(response_text, len(samples))
+        if len(outputs) < len(samples):
+            logger.info(f"Running {len(samples) - len(outputs)} of {len(samples)} packed samples again")
+        missing = [i for i in range(len(samples)) if i not in outputs]
+        for i, result in zip(missing, await asyncio.gather(*[self.aforward_one(**samples[i]) for i in missing])):
+            outputs[i] = result
+        return [outputs[i] for i in range(len(samples))]
+
+    def _packs(self, samples: Iterable[Dict]) -> Iterator[Dict]:
+        """Groups samples into packs for packed requests, as samples with a `samples` column"""
+        for pack in pack_samples(samples, self._sample_tokens, self.pack_tokens, self.max_pack_size):
+            yield {"samples": pack}
+
+    def _unpack(self, pack: Dict) -> List[Dict]:
+        """Returns the results of the samples of a pack, recording them to the metrics"""
+        n = len(pack["samples"])
+        if pack.get(ERROR_KEY) is not None:
+            self.metrics.sample_finished(n, errors=n)
+            return [sample | {ERROR_KEY: pack[ERROR_KEY]} for sample in pack["samples"]]
+        self.metrics.sample_finished(n)
+        return [sample | outputs for sample, outputs in zip(pack["samples"], pack["outputs"])]
+
+    def _imap_packed(self, samples: Iterable[Dict], concurrency: int = 1, ordered: bool = False) -> Iterator[Dict]:
+        """Runs packed requests on up to `concurrency` threads, yielding the results of each sample"""
+        def fn(samples):
+            self.metrics.sample_started(len(samples))
+            return {"outputs": self.fork().forward_packed(samples)}
+
+        for pack in imap_samples(fn, self._packs(samples), concurrency, ordered):
+            yield from self._unpack(pack)
+
+    @property
+    def _dedup_columns(self) -> List[str]:
+        """The columns that determine a sample's outputs"""
+        return [x.name for x in self.inputs]
+
+    def _dedup_key(self, sample: Dict) -> str:
+        """Returns a hash of the columns that determine a sample's outputs"""
+        values = json.dumps([sample.get(x) for x in self._dedup_columns], default=str)
+        return hashlib.sha256(values.encode()).hexdigest()
+
+    def _dedup(self, fn: Callable, is_async: bool = False, max_finished: int = None) -> Callable:
+        """Returns a version of a per-sample function that runs once per unique sample, if deduplication is on
+
+        `max_finished` bounds the number of finished samples whose outputs are kept (see `dedup_calls`).
+        """
+        if not (self.temperature == 0 if self.dedup is None else self.dedup):
+            return fn
+        return (adedup_calls if is_async else dedup_calls)(fn, self._dedup_key, self.dedup_stats, max_finished)
+
+    def __call__(self, concurrency: int = 1, num_proc: int = None, on_result: Callable[[Dict], None] = None, **inputs) -> Dict:
+        """Runs the prompt on one sample, or on each sample of a dataset when the inputs are lists
+
+        In dataset mode, samples run on up to `concurrency` threads, each on a fork of the module, and
+        samples with identical inputs are run once (see `dedup`). With `pack_tokens`, several samples are
+        run in each request instead (without deduplication). `num_proc` is a deprecated alias for
+        `concurrency`. `on_result` is called with each result as soon as it completes.
+        """
         if not inputs or not isinstance(list(inputs.values())[0], list):
             return self.forward_one(**inputs)
+        if self.pack_tokens:
+            results = []
+            for result in self._imap_packed(samples_from_columns(inputs), num_proc or concurrency, ordered=True):
+                if on_result is not None:
+                    on_result(result)
+                results.append(result)
+            return columns_from_samples(results)
+        return map_samples(
+            self._dedup(lambda **sample: self.fork().forward_one(**sample)),
+            inputs,
+            num_proc or concurrency,
+            on_result,
+            self.metrics
+        )
+
+    def imap(self, samples: Iterable[Dict], concurrency: int = 1, ordered: bool = False) -> Iterator[Dict]:
+        """Runs the prompt on each sample of an iterable, yielding the samples with outputs added
+
+        Samples are read lazily, so a generator over a large file is processed with bounded memory. Results are
+        yielded as they complete unless `ordered` is true. Duplicates of running samples and of the last
+        `dedup_window` finished samples are not run again.
+        """
+        if self.pack_tokens:
+            return self._imap_packed(samples, concurrency, ordered)
+        return imap_samples(
+            self._dedup(lambda **sample: self.fork().forward_one(**sample), max_finished=self.dedup_window),
+            samples,
+            concurrency,
+            ordered,
+            self.metrics
+        )
+
+    async def acall(self, concurrency: int = 64, on_result: Callable[[Dict], None] = None, **inputs) -> Dict:
+        """Async version of `__call__`. In dataset mode, at most `concurrency` samples are in flight at once."""
+        if not inputs or not isinstance(list(inputs.values())[0], list):
+            return await self.aforward_one(**inputs)
+        if self.pack_tokens:
+            async def fn(samples):
+                self.metrics.sample_started(len(samples))
+                return {"outputs": await self.aforward_packed(samples)}
+
+            def on_pack(pack):
+                # Samples are unpacked as each pack completes, so they are recorded to the metrics live
+                pack["results"] = self._unpack(pack)
+                if on_result is not None:
+                    for result in pack["results"]:
+                        on_result(result)
 
-        return (
-            Dataset.from_dict(inputs)
-            .map(
-                lambda sample: sample | self.forward_one(**sample),
-                num_proc=num_proc,
-                batched=False
-            )
-        ).to_dict()
+            packs = columns_from_samples(list(self._packs(samples_from_columns(inputs))))
+            packs = await amap_samples(fn, packs, concurrency, on_pack)
+            return columns_from_samples([result for results in packs["results"] for result in results])
+        return await amap_samples(self._dedup(self.aforward_one, is_async=True), inputs, concurrency, on_result, self.metrics)
 
 
 def run_yaml_prompt(
         prompt_path: Annotated[str, Option(help="Path to a yaml file containing the prompt configuration")] = None,
         input_data_path: Annotated[str, Option(help="Dataset to run prompt on")] = None,
         output_data_path: Annotated[str, Option(help="Path to save processed dataset")] = None,
-        num_proc: Annotated[int, Option(help="Number of processes to use is dataset mode")] = 1,
+        concurrency: Annotated[int, Option("--concurrency", "--num-proc", help="Maximum number of samples to process at once in dataset mode")] = 1,
         n_samples: Annotated[int, Option(help="Optional maximum number of samples to run")] = None,
         verbose: Annotated[bool, Option(help="Stream output to stdout")] = False,
-        model: Annotated[str, Option(help="A LiteLLM model identifier")] = None
+        model: Annotated[str, Option(help="A LiteLLM model identifier")] = None,
+        cache_path: Annotated[str, Option(help="Optional path to an on-disk response cache")] = None,
+        rpm: Annotated[int, Option(help="Optional requests per minute limit, shared by all threads and processes")] = None,
+        tpm: Annotated[int, Option(help="Optional tokens per minute limit, shared by all threads and processes")] = None,
+        prompt_caching: Annotated[bool, Option(help="Use provider prompt caching for the prompt instructions")] = False,
+        pack_tokens: Annotated[int, Option(help="Optional budget of (estimated) input tokens for packing several rows into one request")] = None,
+        usage_path: Annotated[str, Option(help="Optional path to save per-call usage records (jsonlines)")] = None,
+        key: Annotated[str, Option(help="Column that identifies each row. If not provided, the row's index in the input is saved as `row_key`.")] = None,
+        resume: Annotated[bool, Option(help="Skip rows already in the output (.jsonl only). Failed rows are run again.")] = False,
+        metrics_path: Annotated[str, Option(help="Optional path to periodically save run metrics to (.prom for a Prometheus textfile, otherwise json)")] = None,
+        metrics_interval: Annotated[float, Option(help="Seconds between metrics saves")] = 15.
 ):
-    """Run a prompt on a dataset."""
+    """Run a prompt on a dataset.
 
+    The input is read as a stream and samples are dispatched as threads become free, so memory is bounded by
+    `concurrency` and the prompt's `dedup_window` rather than the size of the dataset. With a json lines output, each result is appended to
+    the output as soon as it completes, so an interrupted run can be continued with `--resume`.
+    """
     # Read the prompt
     with open(prompt_path, "r") as f:
         prompt_config = yaml.safe_load(f.read())
@@ -148,24 +451,66 @@ def run_yaml_prompt(
     # Initialize the prompt
     prompt_config["model"] = model
     prompt_config["verbose"] = verbose
+    prompt_config["cache_path"] = cache_path
+    prompt_config["rpm"] = rpm
+    prompt_config["tpm"] = tpm
+    prompt_config["prompt_caching"] = prompt_caching
+    prompt_config["pack_tokens"] = pack_tokens
     prompt = PromptModule(**prompt_config)
+    # Usage is recorded to a file so that calls made by other processes sharing the ledger are included
+    usage_dir = tempfile.mkdtemp() if usage_path is None else None
+    ledger = set_ledger(usage_path or os.path.join(usage_dir, "usage.jsonl"))
     if verbose:
         print(prompt.prompt)
 
     # Read the data
-    samples = read_data(input_data_path)
+    samples = iter_data(input_data_path)
+    if key is None:
+        key = "row_key"
+        samples = (sample | {key: idx} for idx, sample in enumerate(samples))
+
+    # Skip rows that are already done
+    stream_output = output_data_path.endswith(".jsonl")
+    if resume and not stream_output:
+        raise ValueError("--resume requires a json lines (.jsonl) output")
+    done = resume_jsonl(output_data_path, key, drop=lambda x: x.get(ERROR_KEY)) if resume else set()
+    if done:
+        print(f"Resuming: {len(done):,} rows done")
+        samples = (sample for sample in samples if sample[key] not in done)
 
     # Sample if requested
     if n_samples is not None:
-        n_samples = min(n_samples, len(samples))
-        samples = random.sample(samples, n_samples)
-
-    # Run prompt and return results
-    data = pl.from_dicts(samples).to_dict(as_series=False)
-    samples = pl.from_dict(prompt(**data, num_proc=num_proc)).to_dicts()
-
-    # Write the output to the target output file location
-    write_data(samples, output_data_path)
+        samples = sample_data(samples, max(n_samples - len(done), 0))
+
+    # Run prompt and save results as they complete
+    exporter = MetricsExporter(prompt.metrics, metrics_path, metrics_interval).start() if metrics_path else None
+    try:
+        if stream_output:
+            with JsonlWriter(output_data_path, append=resume) as writer:
+                try:
+                    for result in prompt.imap(samples, concurrency=concurrency):
+                        writer.write(result)
+                except KeyboardInterrupt:
+                    print(f"Interrupted: {writer.n_written:,} results saved to {output_data_path}. Rerun with --resume to continue.")
+                    raise
+        else:
+            write_data(list(prompt.imap(samples, concurrency=concurrency, ordered=True)), output_data_path)
+    finally:
+        if exporter is not None:
+            exporter.stop()
+
+    if cache_path:
+        print(f"Response cache: {prompt.cache_stats.total}")
+    print(f"Tokens used: {prompt.tokens.total}")
+    if prompt.retry_stats.retries:
+        print(f"Retries: {prompt.retry_stats.total}")
+    if prompt.dedup_stats.samples:
+        print(f"Deduplication: {prompt.dedup_stats.total}")
+    print(f"Metrics: {prompt.metrics.snapshot().total}")
+    print(ledger.report())
+    set_ledger(None)
+    if usage_dir is not None:
+        shutil.rmtree(usage_dir)
 
 
 if __name__ == "__main__":
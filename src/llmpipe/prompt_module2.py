@@ -1,16 +1,16 @@
 import json
 import logging
+import random
 import yaml
 from dataclasses import dataclass, field, asdict
 from typing import Annotated, List, Dict
 
 import typer
-import polars as pl
-from datasets import Dataset
 from typer import Option, Argument
 
 from llmpipe.data import read_data, write_data
-from llmpipe.field import Input, Output, output_factory
+from llmpipe.executor import map_samples
+from llmpipe.field import Input, Output, output_factory, fields_key
 from llmpipe.llmchat import LlmChat
 from llmpipe.template import Template
 from llmpipe.xml_utils import parse_text_for_one_tag
@@ -32,6 +32,7 @@ class PromptModule2(LlmChat):
 
     def __post_init__(self):
         super().__post_init__()
+        self._prompt = None
         assert self.task and self.outputs
         # Initialize output classes when dictionary is provided
         self.outputs = [
@@ -59,7 +60,16 @@ class PromptModule2(LlmChat):
 
     @property
     def prompt(self) -> str:
-        """Returns a prompt for generating the output"""
+        """Returns a prompt for generating the output
+
+        The prompt is rebuilt only when the fields or text it is built from change.
+        """
+        key = (self.task, self.outputs_header, self.footer, fields_key(self.inputs), fields_key(self.outputs))
+        if self._prompt is None or self._prompt[0] != key:
+            self._prompt = (key, self._build_prompt())
+        return self._prompt[1]
+
+    def _build_prompt(self) -> str:
         prompt = [self.task]
 
         if self.inputs:
@@ -80,20 +90,16 @@ class PromptModule2(LlmChat):
     def forward_one(self, **inputs) -> Dict:
         self.clear_history()
 
-        try:
-            if self.verbose:
-                response_text = ""
-                for chunk in self._call_stream(prompt=Template(self.prompt).format(**inputs)):
-                    print(chunk, flush=True, end="")
-                    response_text += chunk
-                print()
-            else:
-                response_text = self._call(prompt=Template(self.prompt).format(**inputs))
-            logger.info(f"PromptModule response: {response_text}")
-            logger.info(f"Token counts - Last: {self.tokens.last}, Total: {self.tokens.total}")
-        except Exception as e:
-            print(e)
+        if self.verbose:
             response_text = ""
+            for chunk in self._call_stream(prompt=Template(self.prompt).format(**inputs)):
+                print(chunk, flush=True, end="")
+                response_text += chunk
+            print()
+        else:
+            response_text = self._call(prompt=Template(self.prompt).format(**inputs))
+        logger.info(f"PromptModule response: {response_text}")
+        logger.info(f"Token counts - Last: {self.tokens.last}, Total: {self.tokens.total}")
 
         outputs = {}
         for field in self.outputs:
@@ -111,30 +117,28 @@ class PromptModule2(LlmChat):
             print(f"Tokens used: {self.tokens.total}")
         return outputs
 
-    def __call__(self, num_proc: int = 1, **inputs) -> Dict:
+    def __call__(self, concurrency: int = 1, num_proc: int = None, **inputs) -> Dict:
+        """Runs the prompt on one sample, or on each sample of a dataset when the inputs are lists
+
+        In dataset mode, samples run on up to `concurrency` threads, each on a fork of the module.
+        `num_proc` is a deprecated alias for `concurrency`.
+        """
         if not inputs or not isinstance(list(inputs.values())[0], list):
             return self.forward_one(**inputs)
-
-        return (
-            Dataset.from_dict(inputs)
-            .map(
-                lambda sample: sample | self.forward_one(**sample),
-                num_proc=num_proc,
-                batched=False
-            )
-        ).to_dict()
+        return map_samples(lambda **sample: self.fork().forward_one(**sample), inputs, num_proc or concurrency, metrics=self.metrics)
 
 
 def run_yaml_prompt(
         prompt_path: Annotated[str, Option(help="Path to a yaml file containing the prompt configuration")] = None,
         input_data_path: Annotated[str, Option(help="Dataset to run prompt on")] = None,
         output_data_path: Annotated[str, Option(help="Path to save processed dataset")] = None,
-        num_proc: Annotated[int, Option(help="Number of processes to use is dataset mode")] = 1,
+        concurrency: Annotated[int, Option("--concurrency", "--num-proc", help="Maximum number of samples to process at once in dataset mode")] = 1,
         n_samples: Annotated[int, Option(help="Optional maximum number of samples to run")] = None,
         verbose: Annotated[bool, Option(help="Stream output to stdout")] = False,
         model: Annotated[str, Option(help="A LiteLLM model identifier")] = None
 ):
     """Run a prompt on a dataset."""
+    import polars as pl
 
     # Read the prompt
     with open(prompt_path, "r") as f:
@@ -157,7 +161,7 @@ def run_yaml_prompt(
 
     # Run prompt and return results
     data = pl.from_dicts(samples).to_dict(as_series=False)
-    samples = pl.from_dict(prompt(**data, num_proc=num_proc)).to_dicts()
+    samples = pl.from_dict(prompt(**data, concurrency=concurrency)).to_dicts()
 
     # Write the output to the target output file location
     write_data(samples, output_data_path)
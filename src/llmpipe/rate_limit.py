@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Union
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms fall back to a process-local limiter
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """A token-bucket rate limiter for requests per minute and tokens per minute
+
+    The bucket state is kept in a small file guarded by an exclusive file lock, so one limiter
+    is shared by every thread and process on the machine that uses the same `name` and limits.
+
+    ### Usage
+
+    ```
+    limiter = RateLimiter("claude-3-5-haiku-20241022", rpm=50, tpm=40000)
+    limiter.acquire(tokens=1200)  # Blocks until the request fits within both limits
+    ...
+    limiter.adjust(tokens=350)  # Debit tokens that were not known before sending
+    ```
+
+    Args:
+        name: A name for the limiter, e.g., a model identifier
+        rpm: Maximum requests per minute (default: None, unlimited)
+        tpm: Maximum tokens per minute (default: None, unlimited)
+        state_dir: Directory for the shared bucket state (default: a directory in the system temp dir)
+    """
+    def __init__(self, name: str, rpm: int = None, tpm: int = None, state_dir: str = None):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        state_dir = state_dir or os.path.join(tempfile.gettempdir(), "llmpipe_rate_limits")
+        os.makedirs(state_dir, exist_ok=True)
+        # The limits are part of the key, so a run with other limits does not start from a stale bucket
+        key = f"{name}\0{rpm}\0{tpm}"
+        self.path = os.path.join(state_dir, hashlib.sha1(key.encode()).hexdigest()[:16] + ".json")
+        self._lock = threading.Lock()
+
+    def _update(self, requests: float, tokens: float, force: bool = False) -> float:
+        """Takes `requests` and `tokens` from the buckets if available (or when `force` is true)
+
+        Returns:
+            float: 0 if the buckets were debited, otherwise the number of seconds to wait before retrying
+        """
+        with self._lock, open(self.path, "a+") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                content = f.read()
+                state = json.loads(content) if content else {}
+                now = time.time()
+                elapsed = max(now - state.get("updated", now), 0.)
+                available = {}
+                wait = 0.
+                for key, limit, amount in (("requests", self.rpm, requests), ("tokens", self.tpm, tokens)):
+                    if not limit:
+                        continue
+                    available[key] = min(state.get(key, limit) + elapsed * limit / 60, limit)
+                    # Requests larger than the bucket are let through once the bucket is full
+                    amount = min(amount, limit)
+                    if available[key] < amount:
+                        wait = max(wait, (amount - available[key]) * 60 / limit)
+                if wait and not force:
+                    return wait
+                for key, amount in (("requests", requests), ("tokens", tokens)):
+                    if key in available:
+                        available[key] -= amount
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(available | {"updated": now}))
+                return 0.
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Blocks until one request with `tokens` tokens fits within the limits
+
+        Returns:
+            float: The number of seconds spent waiting
+        """
+        waited = 0.
+        while wait := self._update(1, tokens):
+            logger.info(f"Rate limit reached for {self.name}, waiting {wait:.2f}s")
+            time.sleep(wait)
+            waited += wait
+        return waited
+
+    async def aacquire(self, tokens: int = 0) -> float:
+        """Async version of `acquire`. The file lock is taken on a worker thread, so it never blocks the event loop."""
+        waited = 0.
+        while wait := await asyncio.to_thread(self._update, 1, tokens):
+            logger.info(f"Rate limit reached for {self.name}, waiting {wait:.2f}s")
+            await asyncio.sleep(wait)
+            waited += wait
+        return waited
+
+    def adjust(self, tokens: int):
+        """Debits (or, when negative, credits) tokens after a request, e.g., once actual usage is known"""
+        if self.tpm and tokens:
+            self._update(0, tokens, force=True)
+
+    async def aadjust(self, tokens: int):
+        """Async version of `adjust`"""
+        if self.tpm and tokens:
+            await asyncio.to_thread(self._update, 0, tokens, True)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def set_rate_limit(model: str, rpm: int = None, tpm: int = None, **kwargs) -> RateLimiter:
+    """Configures the process-wide rate limiter for a model
+
+    Every `LlmChat` using `model` is held back by this limiter, including llm judges and revisors.
+
+    Args:
+        model: A litellm model identifier
+        rpm: Maximum requests per minute (default: None, unlimited)
+        tpm: Maximum tokens per minute (default: None, unlimited)
+        kwargs: Keyword arguments passed to `RateLimiter`
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(model)
+        if limiter is None or (limiter.rpm, limiter.tpm) != (rpm, tpm):
+            limiter = _limiters[model] = RateLimiter(model, rpm=rpm, tpm=tpm, **kwargs)
+        return limiter
+
+
+def get_rate_limiter(model: str) -> Union[RateLimiter, None]:
+    """Returns the rate limiter configured for a model, if any"""
+    return _limiters.get(model)
@@ -0,0 +1,56 @@
+import threading
+from typing import Callable, Dict
+
+
+_model_info: Dict[str, Dict] = {}
+_tool_schemas: Dict[Callable, Dict] = {}
+_lock = threading.Lock()
+
+
+def get_model_info(model: str) -> Dict:
+    """Returns (memoized) litellm model info, including capabilities such as `supports_function_calling`
+
+    Args:
+        model: A litellm model identifier
+
+    Returns:
+        Dict: The model info
+    """
+    info = _model_info.get(model)
+    if info is None:
+        from litellm import get_model_info as litellm_get_model_info
+        info = litellm_get_model_info(model=model)
+        with _lock:
+            info = _model_info.setdefault(model, info)
+    return info
+
+
+def register_model_info(model: str, **info) -> Dict:
+    """Registers (or updates) the model info for a model, e.g., for a model unknown to litellm
+
+    Args:
+        model: A model identifier
+        **info: Model info keys, e.g., `supports_function_calling=True`
+
+    Returns:
+        Dict: The registered model info
+    """
+    defaults = {
+        "supports_assistant_prefill": False,
+        "supports_function_calling": False,
+        "supports_prompt_caching": False,
+    }
+    with _lock:
+        _model_info[model] = defaults | _model_info.get(model, {}) | info
+        return _model_info[model]
+
+
+def get_tool_schema(function: Callable) -> Dict:
+    """Returns the (memoized) tool schema for a python function, parsed from its signature and numpydoc docstring"""
+    schema = _tool_schemas.get(function)
+    if schema is None:
+        from litellm.utils import function_to_dict
+        schema = {"type": "function", "function": function_to_dict(function)}
+        with _lock:
+            schema = _tool_schemas.setdefault(function, schema)
+    return schema
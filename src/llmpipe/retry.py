@@ -0,0 +1,225 @@
+import asyncio
+import email.utils
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, TypeVar, Union
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_stats_lock = threading.Lock()
+
+#: HTTP status codes for errors that are worth retrying (timeouts, rate limits, overloaded or failing servers)
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class CircuitOpenError(Exception):
+    """Raised when a request is refused because the circuit breaker for a model is open"""
+    def __init__(self, model: str, retry_after: float):
+        super().__init__(f"Circuit breaker for {model} is open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+@dataclass
+class RetryStats:
+    """Counts retries, time spent waiting to retry and circuit breaker trips"""
+    retries: int = 0
+    wait_seconds: float = 0.
+    breaker_trips: int = 0
+
+    def add(self, other: "RetryStats"):
+        """Adds the counts of another `RetryStats`, e.g., those of one request. Safe to call from several threads."""
+        with _stats_lock:
+            self.retries += other.retries
+            self.wait_seconds += other.wait_seconds
+            self.breaker_trips += other.breaker_trips
+
+    @property
+    def total(self):
+        """Returns formatted string containing the retry counts"""
+        return f"retries: {self.retries:,.0f}, waited: {self.wait_seconds:,.1f}s, breaker trips: {self.breaker_trips:,.0f}"
+
+
+def is_retryable(error: Exception) -> bool:
+    """Returns true for transient errors: timeouts, connection errors, rate limits and server errors"""
+    if isinstance(error, (CircuitOpenError, TimeoutError, ConnectionError)):
+        return True
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int):
+        return status_code in RETRYABLE_STATUS_CODES
+    import litellm
+    return isinstance(error, (
+        litellm.Timeout,
+        litellm.APIConnectionError,
+        litellm.RateLimitError,
+        litellm.ServiceUnavailableError,
+        litellm.InternalServerError,
+    ))
+
+
+def retry_after(error: Exception) -> Union[float, None]:
+    """Returns the delay requested by the provider through Retry-After headers, if any"""
+    if isinstance(error, CircuitOpenError):
+        return error.retry_after
+    headers = getattr(getattr(error, "response", None), "headers", None) or getattr(error, "litellm_response_headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.)
+    except Exception:
+        return None
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with jitter for retryable errors
+
+    The delay before retry `n` (starting at 0) is `base_delay * 2 ** n`, capped at `max_delay` and
+    reduced by a random fraction of up to `jitter`. A Retry-After delay from the provider takes precedence.
+    """
+    max_retries: int = 5  #: Maximum number of retries (default: 5)
+    base_delay: float = 1.  #: Delay before the first retry in seconds (default: 1)
+    max_delay: float = 60.  #: Maximum delay in seconds (default: 60)
+    jitter: float = 0.5  #: Maximum fraction of the delay to remove at random (default: 0.5)
+
+    def delay(self, attempt: int, error: Exception = None) -> float:
+        """Returns the number of seconds to wait before retry `attempt`"""
+        requested = retry_after(error) if error is not None else None
+        if requested is not None:
+            return min(requested, self.max_delay)
+        delay = min(self.base_delay * 2 ** attempt, self.max_delay)
+        return delay * (1 - self.jitter * random.random())
+
+
+class CircuitBreaker:
+    """Stops sending requests to a model after consecutive failures
+
+    After `failure_threshold` consecutive retryable failures the breaker opens and requests are refused
+    with `CircuitOpenError` for `cooldown` seconds. After that, the breaker is half-open: a single trial
+    request is let through while others keep being refused. A success closes the breaker and a failure
+    opens it again. If the trial has not finished within `cooldown` seconds, another trial is let through.
+    """
+    def __init__(self, model: str, failure_threshold: int = 5, cooldown: float = 30.):
+        self.model = model
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started_at = None
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raises `CircuitOpenError` while the breaker is open, or half-open with a trial request in flight"""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            now = time.monotonic()
+            remaining = self.opened_at + self.cooldown - now
+            if remaining <= 0:
+                if self.trial_started_at is None or self.trial_started_at + self.cooldown <= now:
+                    self.trial_started_at = now
+                    return
+                remaining = self.trial_started_at + self.cooldown - now
+        raise CircuitOpenError(self.model, remaining)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_started_at = None
+
+    def record_failure(self) -> bool:
+        """Records a retryable failure. Returns true if this failure tripped the breaker."""
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                # Re-open after a failed trial request, or trip for the first time
+                tripped = self.opened_at is None or self.opened_at + self.cooldown <= time.monotonic()
+                if tripped:
+                    self.opened_at = time.monotonic()
+                    self.trial_started_at = None
+                    logger.warning(f"Circuit breaker for {self.model} opened after {self.failures} consecutive failures")
+                return tripped
+            return False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(model: str) -> CircuitBreaker:
+    """Returns the process-wide circuit breaker for a model"""
+    with _breakers_lock:
+        if model not in _breakers:
+            _breakers[model] = CircuitBreaker(model)
+        return _breakers[model]
+
+
+def _handle_error(error: Exception, attempt: int, policy: RetryPolicy, breaker: CircuitBreaker, stats: RetryStats) -> float:
+    """Records a failed attempt. Returns the delay before the next attempt or re-raises the error."""
+    retryable = is_retryable(error)
+    if retryable and not isinstance(error, CircuitOpenError) and breaker.record_failure():
+        stats.breaker_trips += 1
+    if not retryable:
+        # The model answered (e.g., a bad request), so a half-open trial must not keep refusing other callers
+        breaker.record_success()
+    if not retryable or attempt >= policy.max_retries:
+        raise error
+    delay = policy.delay(attempt, error)
+    stats.retries += 1
+    stats.wait_seconds += delay
+    logger.warning(f"Retry {attempt + 1}/{policy.max_retries} in {delay:.1f}s after error: {error}")
+    return delay
+
+
+def call_with_retries(fn: Callable[[], T], policy: RetryPolicy, breaker: CircuitBreaker, stats: RetryStats) -> T:
+    """Calls `fn`, retrying retryable errors according to `policy`
+
+    Args:
+        fn: A function that sends a request
+        policy: The retry policy
+        breaker: The circuit breaker for the model the request is sent to
+        stats: Counters to update
+
+    Returns:
+        The return value of `fn`
+    """
+    attempt = 0
+    while True:
+        try:
+            breaker.before_call()
+            result = fn()
+        except Exception as e:
+            time.sleep(_handle_error(e, attempt, policy, breaker, stats))
+            attempt += 1
+        else:
+            breaker.record_success()
+            return result
+
+
+async def acall_with_retries(fn: Callable[[], Awaitable[T]], policy: RetryPolicy, breaker: CircuitBreaker, stats: RetryStats) -> T:
+    """Async version of `call_with_retries`"""
+    attempt = 0
+    while True:
+        try:
+            breaker.before_call()
+            result = await fn()
+        except Exception as e:
+            await asyncio.sleep(_handle_error(e, attempt, policy, breaker, stats))
+            attempt += 1
+        else:
+            breaker.record_success()
+            return result
@@ -1,10 +1,13 @@
+import asyncio
 import json
 import logging
 from dataclasses import dataclass, field, asdict
-from typing import List, Dict
+from typing import Callable, Iterable, Iterator, List, Dict
 
-from datasets import Dataset
 
+from llmpipe.evaluations.core import Evaluation, evaluate_batch
+from llmpipe.evaluations.llm_eval import fuse_llm_evaluations
+from llmpipe.executor import amap_samples, imap_samples, map_samples
 from llmpipe.field import Input, Output
 from llmpipe.llmchat import LlmChat
 from llmpipe.template import Template
@@ -18,45 +21,94 @@ logger = logging.getLogger(__name__)
 @dataclass
 class RevisorModule(PromptModule):
     """An LLM prompt class"""
-
-    def __call__(self, num_proc: int = 1, **inputs) -> Dict:
+    fuse_llm_evaluations: bool = True  #: If true, check all llm evaluations of a field in a single judge call
+
+    @property
+    def _dedup_columns(self) -> List[str]:
+        """The columns that determine a sample's outputs, including the outputs being revised"""
+        return [x.name for x in self.inputs + self.outputs]
+
+    def _revise_one(self, **sample) -> Dict:
+        """Revises a sample on a fork of the module, returning the revised outputs"""
+        revised = self.fork().revise(**sample)
+        return {x.name: revised.get(x.name) for x in self.outputs}
+
+    async def _arevise_one(self, **sample) -> Dict:
+        """Async version of `_revise_one`"""
+        revised = await self.arevise(**sample)
+        return {x.name: revised.get(x.name) for x in self.outputs}
+
+    def __call__(self, concurrency: int = 1, num_proc: int = None, on_result: Callable[[Dict], None] = None, **inputs) -> Dict:
+        """Revises one sample, or each sample of a dataset when the inputs are lists
+
+        In dataset mode, samples run on up to `concurrency` threads, each on a fork of the module, and
+        identical samples are revised once (see `dedup`). `num_proc` is a deprecated alias for `concurrency`.
+        `on_result` is called with each result as soon as it completes.
+        """
         if not isinstance(list(inputs.values())[0], list):
             return self.revise(**inputs)
+        return map_samples(self._dedup(self._revise_one), inputs, num_proc or concurrency, on_result, self.metrics)
+
+    def imap(self, samples: Iterable[Dict], concurrency: int = 1, ordered: bool = False) -> Iterator[Dict]:
+        """Revises each sample of an iterable, yielding the revised samples. See `PromptModule.imap`."""
+        return imap_samples(self._dedup(self._revise_one, max_finished=self.dedup_window), samples, concurrency, ordered, self.metrics)
 
-        return (
-            Dataset.from_dict(inputs)
-            .map(
-                lambda sample: sample | self.revise(**sample),
-                num_proc=num_proc,
-                batched=False
-            )
-        ).to_dict()
+    async def acall(self, concurrency: int = 64, on_result: Callable[[Dict], None] = None, **inputs) -> Dict:
+        """Async version of `__call__`. In dataset mode, at most `concurrency` samples are revised at once."""
+        if not isinstance(list(inputs.values())[0], list):
+            return await self.arevise(**inputs)
+        return await amap_samples(self._dedup(self._arevise_one, is_async=True), inputs, concurrency, on_result, self.metrics)
+
+    def _evaluations(self, field: Output) -> List[Evaluation]:
+        """Returns a field's evaluations, deterministic evaluations first, with judges configured like this module
+
+        With `fuse_llm_evaluations`, a field's llm evaluations are replaced by a single `FusedLlmEvaluation`.
+        """
+        evaluations = field.evaluations or []
+        if self.fuse_llm_evaluations:
+            evaluations = fuse_llm_evaluations(evaluations)
+        # Initialize separate deterministic and llm-based evaluations
+        deterministic_evaluations = []
+        llm_evaluations = []
+        for evaluation in evaluations:
+            if evaluation.type == "llm":
+                evaluation.generator.model = self.model
+                evaluation.generator.verbose = self.verbose
+                evaluation.generator.cache = self.cache
+                # Judge usage is counted in this module's token counts and metrics
+                evaluation.generator.tokens = self.tokens
+                evaluation.generator.metrics = self.metrics
+                llm_evaluations.append(evaluation)
+            else:
+                deterministic_evaluations.append(evaluation)
+        return deterministic_evaluations + llm_evaluations
 
     def evaluate(self, break_after_first_fail: bool = False, **inputs) -> Dict:
-        """Run evaluations"""
-        outputs = {}
+        """Run evaluations on one sample, or on each sample of a dataset when the inputs are lists
+
+        In dataset mode, deterministic evaluations score whole columns at once (see `Evaluation.batch`), and
+        each `<field>_eval` column holds the failed results of each sample.
+        """
+        if inputs and isinstance(list(inputs.values())[0], list):
+            return {
+                f"{field.name}_eval": [
+                    [asdict(x) for x in failed]
+                    for failed in evaluate_batch(self._evaluations(field), inputs[field.name], break_after_first_fail, **inputs)
+                ]
+                for field in self.outputs
+            }
 
+        outputs = {}
         for field in self.outputs:
-            # Initialize separate deterministic and llm-based evaluations
-            deterministic_evaluations = []
-            llm_evaluations = []
-            for evaluation in field.evaluations or []:
-                if evaluation.type == "llm":
-                    evaluation.generator.model = self.model
-                    evaluation.generator.verbose = self.verbose
-                    llm_evaluations.append(evaluation)
-                else:
-                    deterministic_evaluations.append(evaluation)
-
             evaluation_results = []
-            for evaluation in deterministic_evaluations + llm_evaluations:
-                eval_result = evaluation(**(inputs | outputs))
-                if evaluation.type == "llm":
-                    self.tokens += evaluation.tokens
-                if eval_result.evaluation_result != "PASS":
-                    evaluation_results.append(asdict(eval_result))
-                    if break_after_first_fail:
-                        break
+            for evaluation in self._evaluations(field):
+                for eval_result in evaluation.evaluate(**(inputs | outputs)):
+                    if eval_result.evaluation_result != "PASS":
+                        evaluation_results.append(asdict(eval_result))
+                        if break_after_first_fail:
+                            break
+                if evaluation_results and break_after_first_fail:
+                    break
 
             outputs[f"{field.name}_eval"] = evaluation_results
         return outputs
@@ -64,6 +116,7 @@ class RevisorModule(PromptModule):
     def revise(self, max_revisions: int = 6, **inputs) -> Dict:
         """Evaluate and revise"""
         # Iterate max_revision times or until all evaluations pass
+        revisions = 0
         for revision_idx in range(max_revisions + 1):
             finished = True
             eval_results = self.evaluate(**inputs, break_after_first_fail=True)
@@ -85,16 +138,86 @@ class RevisorModule(PromptModule):
                     inputs=self.inputs + [field, evaluation_result],
                     outputs=[chain_of_thought, field],
                     verbose=self.verbose,
+                    label="revisor",
                     **self.model_args
                 )
+                revisor.tokens = self.tokens
+                revisor.metrics = self.metrics
                 eval_results_str = json.dumps(eval_result[0], indent=2)
                 logger.info(f"Revision {revision_idx + 1}: `{field.name}`")
                 revised = revisor(**inputs, evaluation_result=eval_results_str)
-                self.tokens += revisor.tokens
                 if revised[field.name].strip():
                     inputs[field.name] = revised[field.name].strip()
 
             if finished:
                 break
+            revisions += 1
+
+        self.metrics.record_revisions(revisions)
+        return inputs
+
+    async def aevaluate(self, break_after_first_fail: bool = False, **inputs) -> Dict:
+        """Async version of `evaluate`. When `break_after_first_fail` is false, llm evaluations run concurrently."""
+        outputs = {}
+        for field in self.outputs:
+            sample = inputs | outputs
+            evaluations = self._evaluations(field)
+            if break_after_first_fail:
+                eval_results = []
+                for evaluation in evaluations:
+                    eval_results += await evaluation.aevaluate(**sample)
+                    if any(x.evaluation_result != "PASS" for x in eval_results):
+                        break
+            else:
+                eval_results = [
+                    eval_result
+                    for results in await asyncio.gather(*[evaluation.aevaluate(**sample) for evaluation in evaluations])
+                    for eval_result in results
+                ]
+
+            failed = [asdict(eval_result) for eval_result in eval_results if eval_result.evaluation_result != "PASS"]
+            outputs[f"{field.name}_eval"] = failed[:1] if break_after_first_fail else failed
+        return outputs
+
+    async def arevise(self, max_revisions: int = 6, **inputs) -> Dict:
+        """Async version of `revise`"""
+        # Iterate max_revision times or until all evaluations pass
+        revisions = 0
+        for revision_idx in range(max_revisions + 1):
+            finished = True
+            eval_results = await self.aevaluate(**inputs, break_after_first_fail=True)
+
+            for field in self.outputs:
+                if self.verbose:
+                    print(f"Revision iteration {revision_idx + 1} for `{field.name}`")
+                eval_result = eval_results.get(f"{field.name}_eval")
+                if not eval_result:
+                    continue
+                if self.verbose:
+                    print("Revising for: " + str(eval_result))
+                finished = False
+                chain_of_thought = Output("thinking", "Begin by thinking step by step")
+                evaluation_result = Input("evaluation_result", "An evaluation result")
+                revisor = PromptModule(
+                    task="Your task is to generate an updated version of the field indicated in the evaluation result so that it meets all evaluation criteria and requirements.",
+                    details=self.details,
+                    inputs=self.inputs + [field, evaluation_result],
+                    outputs=[chain_of_thought, field],
+                    verbose=self.verbose,
+                    label="revisor",
+                    **self.model_args
+                )
+                revisor.tokens = self.tokens
+                revisor.metrics = self.metrics
+                eval_results_str = json.dumps(eval_result[0], indent=2)
+                logger.info(f"Revision {revision_idx + 1}: `{field.name}`")
+                revised = await revisor.aforward_one(**inputs, evaluation_result=eval_results_str)
+                if revised[field.name].strip():
+                    inputs[field.name] = revised[field.name].strip()
+
+            if finished:
+                break
+            revisions += 1
 
-        return inputs
\ No newline at end of file
+        self.metrics.record_revisions(revisions)
+        return inputs
@@ -1,17 +1,64 @@
-from dataclasses import dataclass
+import functools
+import re
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+
+_KEY_PATTERN = re.compile(r"\{\{([^{}]*)\}\}")
+
+
+@functools.lru_cache(maxsize=64)
+def _compile(template: str) -> Tuple[Tuple[str, ...], Tuple[Tuple[int, str], ...]]:
+    """Splits a template into parts, with each key's placeholder as its own part
+
+    Returns:
+        The parts, and the index and key of each placeholder part
+    """
+    parts = []
+    slots = []
+    idx = 0
+    for match in _KEY_PATTERN.finditer(template):
+        parts.append(template[idx:match.start()])
+        slots.append((len(parts), match.group(1)))
+        parts.append(match.group(0))
+        idx = match.end()
+    parts.append(template[idx:])
+    return tuple(parts), tuple(slots)
 
 
 @dataclass
 class Template:
-    """A string template with keys marked by double curly braces."""
+    """A string template with keys marked by double curly braces.
+
+    The template is parsed once, and `format` renders it in a single pass, so the cost of formatting does
+    not grow with the number of keys times the size of the template.
+    """
 
     template: str  #: A string template
+    _compiled: Tuple = field(default=None, init=False, repr=False, compare=False)
+
+    def _parts(self) -> Tuple[Tuple[str, ...], Tuple[Tuple[int, str], ...]]:
+        # Recompiles if `template` was reassigned
+        if self._compiled is None or self._compiled[0] is not self.template:
+            self._compiled = (self.template, *_compile(self.template))
+        return self._compiled[1:]
+
+    @property
+    def keys(self) -> List[str]:
+        """Returns the template keys, in order of first appearance"""
+        return list(dict.fromkeys(key for _, key in self._parts()[1]))
+
+    def missing_keys(self, **kwargs) -> List[str]:
+        """Returns the template keys without a `kwarg` value"""
+        return [key for key in self.keys if key not in kwargs]
 
     def format(self, **kwargs) -> str:
-        """Replace template keys with `kwarg` values."""
-        template = self.template
-        for k, v in kwargs.items():
-            kk = "{{" + k + "}}"
-            if kk in template:
-                template = template.replace(kk, str(v) or "")
-        return template
+        """Replace template keys with `kwarg` values. Keys without a value are left unchanged."""
+        parts, slots = self._parts()
+        if not slots:
+            return self.template
+        parts = list(parts)
+        for idx, key in slots:
+            if key in kwargs:
+                parts[idx] = str(kwargs[key])
+        return "".join(parts)
@@ -0,0 +1,159 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field, asdict, fields
+from typing import Dict, List
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms rely on atomic appends only
+    fcntl = None
+
+
+#: Environment variable holding the path of the process-wide usage ledger, inherited by worker processes
+LEDGER_PATH_ENV = "LLMPIPE_USAGE_LEDGER"
+
+
+@dataclass
+class UsageRecord:
+    """Usage for a single LLM call"""
+    module: str  #: A label for the module that made the call
+    model: str  #: The litellm model identifier
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_input_tokens: int = 0  #: Input tokens read from the provider's prompt cache
+    reasoning_tokens: int = 0  #: Output tokens used for reasoning
+    latency: float = 0.  #: Seconds from sending the request to receiving the full response
+    cost: float = 0.  #: Estimated cost in USD
+    cache_hit: bool = False  #: True if the response came from the response cache (no cost)
+    pid: int = field(default_factory=os.getpid)
+    timestamp: float = field(default_factory=time.time)
+
+
+def _empty_totals() -> Dict:
+    return {
+        "calls": 0, "cache_hits": 0, "input_tokens": 0, "output_tokens": 0,
+        "cached_input_tokens": 0, "reasoning_tokens": 0, "cost": 0., "latency": 0.
+    }
+
+
+def _add_record(totals: Dict, record: UsageRecord):
+    totals["calls"] += 1
+    totals["cache_hits"] += int(record.cache_hit)
+    for key in ("input_tokens", "output_tokens", "cached_input_tokens", "reasoning_tokens", "cost", "latency"):
+        totals[key] += getattr(record, key)
+
+
+class UsageLedger:
+    """Records per-call LLM usage and aggregates it across threads and worker processes
+
+    Records are appended to a jsonlines file when `path` is provided, so records written by worker
+    processes are included when the parent aggregates them. Otherwise, totals are kept in memory
+    along with the most recent `max_records` records.
+
+    ### Usage
+
+    ```
+    ledger = UsageLedger("usage.jsonl")
+    ledger.record(UsageRecord(module="PromptModule", model="claude-3-5-haiku-20241022", input_tokens=100))
+    print(ledger.report())
+    ```
+    """
+    def __init__(self, path: str = None, max_records: int = 10000):
+        self.path = path
+        self._records = deque(maxlen=max_records)
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, record: UsageRecord):
+        """Adds a record to the ledger"""
+        if self.path is None:
+            with self._lock:
+                self._records.append(record)
+                _add_record(self._totals.setdefault((record.module, record.model), _empty_totals()), record)
+            return
+        line = (json.dumps(asdict(record)) + "\n").encode()
+        with self._lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+
+    def records(self) -> List[UsageRecord]:
+        """Returns the records, including those written by other processes when the ledger is file-backed"""
+        if self.path is None:
+            with self._lock:
+                return list(self._records)
+        if not os.path.exists(self.path):
+            return []
+        keys = {x.name for x in fields(UsageRecord)}
+        with open(self.path, "r") as f:
+            return [
+                UsageRecord(**{k: v for k, v in json.loads(line).items() if k in keys})
+                for line in f
+                if line.strip()
+            ]
+
+    def summary(self, by: str = "module") -> Dict[str, Dict]:
+        """Returns usage totals grouped by 'module' or 'model'"""
+        assert by in ("module", "model")
+        totals = {}
+        if self.path is None:
+            with self._lock:
+                for (module, model), x in self._totals.items():
+                    total = totals.setdefault(module if by == "module" else model, _empty_totals())
+                    for key, value in x.items():
+                        total[key] += value
+            return totals
+        for record in self.records():
+            _add_record(totals.setdefault(getattr(record, by), _empty_totals()), record)
+        return totals
+
+    def report(self) -> str:
+        """Returns usage totals by module and by model, formatted as text tables"""
+        lines = []
+        for by in ("module", "model"):
+            lines.append(
+                f"{by:<24}{'calls':>8}{'hits':>8}{'input':>12}{'output':>12}{'cached':>12}"
+                f"{'reasoning':>12}{'cost ($)':>10}{'latency (s)':>13}"
+            )
+            for name, x in sorted(self.summary(by).items()):
+                mean_latency = x["latency"] / max(x["calls"] - x["cache_hits"], 1)
+                lines.append(
+                    f"{str(name):<24}{x['calls']:>8,}{x['cache_hits']:>8,}{x['input_tokens']:>12,}{x['output_tokens']:>12,}"
+                    f"{x['cached_input_tokens']:>12,}{x['reasoning_tokens']:>12,}{x['cost']:>10,.4f}{mean_latency:>13,.2f}"
+                )
+            lines.append("")
+        return "\n".join(lines)
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger() -> UsageLedger:
+    """Returns the process-wide usage ledger, which every `LlmChat` records to"""
+    global _ledger
+    path = os.environ.get(LEDGER_PATH_ENV)
+    with _ledger_lock:
+        if _ledger is None or _ledger.path != path:
+            _ledger = UsageLedger(path)
+        return _ledger
+
+
+def set_ledger(path: str = None) -> UsageLedger:
+    """Sets the file backing the process-wide usage ledger. Worker processes started afterwards inherit it.
+
+    Args:
+        path: Path to a jsonlines file, or None to record in memory
+    """
+    if path is None:
+        os.environ.pop(LEDGER_PATH_ENV, None)
+    else:
+        os.environ[LEDGER_PATH_ENV] = os.path.abspath(path)
+    return get_ledger()
@@ -1,6 +1,6 @@
 import re
 from dataclasses import dataclass
-from typing import List
+from typing import Callable, Dict, Iterator, List
 
 
 @dataclass
@@ -52,4 +52,68 @@ def parse_text_for_one_tag(text: str, tag: str) -> str:
         List[str]: A list of strings, each representing the content inside a tag block
     """
     results = parse_text_for_tag(text, tag)
-    return results[-1] if results else ""
\ No newline at end of file
+    return results[-1] if results else ""
+
+
+class StreamingTagParser:
+    """Incrementally extracts the contents of XML tags from streamed text
+
+    Each time a closing tag for one of `tags` arrives, the tag's content (the last block, as returned by
+    `parse_text_for_one_tag`) is emitted and `callback(tag, content)` is called.
+
+    ### Usage
+
+    ```
+    parser = StreamingTagParser(["thinking", "answer"], callback=print)
+    for chunk in chunks:
+        parser.feed(chunk)
+        if parser.done:
+            break
+    ```
+
+    Args:
+        tags: The tags, without angle braces, to extract
+        callback: An optional function called with the tag and its content when a tag is closed
+    """
+    def __init__(self, tags: List[str], callback: Callable[[str, str], None] = None):
+        self.tags = list(tags)
+        self.callback = callback
+        self.text = ""
+        self.outputs: Dict[str, str] = {}
+        self._closing_tags = {f"</{tag}>": tag for tag in self.tags}
+        self._overlap = max((len(x) for x in self._closing_tags), default=1) - 1
+
+    @property
+    def done(self) -> bool:
+        """True once every tag has been closed"""
+        return len(self.outputs) == len(self.tags)
+
+    def feed(self, chunk: str) -> List[XmlBlock]:
+        """Adds a chunk of text. Returns the blocks closed by this chunk, in order."""
+        if not chunk:
+            return []
+        scanned = len(self.text)
+        self.text += chunk
+        # Closing tags that end within the new text (a tag may straddle the previous chunk)
+        closed = sorted(
+            (idx, tag)
+            for closing_tag, tag in self._closing_tags.items()
+            for idx in _find_all(self.text, closing_tag, max(scanned - self._overlap, 0))
+            if idx + len(closing_tag) > scanned
+        )
+        blocks = []
+        for idx, tag in closed:
+            content = parse_text_for_one_tag(self.text[:idx + len(tag) + 3], tag)
+            self.outputs[tag] = content
+            blocks.append(XmlBlock(tag, content))
+            if self.callback is not None:
+                self.callback(tag, content)
+        return blocks
+
+
+def _find_all(text: str, sub: str, start: int = 0) -> Iterator[int]:
+    """Yields the start indices of all occurrences of `sub` in `text` from `start`"""
+    idx = text.find(sub, start)
+    while idx >= 0:
+        yield idx
+        idx = text.find(sub, idx + 1)
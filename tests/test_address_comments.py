@@ -0,0 +1,38 @@
+import random
+
+from llmpipe.modules.address_comments import apply_search_replace
+
+
+def sequential(text, searches, replaces):
+    for search, replace in zip(searches, replaces):
+        text = text.replace(search, replace) if search else text
+    return text
+
+
+def test_apply_search_replace():
+    """Test that search-replace pairs give the same text as applying them one after another"""
+    text = "# Title\nIntro <comment>Move the last line up</comment>\nBody\nLast line\nEnd\n"
+    cases = [
+        # Independent edits, including a case-sensitive search and an empty search
+        (["Intro", "body", "End", ""], ["Introduction", "BODY", "Fin", "x"]),
+        # Move: delete a line and insert it at an anchor that overlaps the deleted span
+        (["Body\nLast line\n", "Body\n"], ["Body\n", "Last line\nBody\n"]),
+        # Chained: the second search only matches after the first replacement
+        (["Last line", "Final line\nEnd"], ["Final line", "The end"]),
+        # The second search matches inside the first replacement
+        (["# Title", "Header"], ["# Header", "Top"]),
+        # Repeated occurrences are replaced from the left without overlapping
+        (["a", "aa"], ["b", "c"]),
+    ]
+    for searches, replaces in cases:
+        assert apply_search_replace(text + "aaa", searches, replaces) == sequential(text + "aaa", searches, replaces)
+
+
+def test_apply_search_replace_random():
+    """Test random search-replace pairs against applying them one after another"""
+    rng = random.Random(0)
+    for _ in range(2000):
+        text = "".join(rng.choice("abAB\n") for _ in range(rng.randint(0, 30)))
+        searches = ["".join(rng.choice("abA\n") for _ in range(rng.randint(0, 3))) for _ in range(rng.randint(1, 3))]
+        replaces = ["".join(rng.choice("ab") for _ in range(rng.randint(0, 3))) for _ in searches]
+        assert apply_search_replace(text, searches, replaces) == sequential(text, searches, replaces), (text, searches, replaces)
@@ -0,0 +1,78 @@
+import time
+from unittest.mock import patch
+
+from litellm import ModelResponse
+
+from llmpipe.cache import ResponseCache
+from llmpipe.llmchat import LlmChat
+
+
+def make_response(content="Hello!", prompt_tokens=20, completion_tokens=10):
+    return ModelResponse(
+        choices=[{"message": {"role": "assistant", "content": content}}],
+        usage={
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    )
+
+
+def test_cache_get_set(tmp_path):
+    """Test storing and retrieving a response"""
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    key = cache.key({"model": "m", "messages": [{"role": "user", "content": "Hi"}]})
+    assert key == cache.key({"messages": [{"role": "user", "content": "Hi"}], "model": "m"})
+    assert cache.get(key) is None
+    cache.set(key, {"content": "Hello"})
+    assert cache.get(key) == {"content": "Hello"}
+    assert len(cache) == 1
+
+
+def test_cache_max_age(tmp_path):
+    """Test that expired entries are ignored and evicted"""
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_age_seconds=0.05)
+    cache.set("a", {"content": "A"})
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    cache.evict()
+    assert len(cache) == 0
+
+
+def test_cache_max_size(tmp_path):
+    """Test that least recently used entries are evicted first"""
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_size_bytes=60, evict_every=1)
+    cache.set("a", {"content": "A" * 10})
+    cache.set("b", {"content": "B" * 10})
+    cache.get("a")
+    cache.set("c", {"content": "C" * 10})
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_llmchat_cache_hit(tmp_path):
+    """Test that repeated requests are served from the cache with their token usage"""
+    cache_path = str(tmp_path / "cache.sqlite")
+    with patch("llmpipe.llmchat.completion", return_value=make_response()) as mock_completion:
+        chat = LlmChat(cache_path=cache_path)
+        assert chat("Hi there!") == "Hello!"
+        chat.clear_history()
+        assert chat("Hi there!") == "Hello!"
+        assert mock_completion.call_count == 1
+
+    assert chat.cache_stats.hits == 1
+    assert chat.cache_stats.misses == 1
+    assert chat.tokens.total == "in: 40, out: 20"
+
+
+def test_llmchat_cache_sampled_opt_out(tmp_path):
+    """Test that requests with temperature > 0 bypass the cache when `cache_sampled` is false"""
+    cache_path = str(tmp_path / "cache.sqlite")
+    with patch("llmpipe.llmchat.completion", return_value=make_response()) as mock_completion:
+        chat = LlmChat(cache_path=cache_path, temperature=1.0, cache_sampled=False)
+        chat("Hi there!")
+        chat.clear_history()
+        chat("Hi there!")
+        assert mock_completion.call_count == 2
+    assert chat.cache_stats.hits == 0
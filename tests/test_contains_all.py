@@ -61,3 +61,20 @@ def test_contains_all_non_string_values():
     )
     result = eval(text="Contains 123 and True")
     assert result.evaluation_result == "PASS"
+
+
+def test_evaluate_batch():
+    """Test that evaluations over a column stop at each value's first failure"""
+    from llmpipe.evaluations import evaluate_batch
+    from llmpipe.evaluations.max_chars import MaxCharacters
+
+    evaluations = [ContainsAll(field="text", required_terms=["apple"]), MaxCharacters(field="text", max_chars=10)]
+    values = ["apple", "banana", "apple pie and cream", "cream pie and cake"]
+    failures = evaluate_batch(evaluations, values)
+    assert [[x.requirement for x in failed] for failed in failures] == [
+        [], ["Must contain the following terms: apple"], ["Has at most 10 characters"],
+        ["Must contain the following terms: apple", "Has at most 10 characters"]
+    ]
+    failures = evaluate_batch(evaluations, values, True)
+    assert [len(failed) for failed in failures] == [0, 1, 1, 1]
+    assert failures[3][0].reason == "Field 'text' is missing required values: ['apple']"
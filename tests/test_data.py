@@ -0,0 +1,52 @@
+import json
+import random
+
+import pytest
+
+from llmpipe.data import JsonlWriter, iter_data, read_data, resume_jsonl, sample_data, write_data
+
+
+def test_jsonl_writer(tmp_path):
+    """Test that samples are appended as json lines"""
+    path = str(tmp_path / "out" / "data.jsonl")
+    with JsonlWriter(path) as writer:
+        writer.write({"a": 1, "b": ["x"]})
+    with JsonlWriter(path, append=True, fsync_every=0.) as writer:
+        writer.write({"a": 2, "b": None})
+        assert writer.n_written == 1
+    with open(path) as f:
+        assert [json.loads(line) for line in f] == [{"a": 1, "b": ["x"]}, {"a": 2, "b": None}]
+
+
+def test_resume_jsonl(tmp_path):
+    """Test that truncated lines and dropped rows are removed and the remaining keys returned"""
+    path = str(tmp_path / "data.jsonl")
+    assert resume_jsonl(path, "id") == set()
+
+    with open(path, "w") as f:
+        f.write('{"id": 0, "error": null}\n{"id": 1, "error": "failed"}\n{"id": 2}\n{"id": 3, "err')
+    assert resume_jsonl(path, "id", drop=lambda x: x.get("error")) == {0, 2}
+    with open(path) as f:
+        assert [json.loads(line)["id"] for line in f] == [0, 2]
+
+    # Nothing to drop, file is unchanged
+    assert resume_jsonl(path, "id") == {0, 2}
+    assert not (tmp_path / "data.jsonl.resume").exists()
+
+
+@pytest.mark.parametrize("ext,separator", [(".jsonl", None), (".csv", ","), (".txt", "\t")])
+def test_iter_data(tmp_path, ext, separator):
+    """Test that streamed samples match the samples read at once"""
+    path = str(tmp_path / f"data{ext}")
+    samples = [{"a": i, "b": f"text {i}"} for i in range(25)]
+    write_data(samples, path)
+    assert list(iter_data(path, batch_size=10)) == read_data(path) == samples
+
+
+def test_sample_data():
+    """Test reservoir sampling"""
+    random.seed(0)
+    samples = sample_data(({"a": i} for i in range(1000)), 10)
+    assert len(samples) == 10
+    assert len({x["a"] for x in samples}) == 10
+    assert sample_data(({"a": i} for i in range(3)), 10) == [{"a": 0}, {"a": 1}, {"a": 2}]
@@ -49,3 +49,30 @@ def test_is_in_allow_list_empty_allowed_list():
     evaluation = IsInAllowList(field="text", allowed_terms=[])
     result = evaluation(text="anything")
     assert result.evaluation_result == "FAIL"
+
+
+def test_is_in_allow_list_from_path(tmp_path, monkeypatch):
+    """Test allowed terms read from a file, combined with a list"""
+    monkeypatch.setenv("LLMPIPE_INDEX_DIR", str(tmp_path))
+    path = tmp_path / "allowed.txt"
+    path.write_text("\n".join(f"Value {i}" for i in range(1000)))
+    evaluation = IsInAllowList(field="text", allowed_terms=["extra"], allowed_terms_path=str(path))
+    assert evaluation.requirement == "Must be one of the following: extra"
+    assert evaluation(text="value 999").evaluation_result == "PASS"
+    assert evaluation(text="Extra").evaluation_result == "PASS"
+    assert evaluation(text="value 1000").evaluation_result == "FAIL"
+    assert evaluation.batch(["VALUE 1", "value 1000"]).passed == [True, False]
+
+
+def test_is_in_allow_list_from_path_batch_stats_once(tmp_path, monkeypatch):
+    """Test that a batch looks up the index of the allowed terms file once rather than per row"""
+    import llmpipe.evaluations.is_in_allow_list as module
+    monkeypatch.setenv("LLMPIPE_INDEX_DIR", str(tmp_path))
+    path = tmp_path / "allowed.txt"
+    path.write_text("a\nb\n")
+    lookups = []
+    get_index = module.get_index
+    monkeypatch.setattr(module, "get_index", lambda *args: lookups.append(args) or get_index(*args))
+    evaluation = IsInAllowList(field="text", allowed_terms_path=str(path))
+    assert evaluation.batch(["a", "B"] * 100).passed == [True, True] * 100
+    assert len(lookups) == 1
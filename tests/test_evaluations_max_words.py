@@ -51,3 +51,15 @@ def test_max_words_edge_cases():
     # Extra whitespace
     result = eval(text="  One   two  three  ")
     assert result.evaluation_result == "PASS"
+
+
+def test_max_words_batch():
+    """Test that batch results match per-value results"""
+    eval = MaxWords(field="text", max_words=3)
+    values = ["One two three", "This is too many words", "", "  One   two  three  four "]
+    result = eval.batch(values)
+    assert result.passed == [True, False, True, False]
+    assert result.failed == [1, 3]
+    assert result.reasons == {1: "Should have at most 3 words, but has 5", 3: "Should have at most 3 words, but has 4"}
+    assert result.result(3) == eval(text=values[3])
+    assert eval.batch([]).passed == []
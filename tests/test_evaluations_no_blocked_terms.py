@@ -120,3 +120,37 @@ def test_no_blocked_terms_requirement():
         requirement=custom_req
     )
     assert evaluation.requirement == custom_req
+
+
+def test_no_blocked_terms_batch():
+    """Test batch evaluation with fixed and per-row blocked terms"""
+    evaluation = NoBlockedTerms(field="text", blocked_terms=["bad", "very bad", "x-ray"])
+    values = ["Bad idea", "a badge", "it is very bad", "An X-RAY scan", "fine"]
+    result = evaluation.batch(values)
+    assert result.passed == [evaluation(text=x).evaluation_result == "PASS" for x in values] == [False, True, False, False, True]
+    assert result.reasons[2] == "Should not contain the blocked text: bad, very bad"
+
+    evaluation = NoBlockedTerms(field="text", blocked_terms_field="blocked")
+    result = evaluation.batch(["a cat", "a dog"], blocked=[["cat"], ["cat"]])
+    assert result.passed == [False, True]
+
+
+def test_no_blocked_terms_word_boundaries():
+    """Test that terms match whole words and phrases next to punctuation, ignoring case"""
+    evaluation = NoBlockedTerms(field="text", blocked_terms=["bad", "Very Bad"])
+    assert evaluation(text="This is bad.").evaluation_result == "FAIL"
+    assert evaluation(text="A badly drawn badge").evaluation_result == "PASS"
+    result = evaluation(text="It was very BAD")
+    assert result.reason == "Should not contain the blocked text: bad, Very Bad"
+
+
+def test_no_blocked_terms_batch_matches_scalar():
+    """Test that batch results equal scalar results, including non-ASCII word boundaries and case folding"""
+    import random
+
+    terms = ["foo", "bar baz", "ß", "ümlaut", "x_y", "İstanbul"]
+    evaluation = NoBlockedTerms(field="text", blocked_terms=terms)
+    pieces = ["foo", "bar", "baz", "İ", "ı", "é", "́", "ß", "SS", "ümlaut", "Ümlaut", "x_y", "_", "istanbul", "İstanbul", " ", "-", "1", "a"]
+    rng = random.Random(0)
+    values = ["İfoo bar", "éfoo", "foó", "ǅfoo"] + ["".join(rng.choice(pieces) for _ in range(rng.randint(0, 8))) for _ in range(2000)]
+    assert evaluation.batch(values).passed == [evaluation(text=x).evaluation_result == "PASS" for x in values]
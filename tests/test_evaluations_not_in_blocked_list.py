@@ -79,3 +79,15 @@ def test_not_in_blocked_list_requirements():
         requirement=custom_req
     )
     assert eval3.requirement == custom_req
+
+
+def test_not_in_blocked_list_from_path(tmp_path, monkeypatch):
+    """Test blocked values read from a file"""
+    monkeypatch.setenv("LLMPIPE_INDEX_DIR", str(tmp_path))
+    path = tmp_path / "blocked.txt"
+    path.write_text("Green\nred\n")
+    evaluation = NotInBlockedList(field="color", blocked_list_path=str(path))
+    assert evaluation.requirement == "Is not identical to any of the blocked values listed in blocked.txt"
+    assert evaluation(color=" green ").evaluation_result == "FAIL"
+    assert evaluation(color="black").evaluation_result == "PASS"
+    assert evaluation.batch(["RED", "blue"]).passed == [False, True]
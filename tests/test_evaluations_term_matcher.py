@@ -0,0 +1,32 @@
+from llmpipe.evaluations.term_matcher import TermMatcher, get_matcher
+
+
+def test_term_matcher_overlapping():
+    """Test that overlapping terms and terms sharing suffixes are all found in one pass"""
+    matcher = TermMatcher(["he", "she", "his", "hers", "x"])
+    assert list(matcher.finditer("uSHErs")) == [(1, 4, 1), (2, 4, 0), (2, 6, 3)]
+    assert matcher.matches("ushers and his") == [0, 1, 2, 3]
+    assert matcher.search("this")
+    assert not matcher.search("no match at all")
+    assert not TermMatcher(["abc"]).search("ababd")
+
+
+def test_term_matcher_whole_words():
+    """Test word boundaries and empty terms"""
+    matcher = TermMatcher(["bad", " very bad ", "c++", ""], whole_words=True)
+    assert matcher.matches("This is Very bad.") == [0, 1]
+    assert matcher.matches("badly, _bad, bad_") == []
+    assert matcher.matches("I write C++ code") == [2]
+    assert TermMatcher(["", "z"]).matches("abc") == [0]
+
+
+def test_get_matcher_cache():
+    """Test that matchers are cached by list identity and contents"""
+    terms = ["apple", 123]
+    matcher = get_matcher(terms)
+    assert get_matcher(terms) is matcher
+    assert get_matcher(["apple", 123]) is matcher
+    assert get_matcher(terms, whole_words=True) is not matcher
+    assert matcher.matches("123 apples") == [0, 1]
+    terms.append("pear")
+    assert get_matcher(terms).matches("pear") == [2]
@@ -0,0 +1,67 @@
+import os
+
+from llmpipe.evaluations.term_set import INDEX_DIR_ENV, HashIndex, _open_index, get_index, get_term_set
+
+
+def test_hash_index(tmp_path):
+    """Test index lookups, including tables with collisions and empty indexes"""
+    terms = [f"term {i}" for i in range(5000)]
+    index = HashIndex.build(terms + terms[:10], str(tmp_path / "terms.idx"))
+    assert len(index) == 5000
+    assert all(term in index for term in terms)
+    assert not any(f"other {i}" in index for i in range(5000))
+    assert "term 1" in HashIndex(str(tmp_path / "terms.idx"))
+    assert "x" not in HashIndex.build([], str(tmp_path / "empty.idx"))
+
+
+def test_get_index(tmp_path, monkeypatch):
+    """Test that files are indexed once per version and normalization"""
+    import polars as pl
+
+    monkeypatch.setenv(INDEX_DIR_ENV, str(tmp_path / "indexes"))
+    path = tmp_path / "terms.txt"
+    path.write_text("Apple\n\n Banana \r\n")
+    index = get_index(str(path), "lower")
+    assert "apple" in index and " banana " in index and "" not in index
+    assert "banana" in get_index(str(path), "lower_strip")
+    assert get_index(str(path), "lower") is index
+
+    # Another process maps the existing index file instead of reading the terms
+    _open_index.cache_clear()
+    mtimes = {x.name: x.stat().st_mtime_ns for x in (tmp_path / "indexes").iterdir()}
+    assert "apple" in get_index(str(path), "lower")
+    assert {x.name: x.stat().st_mtime_ns for x in (tmp_path / "indexes").iterdir()} == mtimes
+
+    # A modified file is indexed again
+    path.write_text("cherry\n")
+    os.utime(path, ns=(0, 0))
+    assert "cherry" in get_index(str(path)) and "apple" not in get_index(str(path))
+
+    pl.DataFrame({"value": ["Kiwi", None], "other": ["x", "y"]}).write_parquet(tmp_path / "terms.parquet")
+    index = get_index(str(tmp_path / "terms.parquet"))
+    assert len(index) == 1 and "kiwi" in index
+
+
+def test_get_term_set():
+    """Test that term sets are cached and rebuilt when a list grows"""
+    terms = ["A", "b", "a"]
+    assert get_term_set(terms) == {"a", "b"}
+    assert get_term_set(terms) is get_term_set(terms)
+    terms.append(" C ")
+    assert get_term_set(terms, "lower_strip") == {"a", "b", "c"}
+    assert get_term_set(terms) == {"a", "b", " c "}
+
+
+def test_get_term_set_empty():
+    """Test that empty lists, e.g., `terms or []` built per row, do not fill the identity cache"""
+    from llmpipe.evaluations.is_in_allow_list import IsInAllowList
+    from llmpipe.evaluations.term_matcher import get_matcher
+    from llmpipe.evaluations.term_set import _term_sets
+
+    size = len(_term_sets._items)
+    evaluation = IsInAllowList(field="text", allowed_terms_field="allowed")
+    for idx in range(100):
+        assert evaluation(text="a", allowed=["a"] if idx % 2 else None).evaluation_result == ("PASS" if idx % 2 else "FAIL")
+    assert len(_term_sets._items) <= size + 50
+    assert get_term_set([]) == frozenset()
+    assert get_matcher([]) is get_matcher([])
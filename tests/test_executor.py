@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+
+from llmpipe.executor import ERROR_KEY, DedupStats, adedup_calls, amap_samples, dedup_calls, imap_samples, map_samples, pack_samples
+
+
+def test_map_samples_ordered_and_concurrent():
+    """Test that results are in input order and samples run concurrently"""
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def fn(x):
+        with lock:
+            running.append(x)
+            peak.append(len(running))
+        time.sleep(0.01 * (5 - x % 5))
+        with lock:
+            running.remove(x)
+        return {"y": x * 2}
+
+    result = map_samples(fn, {"x": list(range(20))}, concurrency=8)
+    assert result == {"x": list(range(20)), "y": [x * 2 for x in range(20)]}
+    assert 1 < max(peak) <= 8
+
+
+def test_map_samples_captures_errors():
+    """Test that a failed sample does not stop the run"""
+    def fn(x):
+        if x == 1:
+            raise ValueError("bad sample")
+        return {"y": x}
+
+    for concurrency in (1, 4):
+        result = map_samples(fn, {"x": [0, 1, 2]}, concurrency=concurrency)
+        assert result["y"] == [0, None, 2]
+        assert result[ERROR_KEY] == [None, "ValueError: bad sample", None]
+
+    assert ERROR_KEY not in map_samples(lambda x: {"y": x}, {"x": [0, 1]}, concurrency=2)
+
+
+def test_amap_samples():
+    """Test the async executor"""
+    async def fn(x):
+        await asyncio.sleep(0.001 * (3 - x))
+        if x == 2:
+            raise ValueError("bad sample")
+        return {"y": x + 1}
+
+    result = asyncio.run(amap_samples(fn, {"x": [0, 1, 2]}, concurrency=2))
+    assert result == {"x": [0, 1, 2], "y": [1, 2, None], ERROR_KEY: [None, None, "ValueError: bad sample"]}
+
+
+def test_imap_samples_reads_lazily():
+    """Test that samples are read only as threads become free, in both result orders"""
+    for ordered in (True, False):
+        read = []
+
+        def samples():
+            for x in range(50):
+                read.append(x)
+                yield {"x": x}
+
+        def fn(x):
+            time.sleep(0.001 * (x % 3))
+            return {"y": x * 2}
+
+        results = imap_samples(fn, samples(), concurrency=4, ordered=ordered)
+        first = next(results)
+        assert len(read) <= 5
+        results = [first] + list(results)
+        assert sorted(x["y"] for x in results) == [x * 2 for x in range(50)]
+        if ordered:
+            assert [x["x"] for x in results] == list(range(50))
+
+
+def test_dedup_calls():
+    """Test that samples with the same key share one call, including calls in flight and failed calls"""
+    calls = []
+    lock = threading.Lock()
+
+    def fn(x, id):
+        with lock:
+            calls.append(x)
+        time.sleep(0.01)
+        if x == 3:
+            raise ValueError("bad sample")
+        return {"y": x * 2}
+
+    stats = DedupStats()
+    inputs = {"x": [x % 4 for x in range(20)], "id": list(range(20))}
+    result = map_samples(dedup_calls(fn, lambda sample: sample["x"], stats), inputs, concurrency=8)
+    assert sorted(calls) == [0, 1, 2, 3]
+    assert result["id"] == list(range(20))
+    assert result["y"] == [None if x == 3 else x * 2 for x in inputs["x"]]
+    assert result[ERROR_KEY] == ["ValueError: bad sample" if x == 3 else None for x in inputs["x"]]
+    assert (stats.samples, stats.unique, stats.ratio) == (20, 4, 5.)
+
+
+def test_adedup_calls():
+    """Test the async version of dedup_calls"""
+    calls = []
+
+    async def fn(x):
+        calls.append(x)
+        await asyncio.sleep(0.001)
+        return {"y": x + 1}
+
+    stats = DedupStats()
+    result = asyncio.run(amap_samples(adedup_calls(fn, lambda sample: sample["x"], stats), {"x": [1, 2, 1, 1]}, concurrency=4))
+    assert result == {"x": [1, 2, 1, 1], "y": [2, 3, 2, 2]}
+    assert sorted(calls) == [1, 2]
+    assert stats.total == "samples: 4, unique: 2, ratio: 2.00"
+
+
+def test_dedup_calls_max_finished():
+    """Test that only the least recently used finished calls beyond `max_finished` are run again"""
+    calls = []
+    call = dedup_calls(lambda x: calls.append(x) or {"y": x}, lambda sample: sample["x"], max_finished=2)
+    for x in [1, 2, 1, 3, 1, 2]:
+        assert call(x=x) == {"y": x}
+    # 2 was evicted when 3 finished, while 1 was kept by its reuse
+    assert calls == [1, 2, 3, 2]
+
+    calls = []
+
+    async def fn(x):
+        calls.append(x)
+        return {"y": x}
+
+    async def run():
+        call = adedup_calls(fn, lambda sample: sample["x"], max_finished=1)
+        return [await call(x=x) for x in [1, 1, 2, 1]]
+
+    assert asyncio.run(run()) == [{"y": 1}, {"y": 1}, {"y": 2}, {"y": 1}]
+    assert calls == [1, 2, 1]
+
+
+def test_pack_samples():
+    """Test packing by a size budget and a maximum number of items"""
+    samples = [{"n": n} for n in [3, 3, 5, 12, 1, 1, 1]]
+    packs = list(pack_samples(samples, lambda x: x["n"], budget=8))
+    assert [[x["n"] for x in pack] for pack in packs] == [[3, 3], [5], [12], [1, 1, 1]]
+    packs = list(pack_samples(samples, lambda x: x["n"], budget=8, max_items=2))
+    assert [[x["n"] for x in pack] for pack in packs] == [[3, 3], [5], [12], [1, 1], [1]]
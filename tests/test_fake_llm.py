@@ -0,0 +1,67 @@
+import asyncio
+
+from llmpipe.fake_llm import FakeLlm, install_fake_llm, output_tags
+from llmpipe.field import Input, Output
+from llmpipe.llmchat import LlmChat
+from llmpipe.prompt_module import PromptModule
+
+
+def make_module(**kwargs):
+    return PromptModule(
+        task="Answer a question",
+        inputs=[Input("question", "A question")],
+        outputs=[Output("thinking", "Think step by step"), Output("answer", "The answer")],
+        model="fake/model",
+        **kwargs
+    )
+
+
+def test_output_tags():
+    """Test reading output tags from a prompt module prompt"""
+    install_fake_llm(FakeLlm())
+    assert output_tags(make_module().prompt) == ["thinking", "answer"]
+    assert output_tags("No outputs") == []
+
+
+def test_template_responses():
+    """Test that template responses satisfy a prompt module's outputs"""
+    install_fake_llm(FakeLlm())
+    module = make_module()
+    assert module.forward_one(question="Why?") == {"thinking": "Fake thinking", "answer": "Fake answer"}
+    assert module.tokens.input_tokens > 0
+    assert module.tokens.output_tokens > 0
+
+
+def test_scripted_responses():
+    """Test that scripted responses are returned in order and repeated"""
+    fake = install_fake_llm(FakeLlm(responses=["A", "B"]))
+    chat = LlmChat(model="fake/model")
+    assert [chat("Hi") for _ in range(3)] == ["A", "B", "A"]
+    assert fake.calls == 3
+
+
+def test_streaming_chunks():
+    """Test streaming chunk cadence"""
+    install_fake_llm(FakeLlm(responses=["abcdefghij"], chunk_size=4))
+    chat = LlmChat(model="fake/model", stream=True)
+    assert list(chat("Hi")) == ["", "abcd", "efgh", "ij"]
+    assert chat.tokens.output_tokens == 3
+
+    async def run():
+        chat = LlmChat(model="fake/model", stream=True)
+        return [chunk async for chunk in await chat.acall("Hi")]
+
+    assert asyncio.run(run()) == ["", "abcd", "efgh", "ij"]
+
+
+def test_faults_are_retried():
+    """Test that injected rate limit and server errors are retried"""
+    fake = install_fake_llm(FakeLlm(responses=["OK"], rate_limit_rate=0.3, server_error_rate=0.2, retry_after=0, seed=0))
+    chat = LlmChat(model="fake/model", max_retries=20)
+    chat.retry_policy.base_delay = 0.
+    for _ in range(10):
+        assert chat("Hi") == "OK"
+        chat.clear_history()
+    assert fake.faults > 0
+    assert chat.retry_stats.retries == fake.faults
+    assert fake.calls == 10 + fake.faults
@@ -0,0 +1,9 @@
+import subprocess
+import sys
+
+
+def test_import_is_lazy():
+    """Test that heavy dependencies are not imported with llmpipe modules"""
+    code = "import sys, llmpipe.prompt_module, llmpipe.revisor_module, llmpipe.llmprompt_formany; print(','.join(x for x in ('litellm', 'datasets', 'polars') if x in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
@@ -71,3 +71,41 @@ def test_is_in_string_requirement_message():
     # Test custom requirement
     eval3 = IsInString(field="word", target_string="target", requirement="Custom requirement")
     assert eval3.requirement == "Custom requirement"
+
+
+def test_is_in_string_indexed_target():
+    """Test long target strings, which are searched with a cached index"""
+    from llmpipe.evaluations.is_in_string import INDEX_MIN_CHARS
+    from llmpipe.evaluations.string_index import get_string_index
+
+    lines = [f"Line {idx}: the quick brown fox jumps over dog number {idx}" for idx in range(INDEX_MIN_CHARS // 20)]
+    document = "\n".join(lines)
+    evaluation = IsInString(field="word", target_string_field="text")
+    for candidate in ["LINE 17: THE QUICK", lines[-1], "\n".join(lines[40:43]), "  dog number 9\nLine  ", "fox", ""]:
+        assert evaluation(word=candidate, text=document).evaluation_result == "PASS"
+        assert evaluation.find(word=candidate, text=document) == document.lower().find(candidate.lower().strip())
+    for candidate in ["Line 17: the quick red fox", "Line 999999", "cat"]:
+        assert evaluation(word=candidate, text=document).evaluation_result == "FAIL"
+        assert evaluation.find(word=candidate, text=document) == -1
+    assert get_string_index(document) is get_string_index(document)
+
+
+def test_string_index():
+    """Test that an index finds every occurrence of short and long candidates, and maps offsets of lowercased text"""
+    from llmpipe.evaluations.string_index import StringIndex, apply_edits
+
+    text = "abcabcabcabcabcabc XYZ abcabcabcabc"
+    index = StringIndex(text, gram=4, step=3)
+    for candidate in ["abc", "abcabcab", "cabcabcabc", "c XYZ abcabc", "xyz", "abd", "abcabcabcabcabcabcabc"]:
+        start, expected = text.lower().find(candidate.lower()), []
+        while start != -1:
+            expected.append(start)
+            start = text.lower().find(candidate.lower(), start + 1)
+        assert index.find_all(candidate) == expected
+
+    assert StringIndex(text, ignore_case=False).find("xyz") == -1
+    # "İ" is two characters when lowercased
+    text = "İstanbul and İzmir are large cities"
+    assert StringIndex(text).find("İZMIR ARE LARGE CITIES") == text.index("İzmir")
+
+    assert apply_edits("one two three", [(8, 13, "3"), (0, 3, "1"), (1, 5, "x")]) == "1 two 3"
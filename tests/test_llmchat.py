@@ -173,3 +173,184 @@ def test_llmchat_with_tools():
         tool_message = next(msg for msg in chat.history if msg.get('role') == 'tool')
         assert tool_message['name'] == 'add'
         assert tool_message['content'] == 8
+
+
+def test_llmchat_acall():
+    """Test async LLM chat interaction"""
+    import asyncio
+    from unittest.mock import AsyncMock
+
+    chat = LlmChat(system_prompt="You are a helpful assistant.")
+
+    mock_response = type('MockResponse', (), {
+        'choices': [
+            type('Choice', (), {
+                'message': type('Message', (), {
+                    'content': 'Ahoy!',
+                    'tool_calls': None,
+                    'model_dump': lambda: {'role': 'assistant', 'content': 'Ahoy!'}
+                })
+            })
+        ],
+        'usage': type('Usage', (), {'prompt_tokens': 12, 'completion_tokens': 3})
+    })
+
+    with patch('llmpipe.llmchat.acompletion', new=AsyncMock(return_value=mock_response)):
+        response = asyncio.run(chat.acall("Hi there!"))
+
+    assert response == "Ahoy!"
+    assert chat.tokens.total == "in: 12, out: 3"
+    assert [x['role'] for x in chat.history] == ['system', 'user', 'assistant']
+
+
+def test_llmchat_fork():
+    """Test that forks have separate histories but shared token counts"""
+    chat = LlmChat(system_prompt="You are a helpful assistant.")
+    chat.history.append({"role": "user", "content": "Hi"})
+    fork = chat.fork()
+
+    assert fork.history == [{"role": "system", "content": "You are a helpful assistant."}]
+    assert len(chat.history) == 2
+    fork.tokens.add(5, 2)
+    assert chat.tokens.total == "in: 5, out: 2"
+
+
+class ToolFunction:
+    def __init__(self, name, arguments):
+        self.name = name
+        self.arguments = arguments
+
+    def __iter__(self):
+        return iter([('name', self.name), ('arguments', self.arguments)])
+
+
+class ToolCall:
+    def __init__(self, id, name, arguments):
+        self.id = id
+        self.function = ToolFunction(name, arguments)
+
+
+def slow_lookup(key: str) -> str:
+    """Look up a value"""
+    import time
+    time.sleep(0.2)
+    return f"value for {key}"
+
+
+async def async_lookup(key: str) -> str:
+    """Look up a value asynchronously"""
+    import asyncio
+    await asyncio.sleep(0.2)
+    return f"async value for {key}"
+
+
+def test_get_tool_responses_concurrent():
+    """Test that tool calls from one turn run concurrently and are added to history in order"""
+    import time
+    import asyncio
+
+    chat = LlmChat(tools=[slow_lookup, async_lookup])
+    tool_calls = [
+        ToolCall("call1", "slow_lookup", '{"key": "a"}'),
+        ToolCall("call2", "async_lookup", '{"key": "b"}'),
+        ToolCall("call3", "slow_lookup", '{"key": "c"}'),
+    ]
+
+    start = time.time()
+    response_text = chat.get_tool_responses(tool_calls)
+    assert time.time() - start < 0.5
+    assert [x["tool_call_id"] for x in chat.history] == ["call1", "call2", "call3"]
+    assert [x["content"] for x in chat.history] == ["value for a", "async value for b", "value for c"]
+    assert response_text.index("value for a") < response_text.index("async value for b")
+
+    chat.clear_history()
+    start = time.time()
+    asyncio.run(chat.aget_tool_responses(tool_calls))
+    assert time.time() - start < 0.5
+    assert [x["content"] for x in chat.history] == ["value for a", "async value for b", "value for c"]
+
+
+def make_stream_chunk(content=None, tool_calls=None, finish_reason=None):
+    from litellm import ModelResponse
+    from litellm.types.utils import StreamingChoices, Delta
+    return ModelResponse(
+        stream=True,
+        choices=[StreamingChoices(delta=Delta(content=content, tool_calls=tool_calls), finish_reason=finish_reason)]
+    )
+
+
+def make_tool_call_delta(index, id=None, name=None, arguments=""):
+    from litellm.types.utils import ChatCompletionDeltaToolCall, Function
+    return ChatCompletionDeltaToolCall(
+        index=index, id=id, type="function" if id else None, function=Function(name=name, arguments=arguments)
+    )
+
+
+def test_llmchat_stream_with_tools():
+    """Test that tools run while streaming, as soon as their arguments are complete"""
+    import time
+    import asyncio
+
+    events = []
+
+    def add(a: int, b: int) -> int:
+        """Add two numbers"""
+        events.append("tool")
+        return a + b
+
+    def first_turn():
+        yield make_stream_chunk("Let me add.")
+        yield make_stream_chunk(tool_calls=[make_tool_call_delta(0, "call1", "add")])
+        yield make_stream_chunk(tool_calls=[make_tool_call_delta(0, arguments='{"a": 2,')])
+        yield make_stream_chunk(tool_calls=[make_tool_call_delta(0, arguments=' "b": 3}')])
+        time.sleep(0.1)
+        events.append("stream end")
+        yield make_stream_chunk(finish_reason="tool_calls")
+
+    def second_turn():
+        yield make_stream_chunk("The answer is 5.")
+        yield make_stream_chunk(finish_reason="stop")
+
+    chat = LlmChat(tools=[add], stream=True)
+    with patch('llmpipe.llmchat.completion', side_effect=[first_turn(), second_turn()]):
+        response = "".join(chat("What is 2 + 3?"))
+
+    assert events == ["tool", "stream end"]
+    assert response.startswith("Let me add.")
+    assert "Tool response:\n\n5" in response
+    assert response.endswith("The answer is 5.")
+    assert [x["role"] for x in chat.history] == ["user", "assistant", "tool", "assistant"]
+
+    async def afirst_turn():
+        for chunk in first_turn():
+            yield chunk
+
+    async def asecond_turn():
+        for chunk in second_turn():
+            yield chunk
+
+    async def run():
+        return "".join([chunk async for chunk in await chat.acall("What is 2 + 3?")])
+
+    chat.clear_history()
+    with patch('llmpipe.llmchat.acompletion', side_effect=[afirst_turn(), asecond_turn()]):
+        response = asyncio.run(run())
+    assert "Tool response:\n\n5" in response
+    assert response.endswith("The answer is 5.")
+
+
+def test_tokens_cached_input():
+    """Test counting input tokens read from the provider prompt cache"""
+    from litellm.types.utils import Usage
+    from llmpipe.llmchat import cached_input_tokens
+
+    tokens = Tokens()
+    tokens.add(100, 10, cached_input_tokens=80)
+    tokens.add(100, 10, cached_input_tokens=80)
+    assert tokens.last == "in: 100, out: 10, cached: 80"
+    assert tokens.total == "in: 200, out: 20, cached: 160"
+    assert (tokens + tokens).cached_input_tokens == 320
+
+    usage = Usage(prompt_tokens=100, completion_tokens=10, total_tokens=110, cache_read_input_tokens=80)
+    assert cached_input_tokens(usage) == 80
+    assert cached_input_tokens(Usage(prompt_tokens=100, completion_tokens=10, total_tokens=110)) == 0
@@ -0,0 +1,30 @@
+from llmpipe.field import Input, Output
+from llmpipe.llmprompt import LlmPrompt
+
+
+def test_llmprompt_fused_llm_evaluations():
+    """Test that a field's llm evaluations run in one judge call, mapped back to one result per requirement"""
+    from llmpipe.fake_llm import FakeLlm, install_fake_llm, template_responder
+
+    fake = install_fake_llm(FakeLlm(responder=template_responder({
+        "evaluation_result_2": "FAIL", "reason_2": "Too long"
+    })))
+    output_field = Output(name="answer", description="The answer", inputs=[Input("question", "A question")], evaluations=[
+        {"type": "max_chars", "value": 100},
+        {"type": "llm", "value": "Is polite"},
+        {"type": "llm", "value": "Is short"},
+        {"type": "llm", "value": "Is correct"},
+    ])
+    prompt = LlmPrompt(model="fake/model", outputs=[output_field])
+
+    results = prompt.evaluate(question="Why?", answer="Because.")
+    assert fake.calls == 1
+    assert results["answer_eval"] == [
+        {"field": "answer", "requirement": "Is short", "evaluation_result": "FAIL", "reason": "Too long"}
+    ]
+    assert prompt.evaluate(question="Why?", answer="Because.", break_after_first_fail=True) == results
+    assert prompt.tokens.input_tokens > 0
+
+    prompt.fuse_llm_evaluations = False
+    assert prompt.evaluate(question="Why?", answer="Because.") == {"answer_eval": []}
+    assert fake.calls == 2 + 3
@@ -0,0 +1,93 @@
+import json
+import threading
+
+from llmpipe.metrics import MetricsExporter, RunMetrics
+
+
+def test_run_metrics_snapshot():
+    """Test sample, call and revision counts and latency percentiles"""
+    metrics = RunMetrics()
+    assert metrics.snapshot().samples_per_second == 0
+
+    metrics.sample_started(3)
+    for i in range(100):
+        metrics.record_call(latency=(i + 1) / 100, input_tokens=10, output_tokens=5)
+    metrics.record_call(latency=0., input_tokens=10, output_tokens=5, cache_hit=True)
+    metrics.record_retries(2)
+    metrics.record_call_error()
+    metrics.sample_finished(2, errors=1)
+    metrics.record_revisions(1)
+    metrics.record_revisions(3)
+
+    snapshot = metrics.snapshot()
+    assert (snapshot.samples, snapshot.errors, snapshot.in_flight) == (2, 1, 1)
+    assert (snapshot.calls, snapshot.cache_hits, snapshot.call_errors, snapshot.retries) == (101, 1, 1, 2)
+    assert (snapshot.input_tokens, snapshot.output_tokens) == (1010, 505)
+    # Cache hits are not included in latencies
+    assert (snapshot.latency_p50, snapshot.latency_p95, snapshot.latency_p99) == (0.5, 0.95, 0.99)
+    assert snapshot.samples_per_second > 0 and snapshot.tokens_per_second > 0
+    assert (snapshot.revised_samples, snapshot.max_revisions, snapshot.mean_revisions) == (2, 3, 2.)
+    assert "samples: 2" in snapshot.total and "revisions per sample: 2.00 (max 3)" in snapshot.total
+
+    metrics.reset()
+    assert metrics.snapshot().calls == 0
+
+
+def test_run_metrics_threads():
+    """Test that counts are not lost when updated from several threads"""
+    metrics = RunMetrics(window=10)
+
+    def run():
+        for _ in range(1000):
+            metrics.sample_started()
+            metrics.record_call(latency=0.1, input_tokens=1)
+            metrics.sample_finished()
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    snapshot = metrics.snapshot()
+    assert (snapshot.samples, snapshot.in_flight, snapshot.calls, snapshot.input_tokens) == (8000, 0, 8000, 8000)
+
+
+def test_metrics_exporter(tmp_path):
+    """Test that snapshots are written as json or Prometheus text"""
+    metrics = RunMetrics()
+    metrics.sample_started()
+    metrics.record_call(latency=0.2, input_tokens=7, output_tokens=3)
+    metrics.sample_finished()
+
+    with MetricsExporter(metrics, str(tmp_path / "metrics.json"), interval=0.01):
+        pass
+    assert json.loads((tmp_path / "metrics.json").read_text())["samples"] == 1
+
+    MetricsExporter(metrics, str(tmp_path / "metrics.prom")).write()
+    text = (tmp_path / "metrics.prom").read_text()
+    assert "# TYPE llmpipe_samples_total counter\nllmpipe_samples_total 1\n" in text
+    assert 'llmpipe_tokens_total{type="input"} 7\n' in text
+    assert 'llmpipe_call_latency_seconds{quantile="0.99"} 0.2\n' in text
+    # Temporary files are replaced atomically
+    assert sorted(x.name for x in tmp_path.iterdir()) == ["metrics.json", "metrics.prom"]
+    assert (tmp_path / "metrics.prom").stat().st_mode & 0o777 == 0o644
+
+
+def test_llmchat_request_metrics():
+    """Test that requests in flight are tracked and that call latency excludes retry backoff"""
+    from llmpipe.fake_llm import FakeLlm, install_fake_llm
+    from llmpipe.llmchat import LlmChat
+
+    fake = install_fake_llm(FakeLlm(responses=["Hello"], rate_limit_rate=0.5, retry_after=0.2, seed=3), models=["fake/backoff"])
+    chat = LlmChat(model="fake/backoff", max_retries=20)
+    for _ in range(3):
+        assert chat("Hi") == "Hello"
+        chat.clear_history()
+    snapshot = chat.metrics.snapshot()
+    assert fake.faults > 0 and snapshot.retries == fake.faults
+    assert snapshot.latency_p99 < 0.2
+
+    install_fake_llm(FakeLlm(responses=["Hello"]), models=["fake/backoff"])
+    chat.stream = True
+    assert "".join(chat("Hi")) == "Hello"
+    assert chat.metrics.snapshot().requests_in_flight == 0
@@ -1,6 +1,8 @@
 import pytest
 from llmpipe.prompt_module import PromptModule
 from llmpipe.field import Input, Output
+from llmpipe.template import Template
+from llmpipe.xml_utils import parse_text_for_one_tag
 
 
 def test_promptmodule_init():
@@ -71,3 +73,333 @@ def test_promptmodule_call():
     
     result = prompt()
     assert result == {"result": "42"}
+
+
+def test_promptmodule_dataset_mode():
+    """Test PromptModule dataset mode on multiple threads"""
+    class MockPromptModule(PromptModule):
+        def _call(self, prompt="", prefill="", tool_call_depth=0):
+            x = parse_text_for_one_tag(prompt, "x").strip()
+            return f"<result>{int(x) * 2}</result>"
+
+    output_field = Output(name="result", description="The result", inputs=[Input("x", "A value")])
+    prompt = MockPromptModule(outputs=[output_field])
+
+    xs = [str(x) for x in range(20)]
+    result = prompt(x=xs, concurrency=8)
+    assert result == {"x": xs, "result": [str(int(x) * 2) for x in xs]}
+    assert prompt(x=xs, num_proc=2) == result
+
+
+def test_promptmodule_dataset_dedup():
+    """Test that samples with identical inputs are run once when sampling is deterministic"""
+    from llmpipe.fake_llm import FakeLlm, install_fake_llm
+
+    fake = install_fake_llm(FakeLlm())
+    output_field = Output(name="answer", description="The answer", inputs=[Input("question", "A question")])
+    prompt = PromptModule(model="fake/model", outputs=[output_field])
+
+    questions = ["a", "b", "a", "a", "b", "c"]
+    result = prompt(question=questions, id=list(range(6)), concurrency=4)
+    assert result["id"] == list(range(6))
+    assert result["answer"] == ["Fake answer"] * 6
+    assert fake.calls == 3
+    assert prompt.dedup_stats.total == "samples: 6, unique: 3, ratio: 2.00"
+
+    # Repeated samples are intentional when sampling
+    prompt = PromptModule(model="fake/model", outputs=[output_field], temperature=1.)
+    prompt(question=questions, concurrency=4)
+    assert fake.calls == 9
+    assert prompt.dedup_stats.samples == 0
+
+
+def test_promptmodule_dataset_metrics():
+    """Test that dataset runs record samples, calls, retries and errors to the module's metrics"""
+    from llmpipe.fake_llm import FakeLlm, install_fake_llm
+
+    fake = install_fake_llm(FakeLlm(rate_limit_rate=0.3, retry_after=0, seed=0))
+    output_field = Output(name="answer", description="The answer", inputs=[Input("question", "A question")])
+    prompt = PromptModule(model="fake/model", outputs=[output_field], max_retries=20)
+    prompt.retry_policy.base_delay = 0.
+
+    def fail(**sample):
+        raise ValueError("bad sample")
+
+    prompt(question=[str(x) for x in range(10)], concurrency=4)
+    prompt.forward_one = fail
+    prompt(question=["a", "b"], concurrency=2)
+
+    snapshot = prompt.metrics.snapshot()
+    assert (snapshot.samples, snapshot.errors, snapshot.in_flight) == (12, 2, 0)
+    assert snapshot.calls == 10
+    assert snapshot.retries == fake.faults > 0
+    assert snapshot.input_tokens > 0 and snapshot.latency_p99 >= snapshot.latency_p50 > 0
+
+
+def test_promptmodule_acall():
+    """Test async PromptModule calls in single sample and dataset mode"""
+    import asyncio
+
+    class MockPromptModule(PromptModule):
+        async def _acall(self, prompt="", prefill="", tool_call_depth=0):
+            await asyncio.sleep(0)
+            x = parse_text_for_one_tag(prompt, "x").strip()
+            return f"<result>{int(x) * 2}</result>"
+
+    output_field = Output(name="result", description="The result", inputs=[Input("x", "A value")])
+    prompt = MockPromptModule(outputs=[output_field])
+
+    assert asyncio.run(prompt.aforward_one(x="7")) == {"result": "14"}
+    result = asyncio.run(prompt.acall(x=["1", "2", "3"], concurrency=2))
+    assert result == {"x": ["1", "2", "3"], "result": ["2", "4", "6"]}
+
+
+def test_promptmodule_prompt_caching():
+    """Test that the static instructions are marked for provider prompt caching"""
+    input_field = Input(name="color", description="A color name")
+    output_field = Output(name="mood", description="The mood this color evokes")
+    prompt = PromptModule(
+        model="claude-3-5-haiku-20241022",
+        inputs=[input_field],
+        outputs=[output_field],
+        task="Determine the mood associated with a color",
+        prompt_caching=True
+    )
+
+    content = prompt.render(color="blue")
+    assert len(content) == 2
+    assert content[0]["cache_control"] == {"type": "ephemeral"}
+    assert "Determine the mood" in content[0]["text"]
+    assert "blue" not in content[0]["text"]
+    assert content[1]["text"].startswith("## Inputs")
+    assert "blue" in content[1]["text"]
+    assert content[0]["text"] + content[1]["text"] == Template(prompt.prompt).format(color="blue")
+
+    prompt.prompt_caching = False
+    assert prompt.render(color="blue") == Template(prompt.prompt).format(color="blue")
+
+
+@pytest.mark.parametrize("supports_stop", [True, False])
+def test_promptmodule_early_stop(supports_stop):
+    """Test that the stream is cancelled once every output is closed, with or without stop sequences"""
+    from llmpipe.fake_llm import FakeLlm, install_fake_llm
+
+    fake = install_fake_llm(FakeLlm(
+        responses=["<thinking>\nhmm\n</thinking>\n<answer>\n42\n</answer>" + " trailing" * 100],
+        chunk_size=4
+    ))
+    closed = []
+    prompt = PromptModule(
+        model="fake/model",
+        outputs=[Output("thinking", "Think"), Output("answer", "The answer")],
+        early_stop=True,
+        on_output=lambda name, text: closed.append((name, text.strip()))
+    )
+    prompt.supports_stop = supports_stop
+
+    assert prompt.forward_one() == {"thinking": "hmm", "answer": "42"}
+    assert closed == [("thinking", "hmm"), ("answer", "42")]
+    assert fake.chunks < 50
+
+
+def test_promptmodule_early_stop_not_cached(tmp_path):
+    """Test that a response cut short by early stopping is not served from the cache to a full call"""
+    from llmpipe.fake_llm import FakeLlm, install_fake_llm
+
+    text = "<answer>\n42\n</answer>" + " trailing" * 20
+    fake = install_fake_llm(FakeLlm(responses=[text], chunk_size=4))
+    prompt = PromptModule(model="fake/model", outputs=[Output("answer", "The answer")], early_stop=True, cache_path=str(tmp_path / "cache.db"))
+    prompt.supports_stop = False
+
+    assert prompt.forward_one() == {"answer": "42"}
+    prompt.clear_history()
+    assert prompt._call(prompt=prompt.render()) == text
+    assert fake.calls == 2
+
+
+def test_run_yaml_prompt_resume(tmp_path):
+    """Test that results are appended as they complete and that a resumed run only runs the remaining rows"""
+    import json
+    import yaml
+    from llmpipe.fake_llm import FakeLlm, install_fake_llm
+    from llmpipe.prompt_module import run_yaml_prompt
+
+    fake = install_fake_llm(FakeLlm())
+    prompt_path = str(tmp_path / "prompt.yaml")
+    input_path = str(tmp_path / "input.jsonl")
+    output_path = str(tmp_path / "output.jsonl")
+    with open(prompt_path, "w") as f:
+        yaml.safe_dump({"task": "Answer a question", "outputs": [{"name": "answer", "description": "The answer", "inputs": [{"name": "question", "description": "A question"}]}]}, f)
+    with open(input_path, "w") as f:
+        f.write("".join(json.dumps({"question": f"Q{i}"}) + "\n" for i in range(10)))
+
+    def read_output():
+        with open(output_path) as f:
+            return [json.loads(line) for line in f]
+
+    run_yaml_prompt(prompt_path=prompt_path, input_data_path=input_path, output_data_path=output_path, model="fake/model", concurrency=4)
+    rows = read_output()
+    assert sorted(x["row_key"] for x in rows) == list(range(10))
+    assert all(x["answer"] == "Fake answer" for x in rows)
+    assert fake.calls == 10
+
+    # Simulate a crash: a failed row and a truncated last line
+    with open(output_path, "w") as f:
+        f.write("".join(json.dumps(x) + "\n" for x in rows[:5]))
+        f.write(json.dumps(rows[5] | {"error": "failed"}) + "\n" + json.dumps(rows[6])[:10])
+    run_yaml_prompt(prompt_path=prompt_path, input_data_path=input_path, output_data_path=output_path, model="fake/model", concurrency=4, resume=True)
+    assert sorted(x["row_key"] for x in read_output()) == list(range(10))
+    assert fake.calls == 15
+
+
+def test_run_yaml_prompt_resume_failed_calls(tmp_path):
+    """Test that rows whose LLM call failed are saved with an error and run again on resume"""
+    import json
+    import yaml
+    from llmpipe.fake_llm import FakeLlm, install_fake_llm
+    from llmpipe.prompt_module import run_yaml_prompt
+    from llmpipe.retry import get_circuit_breaker
+
+    prompt_path = str(tmp_path / "prompt.yaml")
+    input_path = str(tmp_path / "input.jsonl")
+    output_path = str(tmp_path / "output.jsonl")
+    with open(prompt_path, "w") as f:
+        yaml.safe_dump({"task": "Answer a question", "outputs": [{"name": "answer", "description": "The answer", "inputs": [{"name": "question", "description": "A question"}]}]}, f)
+    with open(input_path, "w") as f:
+        f.write("".join(json.dumps({"question": f"Q{i}"}) + "\n" for i in range(3)))
+
+    def read_output():
+        with open(output_path) as f:
+            return [json.loads(line) for line in f]
+
+    get_circuit_breaker("fake/limited").failure_threshold = 1000
+    install_fake_llm(FakeLlm(rate_limit_rate=1.0, retry_after=0), models=["fake/limited"])
+    run_yaml_prompt(prompt_path=prompt_path, input_data_path=input_path, output_data_path=output_path, model="fake/limited")
+    assert all(x.get("error") for x in read_output())
+
+    fake = install_fake_llm(FakeLlm(), models=["fake/limited"])
+    run_yaml_prompt(prompt_path=prompt_path, input_data_path=input_path, output_data_path=output_path, model="fake/limited", resume=True)
+    assert fake.calls == 3
+    assert [x["answer"] for x in read_output() if not x.get("error")] == ["Fake answer"] * 3
+
+
+def test_promptmodule_prompt_memoized():
+    """Test that the prompt is rebuilt only when the fields or text it is built from change"""
+    prompt = PromptModule(
+        inputs=[Input("color", "A color name")],
+        outputs=[Output("mood", "The mood this color evokes")],
+        task="Determine the mood associated with a color"
+    )
+    text = prompt.prompt
+    assert prompt.prompt is text
+    assert prompt.render(color="red") == Template(text).format(color="red")
+
+    prompt.task = "Determine the mood"
+    assert prompt.prompt != text and "Determine the mood\n" in prompt.prompt
+
+    prompt.outputs.append(Output("reason", "Why"))
+    assert "<reason>" in prompt.prompt
+
+    prompt.outputs[0].description = "The mood"
+    assert "The mood\n</mood>" in prompt.prompt
+
+    prompt.inputs = [Input("shade", "A shade")]
+    assert "{{shade}}" in prompt.prompt and "{{color}}" not in prompt.prompt
+    assert "red" in prompt.render(shade="red")
+
+
+def test_promptmodule_packed():
+    """Test that packed samples are parsed back per sample, and that samples missing from a response are run again"""
+    import asyncio
+    from llmpipe.fake_llm import FakeLlm, install_fake_llm, template_responder
+
+    respond = template_responder()
+
+    def responder(messages):
+        # Drop the last item of packed responses
+        response = respond(messages)
+        idx = response.rfind('<item id="')
+        return response[:idx] if idx > 0 else response
+
+    fake = install_fake_llm(FakeLlm(responder=responder))
+    output_field = Output(name="answer", description="The answer", inputs=[Input("question", "A question")])
+    prompt = PromptModule(model="fake/model", outputs=[output_field], pack_tokens=10, dedup=False)
+
+    questions = [f"Question {i:02d}" for i in range(10)]
+    content = prompt.render_packed([{"question": x} for x in questions[:3]])
+    assert '<item id="2">\n<question>\nQuestion 02\n</question>\n</item>' in content
+    assert "3 separate items" in content
+
+    result = prompt(question=questions, concurrency=2)
+    assert result == {"question": questions, "answer": ["Fake answer"] * 10}
+    # Packs of 3, 3, 3 and 1 samples, the last sample of each 3-pack run again
+    assert fake.calls == 4 + 3
+
+    result = asyncio.run(prompt.acall(question=questions, concurrency=2))
+    assert result == {"question": questions, "answer": ["Fake answer"] * 10}
+    assert fake.calls == 2 * 7
+
+
+def test_revisor_fused_llm_evaluations():
+    """Test that a field's llm evaluations run in one judge call, mapped back to one result per requirement"""
+    import asyncio
+    from llmpipe.fake_llm import FakeLlm, install_fake_llm, template_responder
+    from llmpipe.revisor_module import RevisorModule
+
+    fake = install_fake_llm(FakeLlm(responder=template_responder({
+        "evaluation_result_2": "FAIL", "reason_2": "Too long", "evaluation_result_3": "Unsure"
+    })))
+    output_field = Output(name="answer", description="The answer", inputs=[Input("question", "A question")], evaluations=[
+        {"type": "max_chars", "value": 100},
+        {"type": "llm", "value": "Is polite"},
+        {"type": "llm", "value": "Is short"},
+        {"type": "llm", "value": "Is correct"},
+    ])
+    module = RevisorModule(model="fake/model", outputs=[output_field])
+
+    # The unparsed third result is checked by its own judge
+    results = module.evaluate(question="Why?", answer="Because.")
+    assert fake.calls == 2
+    assert results["answer_eval"] == [
+        {"field": "answer", "requirement": "Is short", "evaluation_result": "FAIL", "reason": "Too long"}
+    ]
+    assert asyncio.run(module.aevaluate(question="Why?", answer="Because.", break_after_first_fail=True)) == results
+    assert fake.calls == 4
+    assert module.tokens.input_tokens > 0
+
+    module.fuse_llm_evaluations = False
+    assert module.evaluate(question="Why?", answer="Because.") == {"answer_eval": []}
+    assert fake.calls == 7
+
+
+def test_promptmodule_call_failure_raises():
+    """Test that an LLM call that fails after retries raises rather than returning empty outputs"""
+    from llmpipe.fake_llm import FakeLlm, install_fake_llm
+    from llmpipe.retry import get_circuit_breaker
+
+    install_fake_llm(FakeLlm(server_error_rate=1.0), models=["fake/failing"])
+    prompt = PromptModule(model="fake/failing", outputs=[Output("answer", "The answer")], max_retries=0)
+    try:
+        with pytest.raises(Exception):
+            prompt.forward_one()
+    finally:
+        get_circuit_breaker("fake/failing").record_success()
+
+
+def test_promptmodule_dataset_call_failures():
+    """Test that samples whose LLM call fails get an error in dataset mode and are counted as errors"""
+    import asyncio
+    from llmpipe.executor import ERROR_KEY
+    from llmpipe.fake_llm import FakeLlm, install_fake_llm
+    from llmpipe.retry import get_circuit_breaker
+
+    install_fake_llm(FakeLlm(server_error_rate=1.0), models=["fake/down"])
+    prompt = PromptModule(model="fake/down", outputs=[Output("answer", "The answer", inputs=[Input("q", "A question")])], max_retries=0)
+    try:
+        results = prompt(q=["a", "b", "c"], concurrency=2)
+        assert all(results[ERROR_KEY])
+        results = asyncio.run(prompt.acall(q=["d", "e"]))
+        assert all(results[ERROR_KEY])
+        assert prompt.metrics.snapshot().errors == 5
+    finally:
+        get_circuit_breaker("fake/down").record_success()
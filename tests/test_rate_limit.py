@@ -0,0 +1,59 @@
+import time
+
+from llmpipe.rate_limit import RateLimiter, get_rate_limiter, set_rate_limit
+
+
+def test_rate_limiter_tokens(tmp_path):
+    """Test that requests are held back until enough tokens are available"""
+    limiter = RateLimiter("model", tpm=600, state_dir=str(tmp_path))
+    assert limiter.acquire(tokens=600) == 0
+    start = time.time()
+    waited = limiter.acquire(tokens=3)
+    assert waited > 0
+    assert time.time() - start >= 0.25
+
+
+def test_rate_limiter_shared_state(tmp_path):
+    """Test that limiters with the same name share one bucket, e.g., across processes"""
+    limiter1 = RateLimiter("model", rpm=2, state_dir=str(tmp_path))
+    limiter2 = RateLimiter("model", rpm=2, state_dir=str(tmp_path))
+    limiter1.acquire()
+    limiter2.acquire()
+    assert limiter1._update(1, 0) > 0
+    assert RateLimiter("other", rpm=2, state_dir=str(tmp_path))._update(1, 0) == 0
+    # A limiter with other limits does not start from this bucket
+    assert RateLimiter("model", rpm=3, state_dir=str(tmp_path))._update(1, 0) == 0
+
+
+def test_rate_limiter_async_off_event_loop(tmp_path):
+    """Test that async acquires take the file lock off the event loop"""
+    import asyncio
+    import threading
+
+    limiter = RateLimiter("model", rpm=600, state_dir=str(tmp_path))
+    threads = set()
+    update = limiter._update
+    limiter._update = lambda *args: threads.add(threading.get_ident()) or update(*args)
+
+    async def run():
+        await asyncio.gather(*[limiter.aacquire() for _ in range(5)])
+        return threading.get_ident()
+
+    assert asyncio.run(run()) not in threads
+
+
+def test_rate_limiter_adjust(tmp_path):
+    """Test that token usage in excess of the estimate is debited"""
+    limiter = RateLimiter("model", tpm=600, state_dir=str(tmp_path))
+    limiter.acquire(tokens=100)
+    limiter.adjust(tokens=500)
+    assert limiter._update(1, 100) > 0
+
+
+def test_set_rate_limit():
+    """Test the process-wide registry of rate limiters"""
+    assert get_rate_limiter("unlimited-model") is None
+    limiter = set_rate_limit("limited-model", rpm=100)
+    assert get_rate_limiter("limited-model") is limiter
+    assert set_rate_limit("limited-model", rpm=100) is limiter
+    assert set_rate_limit("limited-model", rpm=200).rpm == 200
@@ -0,0 +1,31 @@
+from llmpipe.llmchat import LlmChat
+from llmpipe.registry import get_model_info, get_tool_schema, register_model_info
+
+
+def lookup(key: str) -> str:
+    """Look up a value"""
+    return key
+
+
+def test_get_model_info_memoized():
+    """Test that model info is looked up once per model"""
+    info = get_model_info("claude-3-5-haiku-20241022")
+    assert info["supports_function_calling"]
+    assert get_model_info("claude-3-5-haiku-20241022") is info
+
+
+def test_get_tool_schema_memoized():
+    """Test that tool schemas are parsed once per function"""
+    schema = get_tool_schema(lookup)
+    assert schema["type"] == "function"
+    assert schema["function"]["name"] == "lookup"
+    assert get_tool_schema(lookup) is schema
+
+
+def test_register_model_info():
+    """Test registering a model that is unknown to litellm"""
+    register_model_info("local/my-model", supports_function_calling=True)
+    chat = LlmChat(model="local/my-model", tools=[lookup])
+    assert chat.supports_function_calling
+    assert not chat.supports_assistant_prefill
+    assert chat.tool_schemas == [get_tool_schema(lookup)]
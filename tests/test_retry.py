@@ -0,0 +1,174 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+
+from llmpipe.llmchat import LlmChat
+from llmpipe.retry import (
+    CircuitBreaker, CircuitOpenError, RetryPolicy, RetryStats,
+    acall_with_retries, call_with_retries, is_retryable, retry_after
+)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"Error {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}})
+
+
+def flaky(n_failures, error):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) <= n_failures:
+            raise error
+        return "ok"
+    return fn, calls
+
+
+def test_is_retryable():
+    """Test classification of retryable and fatal errors"""
+    assert is_retryable(StatusError(429))
+    assert is_retryable(StatusError(529))
+    assert is_retryable(TimeoutError())
+    assert not is_retryable(StatusError(400))
+    assert not is_retryable(ValueError("bad"))
+
+
+def test_retry_after():
+    """Test parsing Retry-After headers"""
+    assert retry_after(StatusError(429, {"retry-after": "3"})) == 3
+    assert retry_after(StatusError(429, {"retry-after-ms": "1500"})) == 1.5
+    assert retry_after(StatusError(429)) is None
+    assert RetryPolicy(max_delay=2).delay(0, StatusError(429, {"retry-after": "3"})) == 2
+
+
+def test_retry_policy_backoff():
+    """Test exponential backoff with jitter"""
+    policy = RetryPolicy(base_delay=1, max_delay=5, jitter=0.5)
+    for attempt, expected in enumerate([1, 2, 4, 5]):
+        assert expected / 2 <= policy.delay(attempt) <= expected
+
+
+def test_call_with_retries():
+    """Test that retryable errors are retried and counted"""
+    policy = RetryPolicy(max_retries=3, base_delay=0.001)
+    stats = RetryStats()
+    fn, calls = flaky(2, StatusError(503))
+    assert call_with_retries(fn, policy, CircuitBreaker("m"), stats) == "ok"
+    assert len(calls) == 3
+    assert stats.retries == 2
+    assert stats.wait_seconds > 0
+
+
+def test_call_with_retries_fatal():
+    """Test that fatal errors and exhausted retries are raised"""
+    policy = RetryPolicy(max_retries=3, base_delay=0.001)
+    fn, calls = flaky(1, StatusError(400))
+    with pytest.raises(StatusError):
+        call_with_retries(fn, policy, CircuitBreaker("m"), RetryStats())
+    assert len(calls) == 1
+
+    fn, calls = flaky(10, StatusError(500))
+    with pytest.raises(StatusError):
+        call_with_retries(fn, policy, CircuitBreaker("m"), RetryStats())
+    assert len(calls) == 4
+
+
+def test_acall_with_retries():
+    """Test async retries"""
+    policy = RetryPolicy(max_retries=3, base_delay=0.001)
+    stats = RetryStats()
+    fn, calls = flaky(1, StatusError(429))
+
+    async def afn():
+        return fn()
+
+    assert asyncio.run(acall_with_retries(afn, policy, CircuitBreaker("m"), stats)) == "ok"
+    assert stats.retries == 1
+
+
+def test_circuit_breaker():
+    """Test that the breaker opens after consecutive failures and closes after a success"""
+    breaker = CircuitBreaker("m", failure_threshold=2, cooldown=0.05)
+    stats = RetryStats()
+    fn, calls = flaky(10, StatusError(500))
+    with pytest.raises(CircuitOpenError):
+        call_with_retries(fn, RetryPolicy(max_retries=2, base_delay=0.001, max_delay=0.001), breaker, stats)
+    assert len(calls) == 2
+    assert stats.breaker_trips == 1
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    fn, calls = flaky(0, None)
+    assert call_with_retries(fn, RetryPolicy(max_retries=1), breaker, stats) == "ok"
+    assert breaker.opened_at is None
+
+
+def test_llmchat_retries():
+    """Test that LlmChat retries transient errors"""
+    chat = LlmChat(model="claude-3-5-haiku-20241022")
+    chat.retry_policy = RetryPolicy(max_retries=2, base_delay=0.001)
+    mock_response = type("MockResponse", (), {
+        "choices": [type("Choice", (), {"message": type("Message", (), {
+            "content": "Hello",
+            "tool_calls": None,
+            "model_dump": lambda: {"role": "assistant", "content": "Hello"}
+        })})],
+        "usage": type("Usage", (), {"prompt_tokens": 1, "completion_tokens": 1})
+    })
+    with patch("llmpipe.llmchat.completion", side_effect=[StatusError(529), mock_response]):
+        assert chat("Hi") == "Hello"
+    assert chat.retry_stats.retries == 1
+
+
+def test_circuit_breaker_half_open():
+    """Test that a half-open breaker lets a single trial request through"""
+    breaker = CircuitBreaker("m", failure_threshold=1, cooldown=0.05)
+    assert breaker.record_failure()
+    time.sleep(0.06)
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    # A failed trial opens the breaker again, a successful one closes it
+    assert breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record_success()
+    breaker.before_call()
+    breaker.before_call()
+
+    # A trial that fails with a non-retryable error does not keep the breaker half-open
+    assert breaker.record_failure()
+    time.sleep(0.06)
+
+    def bad_request():
+        error = ValueError("Bad request")
+        error.status_code = 400
+        raise error
+
+    with pytest.raises(ValueError):
+        call_with_retries(bad_request, RetryPolicy(max_retries=3, base_delay=0), breaker, RetryStats())
+    breaker.before_call()
+    breaker.before_call()
+
+
+def test_llmchat_retries_are_throttled():
+    """Test that every attempt, including retries, is admitted by the rate limiter"""
+    from llmpipe.fake_llm import FakeLlm, install_fake_llm
+
+    fake = install_fake_llm(FakeLlm(responses=["Hello"], rate_limit_rate=0.5, retry_after=0, seed=1), models=["fake/throttled"])
+    chat = LlmChat(model="fake/throttled", max_retries=20)
+    throttled = []
+    chat._throttle = lambda completion_args: throttled.append(1) or 0
+    for _ in range(5):
+        assert chat("Hi") == "Hello"
+        chat.clear_history()
+    assert fake.faults > 0
+    assert len(throttled) == fake.calls == 5 + fake.faults
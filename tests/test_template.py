@@ -42,3 +42,26 @@ def test_template_unchanged():
     template = Template("Hello {{name}}!")
     template.format(name="World")
     assert template.template == "Hello {{name}}!"
+
+
+def test_template_keys():
+    """Test the keys and missing key report."""
+    template = Template("{{a}} and {{b}}, then {{a}} again")
+    assert template.keys == ["a", "b"]
+    assert template.missing_keys(a=1) == ["b"]
+    assert template.missing_keys(a=1, b=2, c=3) == []
+
+
+def test_values_are_not_substituted():
+    """Test that keys inside substituted values are left as is."""
+    template = Template("{{a}} {{b}}")
+    assert template.format(a="{{b}}", b="x") == "{{b}} x"
+
+
+def test_template_reassigned():
+    """Test that a reassigned template is recompiled."""
+    template = Template("Hello {{name}}!")
+    assert template.format(name="World") == "Hello World!"
+    template.template = "Bye {{name}}!"
+    assert template.format(name="World") == "Bye World!"
+    assert Template("{{{name}}}").format(name="x") == "{x}"
@@ -0,0 +1,95 @@
+import multiprocessing
+from unittest.mock import patch
+
+from litellm import ModelResponse
+
+from llmpipe.field import Output
+from llmpipe.llmchat import LlmChat
+from llmpipe.revisor_module import RevisorModule
+from llmpipe.usage import UsageLedger, UsageRecord, get_ledger, set_ledger
+
+
+def make_response(content="Hello!", prompt_tokens=20, completion_tokens=10):
+    return ModelResponse(
+        choices=[{"message": {"role": "assistant", "content": content}}],
+        usage={
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    )
+
+
+def _record_in_child(path):
+    UsageLedger(path).record(UsageRecord(module="child", model="m", input_tokens=5, output_tokens=1))
+
+
+def test_ledger_in_memory():
+    """Test recording and summarizing usage in memory"""
+    ledger = UsageLedger()
+    ledger.record(UsageRecord(module="a", model="m1", input_tokens=10, output_tokens=2, cost=0.5))
+    ledger.record(UsageRecord(module="a", model="m2", input_tokens=5, output_tokens=1, cache_hit=True))
+    ledger.record(UsageRecord(module="b", model="m1", input_tokens=1, output_tokens=1, reasoning_tokens=1))
+    assert len(ledger.records()) == 3
+    by_module = ledger.summary("module")
+    assert by_module["a"]["calls"] == 2
+    assert by_module["a"]["cache_hits"] == 1
+    assert by_module["a"]["input_tokens"] == 15
+    assert by_module["a"]["cost"] == 0.5
+    by_model = ledger.summary("model")
+    assert by_model["m1"]["input_tokens"] == 11
+    assert by_model["m1"]["reasoning_tokens"] == 1
+    report = ledger.report()
+    assert "m2" in report and "b" in report
+
+
+def test_ledger_across_processes(tmp_path):
+    """Test that records written by other processes are aggregated"""
+    path = str(tmp_path / "usage.jsonl")
+    ledger = UsageLedger(path)
+    ledger.record(UsageRecord(module="parent", model="m", input_tokens=10, output_tokens=2))
+    processes = [multiprocessing.Process(target=_record_in_child, args=(path,)) for _ in range(3)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    summary = ledger.summary("module")
+    assert summary["parent"]["input_tokens"] == 10
+    assert summary["child"]["calls"] == 3
+    assert summary["child"]["input_tokens"] == 15
+
+
+def test_chat_records_usage(tmp_path):
+    """Test that calls and cache hits are recorded to the process-wide ledger"""
+    ledger = set_ledger(str(tmp_path / "usage.jsonl"))
+    try:
+        with patch('llmpipe.llmchat.completion', return_value=make_response()):
+            chat = LlmChat(model="claude-3-5-haiku-20241022", cache_path=str(tmp_path / "cache.sqlite"), label="chat")
+            chat("Hi")
+            chat.clear_history()
+            chat("Hi")
+        records = ledger.records()
+        assert [x.cache_hit for x in records] == [False, True]
+        assert records[0].module == "chat"
+        assert records[0].input_tokens == 20
+        assert records[1].cost == 0.
+    finally:
+        set_ledger(None)
+    assert get_ledger().path is None
+
+
+def test_revisor_judge_tokens_not_double_counted():
+    """Test that llm judge usage is counted once in the module token counts"""
+    output = Output("answer", "An answer", evaluations=[{"type": "llm", "value": "Is polite"}])
+    responses = [
+        make_response("<answer>Hi</answer>"),
+        make_response("<evaluation_result>PASS</evaluation_result><reason></reason>"),
+        make_response("<evaluation_result>PASS</evaluation_result><reason></reason>"),
+    ]
+    with patch('llmpipe.llmchat.completion', side_effect=responses):
+        module = RevisorModule(task="Answer", outputs=[output], model="claude-3-5-haiku-20241022")
+        module.forward_one()
+        module.evaluate(answer="Hi")
+        module.evaluate(answer="Hi")
+    assert module.tokens.input_tokens == 60
+    assert module.tokens.output_tokens == 30
@@ -1,5 +1,5 @@
 import pytest
-from llmpipe.xml_utils import XmlBlock, parse_text_for_tags, parse_text_for_tag, parse_text_for_one_tag
+from llmpipe.xml_utils import XmlBlock, StreamingTagParser, parse_text_for_tags, parse_text_for_tag, parse_text_for_one_tag
 
 def test_xml_block_basic():
     text = "<test>content</test>"
@@ -57,3 +57,27 @@ def test_parse_text_for_one_tag_multiple():
 def test_parse_text_for_one_tag_empty():
     assert parse_text_for_one_tag("", "test") == ""
     assert parse_text_for_one_tag("<other>content</other>", "test") == ""
+
+
+def test_streaming_tag_parser():
+    closed = []
+    parser = StreamingTagParser(["a", "b"], callback=lambda tag, content: closed.append((tag, content)))
+    text = "<a>first</a> <b>second</b> trailing"
+    blocks = []
+    for i in range(0, len(text), 3):
+        blocks += parser.feed(text[i:i + 3])
+        if parser.done:
+            break
+    assert closed == [("a", "first"), ("b", "second")]
+    assert [x.tag for x in blocks] == ["a", "b"]
+    assert parser.outputs == {"a": "first", "b": "second"}
+    assert parser.text.startswith("<a>first</a> <b>second</b>")
+    assert len(parser.text) < len(text)
+
+
+def test_streaming_tag_parser_matches_full_parse():
+    text = "<a>one</a><b>two <a>nested</a></b><a>three</a>"
+    parser = StreamingTagParser(["a", "b"])
+    for char in text:
+        parser.feed(char)
+    assert parser.outputs == {"a": parse_text_for_one_tag(text, "a"), "b": parse_text_for_one_tag(text, "b")}